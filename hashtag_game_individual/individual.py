@@ -1,14 +1,22 @@
 
 import os
-import csv
+import sys
 import time
 from dotenv import load_dotenv
 from slack_bolt import App
 from slack_bolt.adapter.socket_mode import SocketModeHandler
 
+# result_sinks.py and state_store.py are shared with the multiplayer bot and live in the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from result_sinks import open_result_sink
+from state_store import open_state_store
+
 
 ENV_PATH = "individual.env"
 CSV_PATH = "hashtag_single_trial.csv"
+CSV_HEADER = ["unix_time", "user_id", "hashtag"]
+RESULT_FORMATS = ("csv",)   # add "parquet" for a typed columnar copy (needs pyarrow)
+STATE_DB = os.getenv("STATE_DB", "individual_state.sqlite3")   # "" = keep state in memory only
 
 WELCOME_TEXT = (
     "Welcome to the hashtag game!\n"
@@ -29,22 +37,19 @@ APP_TOKEN = os.getenv("SLACK_APP_TOKEN")  # required for Socket Mode
 # Initialize the Slack app
 app = App(token=BOT_TOKEN, signing_secret=SIGNING_SECRET)
 
-# Tracks which users we are currently expecting a hashtag from.
-awaiting_response = {} # {user_id: True/False}
+# Tracks which users we are currently expecting a hashtag from ({user_id: True/False}).
+# Kept in SQLite (see state_store.py) so a restart does not forget who was mid-game.
+state = open_state_store(STATE_DB)
+
+# Opened once; writes the header only if the file is new. Rows are buffered
+# and written in batches, and flushed when the bot exits (see result_sinks.py).
+hashtag_log = open_result_sink(CSV_PATH, CSV_HEADER, RESULT_FORMATS)
 
 
 def dm(user_id, text):
     """Send a DM to a user."""
     app.client.chat_postMessage(channel=user_id, text=text)
 
-def ensure_csv_header(path):
-    """Create the CSV with a header if it doesn't exist yet."""
-    if os.path.exists(path):
-        return
-    with open(path, "w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow(["unix_time", "user_id", "hashtag"])
-
 def strip_hashtag(text):
     # Trim spaces and remove all leading '#' (e.g., "#Tag" -> "Tag")
     t = text.strip()
@@ -52,21 +57,19 @@ def strip_hashtag(text):
     return t
 
 def save_hashtag(user_id, raw_text):
-    ensure_csv_header(CSV_PATH)
     stripped = strip_hashtag(raw_text)
-    with open(CSV_PATH, "a", newline="", encoding="utf-8") as f:
-        csv.writer(f).writerow([time.time(), user_id, stripped])
+    hashtag_log.append([time.time(), user_id, stripped])
 
 def start_flow(user_id):
     """Begin the single-trial flow for a user."""
-    awaiting_response[user_id] = True
+    state.set_awaiting(user_id, True)
     dm(user_id, WELCOME_TEXT.format(user_id=user_id))
 
 def handle_submission(user_id, text):
     """Handle the user's hashtag submission."""
     save_hashtag(user_id, text)
     dm(user_id, THANKS_TEXT)
-    awaiting_response[user_id] = False  # lock to single submission
+    state.set_awaiting(user_id, False)  # lock to single submission
 
 
 # Event Handlers (DMs)
@@ -81,15 +84,15 @@ def on_message_events(body, event, say, logger):
     # If the user types "start", we record that they are now in the game
     # and send them the welcome prompt asking for a hashtag.
     if text.lower() == "start":
-        awaiting_response[user_id] = True
+        state.set_awaiting(user_id, True)
         dm(user_id, WELCOME_TEXT.format(user_id=user_id))
 
      # Once the user is marked as awaiting (awaiting_hashtag[user_id]=True), 
      # their next message is treated as a hashtag.   
-    elif awaiting_response.get(user_id):
+    elif state.get_awaiting(user_id):
         save_hashtag(user_id, text)
         dm(user_id, THANKS_TEXT)
-        awaiting_response[user_id] = False # mark as complete so they can’t resubmit
+        state.set_awaiting(user_id, False) # mark as complete so they can’t resubmit
 
 
 
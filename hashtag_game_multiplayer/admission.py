@@ -0,0 +1,89 @@
+"""
+Debounced game admission for the multiplayer bots.
+
+When a class joins the game channel, member_joined_channel fires once per
+person within a few seconds. Instead of trying to start a game on every event,
+the bots wait for the joins to stop (ADMISSION_QUIET_SECONDS without a new
+join, or at most ADMISSION_MAX_WAIT_SECONDS after the first one) and then admit
+everyone who is waiting in one go: one member lookup, one schedule build and
+one results file per cohort.
+
+Cohorts are at most MAX_COHORT_SIZE players. What happens to the players
+beyond that depends on COHORT_OVERFLOW:
+    "session"  - they get their own session(s), started at the same time
+    "waitlist" - they wait until the channel's current game is over
+Players short of MIN_PLAYERS always wait for more joins, and so does an odd
+player out: every cohort is an even number of players.
+"""
+import time
+import threading
+
+
+class AdmissionWindow:
+    """Per-channel debounce bookkeeping: how long until pending joins are admitted."""
+
+    def __init__(self, quiet_seconds, max_wait_seconds=None, clock=time.monotonic):
+        self.quiet_seconds = quiet_seconds
+        self.max_wait_seconds = max_wait_seconds
+        self.clock = clock
+        self._first_join = {}      # channel_id -> clock() of the first join in this window
+        self._lock = threading.Lock()
+
+    def note_join(self, channel_id):
+        """Record a join; returns the delay (seconds from now) until the channel should be admitted."""
+        now = self.clock()
+        with self._lock:
+            first = self._first_join.setdefault(channel_id, now)
+        delay = self.quiet_seconds
+        if self.max_wait_seconds is not None:
+            delay = min(delay, max(0.0, first + self.max_wait_seconds - now))
+        return delay
+
+    def close(self, channel_id):
+        """The window fired: the next join opens a new one."""
+        with self._lock:
+            self._first_join.pop(channel_id, None)
+
+
+def plan_cohorts(waiting, min_players, max_size=None, max_cohorts=None):
+    """
+    Split the waiting players (in join order) into cohorts.
+
+    Returns (cohorts, waitlist). Every cohort has an even number of players (the
+    pairing engines need everyone paired in every trial), and cohorts are as
+    equal in size as possible, each between min_players and max_size; at most
+    max_cohorts are formed (None = no limit). Everyone else, including a group
+    too small to play and an odd player out, is waitlisted.
+    """
+    waiting = list(waiting)
+    n = len(waiting)
+    cap = _even(max_size) if max_size else None
+    if _even(n) < min_players or max_cohorts == 0:
+        return [], waiting
+    if not cap or n <= cap:
+        size = _even(n)
+        return [waiting[:size]], waiting[size:]
+
+    k = -(-n // cap)                                 # fewest cohorts that fit
+    if max_cohorts is not None and k > max_cohorts:
+        k = max_cohorts
+        admitted = k * cap
+    else:
+        admitted = n
+    while k > 1 and _even(admitted // k) < min_players:   # every cohort must be playable
+        k -= 1
+    admitted = min(admitted, k * cap)
+
+    base, extra = divmod(admitted // 2, k)           # split whole pairs, not players
+    if 2 * base < min_players:
+        return [], waiting
+    cohorts, i = [], 0
+    for c in range(k):
+        size = 2 * (base + (1 if c < extra else 0))
+        cohorts.append(waiting[i:i + size])
+        i += size
+    return cohorts, waiting[i:]
+
+
+def _even(n):
+    return n - n % 2
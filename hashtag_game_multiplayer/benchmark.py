@@ -0,0 +1,311 @@
+"""
+Benchmark for the pairing generator and the threaded bot's game loop.
+
+Each cohort size runs in a fresh process, in a scratch directory:
+    - mixing.network_connection_spatial, build_pair_schedule_spatial (cold
+      schedule cache) and group_pairs_by_trial are timed on their own;
+    - one full game of hashtag_game_multiplayer.py is played against
+      FakeSlackClient (fake_slack.py), which can add latency and 429s. Players
+      open the modal and submit through the bot's own handlers from a pool of
+      handler threads (like Bolt's), and a fraction of rounds is left to time out.
+
+The report is JSON, one entry per size: schedule build times, events/sec,
+p50/p99 submit-to-announce latency (second submit of a round until its result
+reaches Slack), peak thread count, peak RSS and the Slack calls made. By
+default the outbox's per-method rate limits are lifted so the bot itself is
+measured; --slack-limits keeps them.
+
+Example:
+    python benchmark.py --sizes 10 100 1000 10000 --latency 0.02 \\
+        --rate-limit 0.01 --out benchmark.json
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import threading
+import contextlib
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+from slack_sdk.errors import SlackApiError
+
+from topology import TOPOLOGIES
+
+
+BENCH_CHANNEL = "CBENCH"
+UNLIMITED = (1e9, 1e9)                      # outbox token bucket that never waits
+RESULT_TEXT = re.compile(r"\*Trial (\d+) result\*")
+HASHTAGS = ("cats", "dogs", "birds")        # small vocabulary, so some rounds match
+
+
+def _wait(predicate, deadline, what):
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"gave up waiting for {what}")
+        time.sleep(0.005)
+
+
+def _peak_rss_mb():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024   # bytes on macOS, KiB on Linux
+
+
+def _percentiles_ms(values):
+    if not values:
+        return {"count": 0}
+    ms = np.asarray(values) * 1000.0
+    return {
+        "count": int(ms.size),
+        "p50": float(np.percentile(ms, 50)),
+        "p99": float(np.percentile(ms, 99)),
+        "max": float(ms.max()),
+    }
+
+
+def _play(bot, client, rid, user, hashtag, key, submitted_at):
+    """One player: click the trial button, then submit the modal."""
+    noop = lambda *args, **kwargs: None
+    try:
+        bot.open_submit_modal(noop, {"user": {"id": user}, "trigger_id": "bench", "actions": [{"value": rid}]}, client)
+    except SlackApiError:
+        pass                                 # views.open is called inline, so an injected 429 lands here; click again
+    view = {"private_metadata": rid, "state": {"values": {"hs": {"val": {"value": "#" + hashtag}}}}}
+    submitted_at[key] = time.monotonic()
+    bot.handle_submit(noop, {"user": {"id": user}}, client, view)
+
+
+def _run(size, cfg):
+    import mixing
+    from game_logic import (
+        TRIALNUM, NEIGHBORSIZE, PAIRING_ENGINE, TOPOLOGY, build_pair_schedule_spatial, group_pairs_by_trial,
+    )
+
+    engine = cfg["engine"] or PAIRING_ENGINE
+    topology = cfg["topology"] or TOPOLOGY
+    neighborsize = cfg["neighborsize"] or NEIGHBORSIZE
+    players = [f"U{i:06d}" for i in range(size)]
+    result = {"size": size, "engine": engine, "topology": topology, "trials": TRIALNUM,
+              "neighborsize": neighborsize}
+
+    # Schedule generation
+    t0 = time.perf_counter()
+    mixing.network_connection_spatial(randseed=1, nodesnum=size, trialnum=TRIALNUM, neighborsize=neighborsize,
+                                      engine=engine, savecsv=False, topology=topology)
+    result["network_seconds"] = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    schedule = build_pair_schedule_spatial(players, randseed=1, trialnum=TRIALNUM,
+                                           neighborsize=neighborsize, engine=engine, topology=topology)
+    result["schedule_seconds"] = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    group_pairs_by_trial(schedule)
+    result["group_seconds"] = time.perf_counter() - t0
+
+    # Game loop
+    import hashtag_game_multiplayer as bot
+    from fake_slack import FakeSlackClient
+
+    bot.PAIRING_ENGINE = engine
+    bot.TOPOLOGY = topology
+    bot.NEIGHBORSIZE = neighborsize
+    bot.ROUND_TIMEOUT_SECONDS = cfg["round_timeout"]
+    if not cfg["slack_limits"]:
+        for method in list(bot.outbox.limits):
+            bot.outbox.limits[method] = UNLIMITED
+
+    submitted_at = {}          # (trial, user) -> when the player submitted
+    announced_at = {}          # (trial, user) -> when their result reached Slack
+
+    def on_call(method, payload, when):
+        if method == "chat.postEphemeral":
+            m = RESULT_TEXT.match(payload.get("text") or "")
+            if m:
+                announced_at[(int(m.group(1)), payload.get("user"))] = when
+
+    client = FakeSlackClient(players, latency=cfg["latency"], jitter=cfg["jitter"],
+                             rate_limit=cfg["rate_limit"], retry_after=cfg["retry_after"],
+                             seed=cfg["seed"], on_call=on_call)
+
+    peak_threads = [threading.active_count()]
+    stop = threading.Event()
+    def sample_threads():
+        while not stop.wait(0.01):
+            peak_threads[0] = max(peak_threads[0], threading.active_count())
+    sampler = threading.Thread(target=sample_threads, name="bench-sampler", daemon=True)
+    sampler.start()
+
+    rng = random.Random(cfg["seed"])
+    handlers = ThreadPoolExecutor(cfg["handler_threads"], thread_name_prefix="bench-handler")
+    deadline = time.monotonic() + cfg["max_seconds"]
+    submits = timeouts = 0
+    trial_seconds = []
+
+    t_game = time.perf_counter()
+    session = bot.start_game(client, BENCH_CHANNEL, players)
+    result["start_game_seconds"] = time.perf_counter() - t_game
+    try:
+        for t in range(1, session.trialnum + 1):
+            t_trial = time.perf_counter()
+            _wait(lambda: session.current_trial >= t or session.finished, deadline, f"trial {t}")
+            for rid in list(session.rids_by_trial[t]):
+                st = session.rounds.get(rid)
+                if st is None:
+                    continue
+                if rng.random() < cfg["timeout_fraction"]:
+                    timeouts += 1
+                    continue
+                for user in st.pair:
+                    handlers.submit(_play, bot, client, rid, user, rng.choice(HASHTAGS), (t, user), submitted_at)
+                    submits += 1
+            _wait(lambda: session.current_trial > t or session.finished, deadline, f"end of trial {t}")
+            trial_seconds.append(time.perf_counter() - t_trial)
+        if not bot.outbox.join(max(0.0, deadline - time.monotonic())):
+            raise TimeoutError("gave up waiting for the outbox to drain")
+        result["game_seconds"] = time.perf_counter() - t_game
+    finally:
+        stop.set()
+        handlers.shutdown(wait=True)
+
+    latencies = []
+    for t, pairs in session.schedule_by_trial.items():
+        for a, b in pairs:
+            if (t, a) not in submitted_at or (t, b) not in submitted_at:
+                continue                    # timed out
+            last_submit = max(submitted_at[(t, a)], submitted_at[(t, b)])
+            for user in (a, b):
+                if (t, user) in announced_at:
+                    latencies.append(announced_at[(t, user)] - last_submit)
+
+    events = submits + timeouts
+    outbox = bot.outbox.stats()
+    result.update({
+        "trial_seconds": trial_seconds,
+        "submits": submits,
+        "timeouts": timeouts,
+        "events": events,
+        "events_per_sec": events / result["game_seconds"],
+        "submit_to_announce_ms": _percentiles_ms(latencies),
+        "peak_threads": peak_threads[0],
+        "peak_rss_mb": _peak_rss_mb(),
+        "slack_calls": dict(client.api.counts),
+        "slack_429s": sum(client.api.rate_limited.values()),
+        "outbox": {k: outbox[k] for k in ("sent", "retried", "rate_limited", "failed")},
+    })
+    return result
+
+
+def offline_workdir(tag, memory_state=False):
+    """
+    Make a scratch directory, cd into it (results CSVs, state DB and schedule
+    cache land there) and set the environment the bot needs to import without
+    Slack. Call before importing hashtag_game_multiplayer.
+    """
+    workdir = tempfile.mkdtemp(prefix=f"hashtag_{tag}_")
+    os.chdir(workdir)
+    os.environ.update(
+        SLACK_BOT_TOKEN="xoxb-bench",
+        SLACK_SIGNING_SECRET="bench",
+        SLACK_APP_TOKEN="xapp-bench",
+        SLACK_TOKEN_VERIFICATION="0",
+        GAME_STATE_DB="" if memory_state else os.path.join(workdir, "game_state.sqlite3"),
+        SCHEDULE_CACHE_DIR=os.path.join(workdir, ".schedule_cache"),
+    )
+    return workdir
+
+
+def run_size(size, cfg):
+    """Benchmark one cohort size. Runs in its own process (see main) so RSS and threads are per size."""
+    workdir = offline_workdir(f"bench_{size}", cfg["memory_state"])
+    try:
+        # the bot prints progress; keep the worker quiet
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            return _run(size, cfg)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def summary_line(r):
+    if "error" in r:
+        return f"{r['size']:>6} players: ERROR {r['error']}"
+    lat = r["submit_to_announce_ms"]
+    p = f"p50 {lat['p50']:.1f} ms, p99 {lat['p99']:.1f} ms" if lat["count"] else "no submits"
+    return (f"{r['size']:>6} players: schedule {r['schedule_seconds']:.3f}s, game {r['game_seconds']:.2f}s, "
+            f"{r['events_per_sec']:.0f} events/s, {p}, {r['peak_threads']} threads, {r['peak_rss_mb']:.0f} MB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark schedule generation and the multiplayer game loop.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000], help="cohort sizes (players)")
+    parser.add_argument("--engine", choices=("matlab", "fast"), default=None,
+                        help="pairing engine (default: PAIRING_ENGINE in game_logic.py)")
+    parser.add_argument("--topology", choices=TOPOLOGIES, default=None,
+                        help="network (default: TOPOLOGY in game_logic.py)")
+    parser.add_argument("--neighborsize", type=int, default=None,
+                        help="neighborhood size (default: NEIGHBORSIZE in game_logic.py; 4 or 8 for a torus)")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every Slack call")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many more seconds, at random")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="fraction of Slack calls answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with a 429")
+    parser.add_argument("--timeout-fraction", type=float, default=0.1, help="fraction of rounds nobody submits")
+    parser.add_argument("--round-timeout", type=float, default=1.0, help="ROUND_TIMEOUT_SECONDS for the run")
+    parser.add_argument("--handler-threads", type=int, default=10,
+                        help="threads running the Slack handlers (Bolt's default pool is 10)")
+    parser.add_argument("--slack-limits", action="store_true", help="keep the outbox's per-method rate limits")
+    parser.add_argument("--memory-state", action="store_true", help="in-memory state store instead of SQLite")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--max-seconds", type=float, default=900.0, help="give up on a size after this long")
+    parser.add_argument("--out", default="benchmark.json", help="JSON report path")
+    args = parser.parse_args(argv)
+
+    cfg = {
+        "engine": args.engine,
+        "topology": args.topology,
+        "neighborsize": args.neighborsize,
+        "latency": args.latency,
+        "jitter": args.jitter,
+        "rate_limit": args.rate_limit,
+        "retry_after": args.retry_after,
+        "timeout_fraction": args.timeout_fraction,
+        "round_timeout": args.round_timeout,
+        "handler_threads": args.handler_threads,
+        "slack_limits": args.slack_limits,
+        "memory_state": args.memory_state,
+        "seed": args.seed,
+        "max_seconds": args.max_seconds,
+    }
+
+    results = []
+    ctx = multiprocessing.get_context("spawn")
+    for size in args.sizes:
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+            try:
+                r = pool.submit(run_size, size, cfg).result()
+            except Exception as e:
+                r = {"size": size, "error": repr(e)}
+        results.append(r)
+        print(summary_line(r))
+
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": cfg,
+        "results": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Channel membership cache for the multiplayer bots.
+
+Instead of calling auth.test and conversations.members on every
+member_joined_channel event, the bots keep each game channel's members here:
+    - the bot's own user ID is resolved once,
+    - a channel's member list is fetched in full (every page) the first time
+      it is needed,
+    - member_joined_channel / member_left_channel events update it in place,
+    - it is fetched again (reconciled) when older than `reconcile_after`
+      seconds, in case an event was missed.
+A join storm at the start of a session then costs O(1) Slack calls, not O(joins).
+"""
+import time
+import threading
+import metrics
+
+
+MEMBERS_PAGE_SIZE = 1000             # conversations.members page size (Slack's max is 1000)
+RECONCILE_SECONDS = 300              # re-fetch a channel's members after this long
+
+
+class MembershipCache:
+    def __init__(self, reconcile_after=RECONCILE_SECONDS, clock=time.monotonic):
+        self.reconcile_after = reconcile_after
+        self.clock = clock
+        self.bot_user_id = None
+        self.fetches = 0
+        self._members = {}          # channel_id -> {user_id: None}, kept in Slack's order
+        self._synced_at = {}        # channel_id -> clock() of the last full fetch
+        self._lock = threading.Lock()
+        self._sync_locks = {}       # channel_id -> Lock, so only one thread fetches a channel
+
+    def needs_sync(self, channel_id):
+        with self._lock:
+            synced = self._synced_at.get(channel_id)
+        return synced is None or self.clock() - synced >= self.reconcile_after
+
+    def replace(self, channel_id, members):
+        """Store a full member list fetched from Slack."""
+        with self._lock:
+            self._members[channel_id] = dict.fromkeys(members)
+            self._synced_at[channel_id] = self.clock()
+            self.fetches += 1
+
+    def ensure(self, channel_id, fetch):
+        """
+        Make sure channel_id is loaded and fresh, calling fetch(channel_id) -> [user_id]
+        at most once however many threads ask at the same time.
+        """
+        if not self.needs_sync(channel_id):
+            return
+        with self._lock:
+            sync_lock = self._sync_locks.setdefault(channel_id, threading.Lock())
+        with sync_lock:
+            if self.needs_sync(channel_id):
+                self.replace(channel_id, fetch(channel_id))
+
+    def joined(self, channel_id, user_id):
+        """member_joined_channel. Channels not loaded yet are left for their first full fetch."""
+        with self._lock:
+            members = self._members.get(channel_id)
+            if members is not None:
+                members[user_id] = None
+
+    def left(self, channel_id, user_id):
+        """member_left_channel."""
+        with self._lock:
+            members = self._members.get(channel_id)
+            if members is not None:
+                members.pop(user_id, None)
+
+    def players(self, channel_id):
+        """Channel members other than the bot, in Slack's order (joins appended)."""
+        with self._lock:
+            members = self._members.get(channel_id, {})
+            return [m for m in members if m != self.bot_user_id]
+
+
+def fetch_members(client, channel_id, page_size=MEMBERS_PAGE_SIZE):
+    """Every member of a channel, following conversations.members pagination."""
+    members = []
+    cursor = None
+    while True:
+        with metrics.timer("slack_call_seconds", method="conversations_members"):
+            resp = client.conversations_members(channel=channel_id, limit=page_size, cursor=cursor)
+        members.extend(resp.get("members", []))
+        cursor = (resp.get("response_metadata") or {}).get("next_cursor")
+        if not cursor:
+            return members
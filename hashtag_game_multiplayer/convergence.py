@@ -0,0 +1,171 @@
+"""
+Live convergence statistics for a Hashtag Game: is the cohort settling on one hashtag?
+
+Each game keeps a Convergence tracker, fed by handle_submit and the round
+timeout, with one TrialTally per trial:
+    - how often each (normalized) hashtag was submitted,
+    - the Shannon entropy of those counts in bits (0 = everyone agrees),
+    - the dominant hashtag and its share of the submissions,
+    - rounds closed, matches, timeouts and the match rate.
+Every update is O(1): entropy is kept as log2(N) - S / N with the running sum
+S = sum(n * log2(n)) over the tag counts, and the dominant tag comes from
+tags bucketed by count (a count only ever moves by one, so the top bucket
+is found without a scan). A player who submits again in the same round
+replaces their earlier tag, which is taken back out of the counts.
+
+stats(t) is a JSON-ready dict; the bots save one per trial to the state
+store when the trial ends and answer `@Demo App convergence` from here, so
+nothing re-reads the CSV.
+"""
+import math
+import threading
+
+from game_logic import normalize_tag
+
+
+def _nlog2n(n):
+    return n * math.log2(n) if n > 1 else 0.0
+
+
+class TrialTally:
+    """Running counts for one trial (the caller serializes updates)."""
+
+    __slots__ = ("trial", "counts", "by_count", "total", "top", "_s",
+                 "rounds_closed", "matches", "timeouts")
+
+    def __init__(self, trial):
+        self.trial = trial
+        self.counts = {}          # tag -> submissions
+        self.by_count = {}        # submissions -> {tag, ...}
+        self.total = 0
+        self.top = 0              # highest count
+        self._s = 0.0             # sum of n * log2(n) over counts
+        self.rounds_closed = 0
+        self.matches = 0
+        self.timeouts = 0
+
+    def _move(self, tag, delta):
+        old = self.counts.get(tag, 0)
+        new = old + delta
+        self._s += _nlog2n(new) - _nlog2n(old)
+        self.total += delta
+        if old:
+            bucket = self.by_count[old]
+            bucket.discard(tag)
+            if not bucket:
+                del self.by_count[old]
+        if new:
+            self.counts[tag] = new
+            self.by_count.setdefault(new, set()).add(tag)
+        else:
+            del self.counts[tag]
+        if new > self.top:
+            self.top = new
+        elif old == self.top and old not in self.by_count:
+            self.top = new            # the only tag at the top lost one
+
+    def add(self, tag):
+        self._move(tag, 1)
+
+    def remove(self, tag):
+        if tag in self.counts:
+            self._move(tag, -1)
+
+    def close_round(self, outcome):
+        self.rounds_closed += 1
+        if outcome == "match":
+            self.matches += 1
+        elif outcome == "timeout":
+            self.timeouts += 1
+
+    def entropy(self):
+        if not self.total:
+            return 0.0
+        return max(0.0, math.log2(self.total) - self._s / self.total)
+
+    def dominant(self):
+        """(tag, count) of the most submitted tag; ties go to the alphabetically first."""
+        if not self.top:
+            return None, 0
+        return min(self.by_count[self.top]), self.top
+
+    def stats(self):
+        tag, n = self.dominant()
+        return {
+            "trial": self.trial,
+            "submissions": self.total,
+            "distinct": len(self.counts),
+            "entropy_bits": round(self.entropy(), 4),
+            "dominant": tag,
+            "dominant_share": round(n / self.total, 4) if self.total else 0.0,
+            "rounds_closed": self.rounds_closed,
+            "matches": self.matches,
+            "timeouts": self.timeouts,
+            "match_rate": round(self.matches / self.rounds_closed, 4) if self.rounds_closed else 0.0,
+        }
+
+
+class Convergence:
+    """Per-trial tallies of one game. Finished trials are kept as their stats dict only."""
+
+    def __init__(self):
+        self._tallies = {}        # trial -> TrialTally, trials still running
+        self._finished = {}       # trial -> stats dict
+        self._lock = threading.Lock()
+
+    def _tally(self, t):
+        tally = self._tallies.get(t)
+        if tally is None:
+            tally = self._tallies[t] = TrialTally(t)
+        return tally
+
+    def submitted(self, t, value, previous=None):
+        """Count a submission in trial t; `previous` is the player's earlier tag in the round, if any."""
+        tag, old = normalize_tag(value), normalize_tag(previous)
+        if previous is not None and old == tag:
+            return
+        with self._lock:
+            tally = self._tally(t)
+            if old:
+                tally.remove(old)
+            if tag:
+                tally.add(tag)
+
+    def round_closed(self, t, outcome):
+        with self._lock:
+            self._tally(t).close_round(outcome)
+
+    def replay(self, rounds):
+        """Rebuild the tallies from RoundRecords (after a restart)."""
+        for st in rounds:
+            for user in st.pair:
+                if st.submitted(user):
+                    self.submitted(st.trial, st.sub(user))
+            if st.closed:
+                self.round_closed(st.trial, st.game_outcome)
+
+    def finish(self, t):
+        """Freeze trial t; returns its stats (to be saved with the trial)."""
+        with self._lock:
+            tally = self._tallies.pop(t, None) or TrialTally(t)
+            stats = self._finished[t] = tally.stats()
+        return stats
+
+    def load(self, saved):
+        """Stats of finished trials, {trial: stats} as saved in the state store."""
+        with self._lock:
+            self._finished.update({int(t): s for t, s in saved.items()})
+
+    def stats(self, t):
+        with self._lock:
+            if t in self._finished:
+                return self._finished[t]
+            tally = self._tallies.get(t)
+            return tally.stats() if tally else TrialTally(t).stats()
+
+    def history(self):
+        """Stats of every trial seen so far, in trial order."""
+        with self._lock:
+            out = dict(self._finished)
+            out.update({t: tally.stats() for t, tally in self._tallies.items()})
+        return [out[t] for t in sorted(out)]
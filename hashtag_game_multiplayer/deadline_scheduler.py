@@ -0,0 +1,165 @@
+"""
+Round deadlines for the whole game in one min-heap.
+
+DeadlineHeap is the bookkeeping (used by both runtimes); DeadlineScheduler
+runs it on a single worker thread for hashtag_game_multiplayer.py. Instead of
+one sleeping thread per round, the worker sleeps until the earliest live
+deadline, so a round that closes early costs nothing once it is cancelled.
+"""
+import time
+import heapq
+import itertools
+import threading
+import traceback
+
+
+class DeadlineHeap:
+    """
+    Min-heap of (deadline, seq, key) with O(1) cancel.
+
+    Only the latest deadline per key is live (kept in a dict); cancelled or
+    extended entries stay in the heap and are dropped when they reach the top.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._live = {}                 # key -> (deadline, args)
+        self._seq = itertools.count()   # tie-break so keys are never compared
+
+    def __len__(self):
+        return len(self._live)
+
+    def __contains__(self, key):
+        return key in self._live
+
+    def push(self, key, deadline, args=()):
+        """Set key's deadline (replacing any earlier one). True if it is now the earliest."""
+        self._live[key] = (deadline, args)
+        heapq.heappush(self._heap, (deadline, next(self._seq), key))
+        return self.next_deadline() == deadline
+
+    def cancel(self, key):
+        """Forget key's deadline. True if it was pending."""
+        return self._live.pop(key, None) is not None
+
+    def extend(self, key, seconds):
+        """Push key's deadline back by `seconds`. False if key is not pending."""
+        entry = self._live.get(key)
+        if entry is None:
+            return False
+        deadline, args = entry
+        self.push(key, deadline + seconds, args)
+        return True
+
+    def deadline(self, key):
+        entry = self._live.get(key)
+        return entry[0] if entry else None
+
+    def next_deadline(self):
+        """Earliest live deadline, or None if nothing is pending."""
+        heap = self._heap
+        while heap:
+            deadline, _, key = heap[0]
+            entry = self._live.get(key)
+            if entry is not None and entry[0] == deadline:
+                return deadline
+            heapq.heappop(heap)   # stale: cancelled or extended
+        return None
+
+    def pop_expired(self, now):
+        """Remove and return [(key, args), ...] for every live deadline <= now, earliest first."""
+        expired = []
+        while True:
+            deadline = self.next_deadline()
+            if deadline is None or deadline > now:
+                return expired
+            _, _, key = heapq.heappop(self._heap)
+            _, args = self._live.pop(key)
+            expired.append((key, args))
+
+
+class DeadlineScheduler:
+    """
+    One daemon worker thread serving a DeadlineHeap.
+
+    on_expire(key, *args) runs once per expired key, outside the scheduler lock:
+    on the worker thread itself, or, if an executor is given, submitted to it so
+    a slow callback does not hold up the deadlines after it. The worker starts
+    on the first schedule() call.
+    """
+
+    def __init__(self, on_expire, clock=time.monotonic, name="round-deadlines", executor=None):
+        self.on_expire = on_expire
+        self.clock = clock
+        self.executor = executor        # runs on_expire if set (e.g. a ThreadPoolExecutor)
+        self.name = name                # worker thread name
+        self.fired = 0                  # expirations delivered so far
+        self._heap = DeadlineHeap()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+
+    def schedule(self, key, timeout, *args):
+        """Call on_expire(key, *args) after `timeout` seconds unless cancelled first."""
+        with self._cond:
+            if self._heap.push(key, self.clock() + timeout, args):
+                self._cond.notify()
+            self._ensure_worker()
+
+    def cancel(self, key):
+        with self._cond:
+            return self._heap.cancel(key)
+
+    def extend(self, key, seconds):
+        """Give key `seconds` more before it expires. False if it already expired or was cancelled."""
+        with self._cond:
+            return self._heap.extend(key, seconds)
+
+    def remaining(self, key):
+        """Seconds until key expires, or None if it is not pending."""
+        with self._cond:
+            deadline = self._heap.deadline(key)
+        return None if deadline is None else max(0.0, deadline - self.clock())
+
+    def pending(self):
+        """Number of timers that have neither fired nor been cancelled."""
+        with self._cond:
+            return len(self._heap)
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    # caller holds self._cond
+    def _ensure_worker(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopped:
+                        return
+                    now = self.clock()
+                    expired = self._heap.pop_expired(now)
+                    if expired:
+                        break
+                    deadline = self._heap.next_deadline()
+                    self._cond.wait(None if deadline is None else deadline - now)
+
+            for key, args in expired:
+                self.fired += 1
+                if self.executor is None:
+                    self._expire(key, args)
+                else:
+                    self.executor.submit(self._expire, key, args)
+
+    def _expire(self, key, args):
+        try:
+            self.on_expire(key, *args)
+        except Exception:
+            traceback.print_exc()
@@ -0,0 +1,150 @@
+"""
+Offline stand-in for the Slack Web API, used by benchmark.py and loadtest.py.
+
+FakeSlackApi answers Web API methods the way Slack would (auth.test,
+conversations.members with pagination, chat.*, views.open), records every
+call, sleeps for the configured latency and answers a fraction of calls with
+HTTP 429 (Retry-After), so the outbox's rate-limit handling is exercised too.
+It is reachable two ways:
+    FakeSlackClient - a slack_sdk WebClient whose api_call never leaves the
+                      process (the real method wrappers still build the payloads)
+    FakeSlackServer - a local HTTP server; point any WebClient's base_url at it,
+                      e.g. the per-request clients Bolt creates from app.client
+"""
+import json
+import time
+import random
+import threading
+from collections import Counter
+from urllib.parse import parse_qsl, urlparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from slack_sdk import WebClient
+from slack_sdk.web import SlackResponse
+
+
+BOT_USER_ID = "UBOT"
+TEAM_ID = "TFAKE"
+
+
+class FakeSlackApi:
+    def __init__(self, members=(), latency=0.0, jitter=0.0, rate_limit=0.0, retry_after=1.0,
+                 seed=None, on_call=None):
+        """
+        members      user IDs returned by conversations.members (the bot is added)
+        latency      seconds every call takes, plus up to `jitter` more at random
+        rate_limit   fraction of calls answered with 429 ratelimited
+        retry_after  Retry-After header (seconds) sent with a 429
+        on_call      optional on_call(method, payload, when) run after each successful call
+        """
+        self.members = [BOT_USER_ID] + list(members)
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.on_call = on_call
+        self.counts = Counter()              # method -> successful calls
+        self.rate_limited = Counter()        # method -> 429s sent
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._ts = 0
+
+    def handle(self, api_method, payload):
+        """Answer one call; returns (status, headers, body)."""
+        with self._lock:
+            delay = self.latency + (self._rng.random() * self.jitter if self.jitter else 0.0)
+            limited = self.rate_limit and self._rng.random() < self.rate_limit
+        if delay:
+            time.sleep(delay)
+
+        if limited:
+            with self._lock:
+                self.rate_limited[api_method] += 1
+            return 429, {"Retry-After": str(self.retry_after)}, {"ok": False, "error": "ratelimited"}
+
+        body = self._answer(api_method, payload)
+        with self._lock:
+            self.counts[api_method] += 1
+        if self.on_call:
+            self.on_call(api_method, payload, time.monotonic())
+        return 200, {}, body
+
+    def _answer(self, api_method, payload):
+        if api_method == "auth.test":
+            return {"ok": True, "user_id": BOT_USER_ID, "bot_id": "BFAKE", "team_id": TEAM_ID}
+        if api_method == "conversations.members":
+            limit = int(payload.get("limit") or 100)
+            start = int(payload.get("cursor") or 0)
+            page = self.members[start:start + limit]
+            more = start + limit < len(self.members)
+            return {"ok": True, "members": page,
+                    "response_metadata": {"next_cursor": str(start + limit) if more else ""}}
+        if api_method in ("chat.postMessage", "chat.postEphemeral"):
+            with self._lock:
+                self._ts += 1
+                ts = f"{int(time.time())}.{self._ts:06d}"
+            return {"ok": True, "channel": payload.get("channel"), "ts": ts, "message_ts": ts}
+        if api_method == "views.open":
+            return {"ok": True, "view": {"id": "VFAKE"}}
+        return {"ok": True}
+
+
+class FakeSlackClient(WebClient):
+    """WebClient answered in process by a FakeSlackApi (made from the keyword arguments if not given)."""
+
+    def __init__(self, members=(), api=None, **kwargs):
+        super().__init__(token="xoxb-fake")
+        self.api = api or FakeSlackApi(members, **kwargs)
+
+    def api_call(self, api_method, *, http_verb="POST", files=None, data=None, params=None,
+                 json=None, headers=None, auth=None):
+        payload = dict(params or {}, **(data or {}), **(json or {}))
+        status, resp_headers, body = self.api.handle(api_method, payload)
+        return SlackResponse(client=self, http_verb=http_verb, api_url=api_method, req_args={},
+                             data=body, headers=resp_headers, status_code=status).validate()
+
+
+class _FakeSlackHandler(BaseHTTPRequestHandler):
+    def _serve(self):
+        url = urlparse(self.path)
+        api_method = url.path.rsplit("/", 1)[-1]
+        payload = dict(parse_qsl(url.query))
+        raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if raw:
+            if "json" in (self.headers.get("Content-Type") or ""):
+                payload.update(json.loads(raw))
+            else:
+                payload.update(parse_qsl(raw.decode("utf-8")))
+
+        status, headers, body = self.server.api.handle(api_method, payload)
+        out = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(out)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(out)
+
+    do_GET = do_POST = _serve
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeSlackServer(ThreadingHTTPServer):
+    """Serves a FakeSlackApi over HTTP on localhost (port 0 = any free port)."""
+    daemon_threads = True
+    request_queue_size = 1024       # listen backlog; a trial start opens hundreds of connections at once
+
+    def __init__(self, api, host="127.0.0.1", port=0):
+        super().__init__((host, port), _FakeSlackHandler)
+        self.api = api
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/api/"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="fake-slack", daemon=True).start()
+        return self
@@ -0,0 +1,485 @@
+"""
+Game settings and runtime-independent helpers shared by the threaded bot
+(hashtag_game_multiplayer.py) and the asyncio bot (hashtag_game_async.py).
+Nothing in here talks to Slack or holds game state.
+"""
+import re
+import json
+import uuid
+import threading
+import numpy as np
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+import mixing
+from topology import make_topology
+from schedule_cache import cached_network_connection, get_default_cache
+from round_records import RoundRecord
+
+
+# Game Settings
+TRIALNUM = 3                    # Number of rounds in a game
+NEIGHBORSIZE = 2                # Size of each player's neighborhood in the spatial network
+ROUND_TIMEOUT_SECONDS = 60      # How long players have to respond in each round (seconds)
+MIN_PLAYERS = 4                # Minimum number of players required to start a game
+PAIRING_ENGINE = "matlab"       # "matlab" = original rejection sampler, "fast" = rejection-free matching (large cohorts)
+TOPOLOGY = "ring"               # Network: "ring", "torus", "small_world", "random_regular" or "complete" (see topology.py)
+RESULT_FORMATS = ("csv",)       # add "parquet" for a typed columnar copy of the results (needs pyarrow)
+ADMISSION_QUIET_SECONDS = 10    # Start once no one has joined the channel for this long (seconds)
+ADMISSION_MAX_WAIT_SECONDS = 60 # ...or this long after the first join, even if people keep joining
+MAX_COHORT_SIZE = None          # Max players per game (None = everyone waiting)
+COHORT_OVERFLOW = "waitlist"    # Players beyond MAX_COHORT_SIZE: "waitlist" (next game) or "session" (parallel game)
+DROPOUT_TIMEOUTS = 2            # Re-match around a player who lets this many rounds in a row time out (None = never)
+
+CSV_HEADER = [
+    "round_id",
+    "trial",
+    "player_a",
+    "player_b",
+    "player_a_hashtag",
+    "player_b_hashtag",
+    "completed",      # 0 = incomplete, 1 = both submitted
+    "started_at",
+    "game_outcome",
+]
+
+
+def make_round_id():
+    return uuid.uuid4().hex #changed round id from datetime-->UUID (due to concurrent player submissions)
+
+def normalize_tag(s):
+    """Lowercase, drop a single leading '#', trim whitespace. Return '' for no hashtag submissions."""
+    if not s:
+        return ""
+    s = s.strip()
+    if s.startswith("#"):
+        s = s[1:].strip()
+    return s.lower()
+
+def build_pair_schedule_spatial(players, *, randseed=1, trialnum=5, neighborsize=4, engine="matlab", topology="ring"): #default parameters, do not change experiment values here
+    """Builds a pairing schedule (player1, player2, trial_number) using spatial network logic.
+
+    Each row in the output corresponds to a pair of players for a given trial.
+    Example output of this function:
+        [
+            ('@U01', '@U02', 1),
+            ('@U03', '@U04', 1),
+            ('@U01', '@U03', 2),
+            ...
+        ]
+
+    Notes:
+    - Do NOT tune `trialnum` or `neighborsize` here.
+      These are default values only — the actual experiment parameters
+      are the Game Settings at the top of this file
+    - For a fully connected (homogeneous) network where every player
+      interacts with every other player, set:
+        neighborsize = len(players) - 1
+    - `engine` selects the generator in mixing.py: "matlab" (faithful port)
+      or "fast" (rejection-free matching, needs an even number of players)
+    - `topology` selects the network (see topology.py). "ring" is the
+      neighborhood above; "torus", "small_world", "random_regular" and
+      "complete" (homogeneous, no neighbor lists) ignore `engine`. On those a
+      player the matching cannot reach sits the trial out.
+    """
+    idx_to_user = {i + 1: u for i, u in enumerate(players)}
+    # Served from the schedule cache (memory, then .schedule_cache/ on disk) when
+    # the same cohort size and parameters were generated before
+    conn = cached_network_connection(
+        randseed=randseed,
+        nodesnum=len(players),
+        trialnum=trialnum,
+        neighborsize=neighborsize,
+        engine=engine,
+        topology=topology,
+    )
+    # Convert the NumPy array of network connections into a standard Python list.
+    # Each row has the format: [player1_index, player2_index, trial_number]
+    connection_list = conn.tolist()
+
+    # Sort connections by trial number(row 2) first, then by player1 index(row 0), then by player2 index(row 1).
+    connection_list.sort(key=lambda row: (row[2], row[0], row[1]))
+
+    # Map player indices to usernames, keeping the trial number for scheduling
+    pair_schedule = []
+    for player1_idx, player2_idx, trial_num in connection_list:
+        player1 = idx_to_user[player1_idx]
+        player2 = idx_to_user[player2_idx]
+        pair_schedule.append((player1, player2, int(trial_num)))  # int(trial_num) because coming from numpy.int64
+
+    return pair_schedule
+
+
+def group_pairs_by_trial(schedule_with_trials):
+    """takes schedule made in build_pair_schedule_spatial and groups by trial number
+    [(a,b,t)] -> {t: [(a,b), ...]}"""
+    grouped = defaultdict(list)
+    for a, b, t in schedule_with_trials:
+        grouped[t].append((a, b))
+    return dict(sorted(grouped.items()))
+
+
+# Trials are generated ahead on these threads while the current trial runs
+_prefetch_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="schedule-prefetch")
+
+
+class PairSchedule:
+    """
+    A game's pairing schedule, read like the {t: [(a, b), ...]} dict
+    group_pairs_by_trial returns, but built one trial at a time from
+    mixing.iter_trial_connections. The pairs are the ones
+    build_pair_schedule_spatial gives for the same settings; only trial 1 has
+    to exist before a game starts, and prefetch(t + 1) builds the next trial
+    on a background thread while trial t is being played.
+
+    A schedule the schedule cache already holds (e.g. from a preloaded
+    archive) is read from there instead of being sampled again, and one
+    sampled here is written to the cache once its last trial is built.
+    `keep` bounds how many trials stay in memory (None = all of them); a
+    trial dropped that way is sampled again from the seed if it is read
+    later. trialnum=None gives an open-ended schedule.
+    If the MATLAB sampler gives up on a trial ("Cycle detected"), that trial
+    and the rest come from the fast engine instead of failing the game.
+
+    drop_player(user) leaves a player out of every trial read after that:
+    their partners are re-matched within the game's network
+    (mixing.repair_matching) and the other pairs stay as scheduled. A partner
+    with no free neighbor left sits the trial out.
+    """
+
+    def __init__(self, players, *, randseed=1, trialnum=TRIALNUM, neighborsize=NEIGHBORSIZE,
+                 engine=PAIRING_ENGINE, topology=TOPOLOGY, keep=None, trials=None):
+        self.players = list(players)
+        self.randseed = randseed
+        self.trialnum = trialnum
+        self.neighborsize = neighborsize
+        self.engine = engine
+        self.topology = topology
+        self.keep = keep
+        self._trials = dict(trials or {})    # t -> [(a, b), ...], built so far
+        self._stream = None                  # mixing generator; yields trial self._next next
+        self._next = 1
+        self._cached = None                  # whole matrix, if the schedule cache had it
+        self._streamed = None                # rows sampled since trial 1, for the schedule cache
+        self._looked_up = False
+        self._fell_back = False
+        self.inactive = set()                # players left out of trials read from now on
+        self._graph = None                   # the topology's graph, built on the first repair
+        self._lock = threading.Lock()
+
+    def __getitem__(self, t):
+        if t < 1 or (self.trialnum is not None and t > self.trialnum):
+            raise KeyError(t)
+        pairs = self._trials.get(t)
+        if pairs is None or self.inactive:
+            with self._lock:
+                pairs = self._trials.get(t)
+                if pairs is None:
+                    pairs = self._build(t)
+                if self.inactive:
+                    pairs = self._repair(t, pairs)
+        return pairs
+
+    def drop_player(self, user):
+        """Leave `user` out of the trials read from now on. Returns False if they already were."""
+        with self._lock:
+            if user in self.inactive or user not in self.players:
+                return False
+            self.inactive.add(user)
+            return True
+
+    def restore_player(self, user):
+        """Schedule `user` again in trials not built yet (built ones keep their repaired pairs)."""
+        with self._lock:
+            if user not in self.inactive:
+                return False
+            self.inactive.discard(user)
+            return True
+
+    def ready(self, t):
+        """True if trial t can be read without sampling it first."""
+        return t in self._trials
+
+    def prefetch(self, t):
+        """Build trial t on a background thread, unless it is built already or past the end."""
+        if t in self._trials or t < 1 or (self.trialnum is not None and t > self.trialnum):
+            return None
+        return _prefetch_pool.submit(self._prefetch, t)
+
+    def _prefetch(self, t):
+        try:
+            self[t]
+        except Exception as e:
+            # Reading the trial will try again (and raise) in the game's own thread
+            print(f"Could not prefetch trial {t}: {e}")
+
+    def items(self):
+        """(t, pairs) for the trials built so far (what the state store saves)."""
+        return sorted(self._trials.items())
+
+    def _build(self, t):
+        if not self._looked_up:
+            self._looked_up = True
+            if self.trialnum is not None:
+                self._cached = get_default_cache().get(
+                    self.randseed, len(self.players), self.trialnum, self.neighborsize, self.engine,
+                    self.topology)
+        if self._cached is not None:
+            # Rows are in trial order; a trial can have fewer than n // 2 of them off the ring
+            trials = self._cached[:, 2]
+            lo, hi = np.searchsorted(trials, t), np.searchsorted(trials, t + 1)
+            pairs = self._to_pairs(self._cached[lo:hi].tolist())
+            self._remember(t, pairs)
+            return pairs
+
+        if self._stream is None or t < self._next:
+            # First read, or a trial dropped by `keep`: replay the seeded stream from trial 1
+            self._stream = self._open_stream(self.engine)
+            self._fell_back = False
+            self._next = 1
+            self._streamed = [] if self.trialnum is not None else None
+        try:
+            while self._next <= t:
+                try:
+                    rows = next(self._stream)
+                except RuntimeError as e:
+                    if self.topology != "ring" or self._fell_back:
+                        raise
+                    self._fell_back = True
+                    self._streamed = None         # not the schedule `engine` gives: keep it out of the cache
+                    print(f"Trial {self._next} pairing: {e} Using the fast engine from here on.")
+                    self._stream = self._open_stream("fast")
+                    continue
+                if self._next not in self._trials:
+                    self._remember(self._next, self._to_pairs(rows.tolist()))
+                if self._streamed is not None:
+                    self._streamed.append(np.asarray(rows).reshape(-1, 3))
+                self._next += 1
+        except BaseException:
+            self._stream = None               # the generator is dead; the next read starts over
+            raise
+        if self._streamed is not None and self._next > self.trialnum:
+            self._store_in_cache(np.concatenate(self._streamed))
+            self._streamed = None
+        return self._trials[t]
+
+    def _store_in_cache(self, conn):
+        # Same matrix network_connection_spatial returns, so the next cohort of this size starts from the cache
+        try:
+            self._cached = get_default_cache().put(
+                self.randseed, len(self.players), self.trialnum, self.neighborsize, conn, self.engine,
+                self.topology)
+        except OSError as e:
+            print(f"Could not write the schedule to the cache: {e}")
+
+    def _open_stream(self, engine):
+        return mixing.iter_trial_connections(
+            self.randseed, len(self.players), self.neighborsize, engine=engine, trialnum=self.trialnum,
+            topology=self.topology)
+
+    def _repair(self, t, pairs):
+        if not any(a in self.inactive or b in self.inactive for a, b in pairs):
+            return pairs
+        index = {u: i for i, u in enumerate(self.players)}
+        partner = np.full(len(self.players), -1, dtype=np.int64)
+        for a, b in pairs:
+            partner[index[a]], partner[index[b]] = index[b], index[a]
+        active = np.ones(len(self.players), dtype=bool)
+        active[[index[u] for u in self.inactive]] = False
+        if self._graph is None:
+            self._graph = make_topology(self.topology, len(self.players), self.neighborsize, seed=self.randseed)
+
+        # Seeded per trial, so replaying a dropped trial repairs it the same way
+        rng = np.random.default_rng([self.randseed, t])
+        mixing.repair_matching(partner, active, self._graph, rng)
+        node1 = np.flatnonzero(np.arange(len(self.players)) < partner)
+        pairs = [(self.players[i], self.players[partner[i]]) for i in node1]
+        self._trials[t] = pairs
+        return pairs
+
+    def _to_pairs(self, rows):
+        # Same order as build_pair_schedule_spatial: by player1 index, then player2 index
+        rows.sort()
+        return [(self.players[a - 1], self.players[b - 1]) for a, b, _ in rows]
+
+    def _remember(self, t, pairs):
+        self._trials[t] = pairs
+        if self.keep:
+            for old in [k for k in self._trials if k <= t - self.keep]:
+                del self._trials[old]
+
+
+# Round records
+def new_round(a, b, t, channel_id):
+    """Fresh round record for pair (a, b) in trial t (see round_records.py)."""
+    return RoundRecord(a, b, t, channel_id)
+
+def round_outcome(st):
+    """'match' if both players submitted the same (normalized) hashtag, else 'no match'."""
+    sa = normalize_tag(st.sub_a) #hashtag submission from player a
+    sb = normalize_tag(st.sub_b) #hashtag submission from player b
+    return "match" if sa and sb and sa == sb else "no match"
+
+def round_csv_row(rid, st):
+    """One CSV_HEADER row for a round."""
+    a, b = st.pair
+
+    return [
+        rid,
+        st.trial,
+        a,
+        b,
+        st.sub_a,   # '' if the player never submitted
+        st.sub_b,
+        1 if st.completed else 0,  # 1 only if both submitted
+        datetime.fromtimestamp(st.started_at).isoformat(),
+        st.game_outcome,
+    ]
+
+def new_csv_path(tag=None):
+    """submissions_<timestamp>[_<tag>].csv; the tag keeps games started in the same second apart."""
+    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return f"submissions_{ts}_{tag}.csv" if tag else f"submissions_{ts}.csv"
+
+
+# Slack payloads
+class PayloadTemplate:
+    """
+    A Block Kit payload serialized to JSON once, with {{name}} slots in its
+    string values filled in per send. Slack takes `blocks` and `view` as
+    JSON-encoded strings, so a fill is one string join instead of building and
+    serializing the nested dicts again for every player.
+    """
+    _SLOT = re.compile(r"\{\{(\w+)\}\}")
+
+    def __init__(self, payload):
+        parts = self._SLOT.split(json.dumps(payload, ensure_ascii=False, separators=(",", ":")))
+        self._chunks = parts[0::2]     # literal JSON between the slots
+        self._slots = parts[1::2]      # slot names, in order
+
+    def fill(self, **values):
+        out = [self._chunks[0]]
+        for name, chunk in zip(self._slots, self._chunks[1:]):
+            out.append(json.dumps(str(values[name]), ensure_ascii=False)[1:-1])   # escaped, without the quotes
+            out.append(chunk)
+        return "".join(out)
+
+
+@lru_cache(maxsize=None)
+def trial_prompt_template(t):
+    """Blocks of the trial t prompt, with a {{rid}} slot for the button."""
+    return PayloadTemplate([
+        {
+            "type": "section",
+            "text": {
+                "type": "mrkdwn",
+                "text": f"*Trial {t}*\n Click below to submit your hashtag."
+            },
+        },
+        {
+            "type": "actions",
+            "elements": [
+                {
+                    "type": "button",
+                    "text": {
+                        "type": "plain_text",
+                        "text": f"Submit hashtag (Trial {t})"
+                    },
+                    "style": "primary",
+                    "action_id": "open_submit_modal",  # wired to the @app.action in the bot
+                    "value": "{{rid}}",                 # we pass rid so we can look up trial later
+                }
+            ]
+        }
+    ])
+
+@lru_cache(maxsize=None)
+def submit_modal_template(trial_num):
+    """The trial's submit modal, with a {{rid}} slot in private_metadata."""
+    return PayloadTemplate({
+        "type": "modal",
+        "callback_id": "submit_hashtag_view",
+        "private_metadata": "{{rid}}",
+
+        # Modal title with trial #
+        "title": {
+            "type": "plain_text",
+            "text": f"Trial {trial_num}"
+        },
+
+        "submit": {"type": "plain_text", "text": "Submit"},
+        "close": {"type": "plain_text", "text": "Cancel"},
+
+        "blocks": [
+            {
+                "type": "input",
+                "block_id": "hs",
+                "element": {
+                    "type": "plain_text_input",
+                    "action_id": "val",
+                    "initial_value": "#",
+                    "placeholder": {"type": "plain_text", "text": "#example"}
+                },
+                "label": {"type": "plain_text", "text": "Write a Hashtag for the event"}
+            }
+        ]
+    })
+
+def trial_prompt_text(t, partner):
+    return f"*Trial {t}* • You are matched with <@{partner}>."
+
+def trial_prompt_blocks(t, rid):
+    """Prompt blocks (JSON string); the same for both players of a round."""
+    return trial_prompt_template(t).fill(rid=rid)
+
+def trial_prompt(t, partner, rid):
+    """(text, blocks) for the ephemeral that opens trial t for one player."""
+    return trial_prompt_text(t, partner), trial_prompt_blocks(t, rid)
+
+def submit_modal_view(rid, trial_num):
+    """The submit modal for one round (JSON string, as views.open accepts)."""
+    return submit_modal_template(trial_num).fill(rid=rid)
+
+def result_text(trial, own, partner, outcome, points):
+    """Round result shown to one player."""
+    return (
+        f"*Trial {trial} result*\n"
+        f"• Your hashtag: `{own or '(no hashtag)'}`\n"
+        f"• Partner: `{partner or '(no hashtag)'}`\n"
+        f"• Outcome: *{outcome}*\n"
+        f"• Your total points: *{points}*"
+    )
+
+def submitted_value(view):
+    """Hashtag typed into the modal, with one leading '#' removed (CSV has no leading '#')."""
+    try:
+        value_raw = (view["state"]["values"]["hs"]["val"]["value"] or "").strip()
+    except Exception:
+        value_raw = ""
+    return value_raw[1:].strip() if value_raw.startswith("#") else value_raw
+
+def leaderboard_text(top):
+    if not top:
+        return "*Leaderboard*\n_No scores yet._"
+    masked = lambda uid: f"Anon-{uid[-3:]}"
+    lines = [f"{masked(u)}: {pts}" for u, pts in top]
+    return "*Top 3 Leaderboard*\n" + "\n".join(lines)
+
+def convergence_text(history, reveal_tags=False):
+    """
+    Per-trial convergence stats (Convergence.history()) for the channel. Tags are
+    only named once the game is over (reveal_tags), so players still playing
+    are not told what everyone else is converging on.
+    """
+    if not history:
+        return "*Convergence*\n_No submissions yet._"
+    lines = []
+    for s in history[-5:]:
+        top = f"`#{s['dominant']}` " if reveal_tags and s["dominant"] else "top tag "
+        lines.append(
+            f"Trial {s['trial']}: {s['submissions']} tags, {s['distinct']} distinct, "
+            f"entropy {s['entropy_bits']:.2f} bits, {top}{100 * s['dominant_share']:.0f}%, "
+            f"match rate {s['matches']}/{s['rounds_closed']} ({100 * s['match_rate']:.0f}%)"
+        )
+    return "*Convergence*\n" + "\n".join(lines)
@@ -0,0 +1,308 @@
+"""
+Game sessions for the multiplayer bots.
+
+One bot process can run many games at once (one per channel, across any
+number of channels). Everything that used to be module-level game state
+(current_game, round_state, player_points) lives on a GameSession, and the
+SessionRegistry finds the session for a channel, a game ID or a round ID,
+so Slack handlers only need the rid they were given. A game that has ended
+leaves the registry (finish); only a FinishedGame with its scores and
+convergence stats stays behind, the channel's last one, for the scores and
+convergence commands, along with the IDs of the players who took part, so
+they are not admitted into another game.
+
+Concurrency: a round is only ever changed under its stripe of a StripedLocks
+pool, and each session counts the open rounds of its current trial. Closing a
+round decrements the count (close_round), and only the caller that takes it to
+zero advances the trial, so a trial advances exactly once however many
+submits and timeouts race at its end.
+"""
+import threading
+from bisect import bisect_left, insort
+from collections import defaultdict
+from game_logic import TRIALNUM, NEIGHBORSIZE, PAIRING_ENGINE, TOPOLOGY, PairSchedule
+from convergence import Convergence
+
+
+class Leaderboard:
+    """
+    Points per player, with players also kept in per-score buckets (each a list
+    sorted by user ID). A point change moves one player between two buckets
+    (binary search), and top(n) reads the highest buckets instead of sorting
+    every player, so the scores command stays cheap for cohorts in the thousands.
+    Reads like a dict of user -> points.
+    """
+
+    def __init__(self, players=()):
+        self._points = {}
+        self._buckets = {}          # points -> [user, ...] sorted
+        self._lock = threading.Lock()
+        for u in players:
+            self.add(u, 0)
+
+    def add(self, user, delta=1):
+        """Give user `delta` more points; returns their new total."""
+        with self._lock:
+            old = self._points.get(user)
+            if old is not None:
+                if not delta:
+                    return old
+                bucket = self._buckets[old]
+                del bucket[bisect_left(bucket, user)]
+                if not bucket:
+                    del self._buckets[old]
+            new = (old or 0) + delta
+            self._points[user] = new
+            insort(self._buckets.setdefault(new, []), user)
+            return new
+
+    def update(self, points):
+        """Set totals from a {user: points} mapping (e.g. loaded from the state store)."""
+        for user, p in points.items():
+            self.add(user, p - self.get(user, 0))
+
+    def top(self, n=3):
+        """Top n (user, points) by points desc, then user ID."""
+        with self._lock:
+            out = []
+            for score in sorted(self._buckets, reverse=True):   # one bucket per distinct score
+                for user in self._buckets[score][:n - len(out)]:
+                    out.append((user, score))
+                if len(out) >= n:
+                    break
+            return out
+
+    def get(self, user, default=0):
+        return self._points.get(user, default)
+
+    def __getitem__(self, user):
+        return self._points[user]
+
+    def __contains__(self, user):
+        return user in self._points
+
+    def __len__(self):
+        return len(self._points)
+
+    def keys(self):
+        return self._points.keys()
+
+    def values(self):
+        return self._points.values()
+
+    def items(self):
+        return self._points.items()
+
+
+class GameSession:
+    """One running game: its players, schedule, open rounds, scores and result log."""
+
+    def __init__(self, game_id, channel_id, players, schedule_by_trial, *,
+                 trialnum=TRIALNUM, neighborsize=NEIGHBORSIZE, csv_path=None, round_log=None):
+        self.game_id = game_id
+        self.channel_id = channel_id
+        self.players = players
+        self.trialnum = trialnum
+        self.neighborsize = neighborsize
+        self.current_trial = 0
+        self.schedule_by_trial = schedule_by_trial   # {t: [(a,b), ...]}, usually a PairSchedule
+        self.rids_by_trial = {}                      # {t: [rid, ...]}
+        self.csv_path = csv_path                     # auto-append here
+        self.round_log = round_log                   # result sink(s) open on csv_path (see result_sinks.py)
+        self.finished = False
+        self.rounds = {}                             # rid -> RoundRecord, current trial only
+        self.points = Leaderboard(players)           # user_id -> points in this game (0 shows on leaderboard)
+        self.open_rounds = {}                        # trial -> rounds not closed yet
+        self.missed = {}                             # user_id -> rounds in a row they let time out
+        self.convergence = Convergence()             # live per-trial hashtag stats (see convergence.py)
+        self._open_lock = threading.Lock()
+
+    def open_trial(self, t, n):
+        """Start counting down the n rounds of trial t."""
+        with self._open_lock:
+            self.open_rounds[t] = n
+
+    def close_round(self, t):
+        """
+        Count one round of trial t as closed. Returns True for exactly one
+        caller: the one that closed the trial's last open round.
+        """
+        with self._open_lock:
+            left = self.open_rounds.get(t)
+            if left is None:
+                return False
+            if left <= 1:
+                del self.open_rounds[t]
+                return True
+            self.open_rounds[t] = left - 1
+            return False
+
+    def missed_round(self, user):
+        """Count a round `user` let time out; returns how many they have missed in a row."""
+        with self._open_lock:
+            n = self.missed[user] = self.missed.get(user, 0) + 1
+        return n
+
+    def attended(self, user):
+        """`user` submitted: their run of missed rounds is over."""
+        self.missed.pop(user, None)
+
+    def drop_player(self, user):
+        """Re-match around `user` from the next trial on (see PairSchedule.drop_player)."""
+        return self.schedule_by_trial.drop_player(user)
+
+    def restore_player(self, user):
+        self.missed.pop(user, None)
+        return self.schedule_by_trial.restore_player(user)
+
+    def to_record(self):
+        """Game fields as saved by state_store.save_game."""
+        schedule = self.schedule_by_trial
+        return {
+            "game_id": self.game_id,
+            "channel_id": self.channel_id,
+            "trialnum": self.trialnum,
+            "neighborsize": self.neighborsize,
+            "current_trial": self.current_trial,
+            "players": self.players,
+            "schedule_by_trial": self.schedule_by_trial,
+            "rids_by_trial": self.rids_by_trial,
+            "csv_path": self.csv_path,
+            "finished": self.finished,
+            "engine": schedule.engine,
+            "topology": schedule.topology,
+            "inactive": sorted(schedule.inactive),
+        }
+
+    @classmethod
+    def from_record(cls, game, round_log=None):
+        """Inverse of to_record (rounds and points are loaded separately)."""
+        # Trials saved so far are reused; later ones are sampled again from the seed, with the
+        # game's own engine and topology, around the players who had dropped out
+        schedule = PairSchedule(game["players"], trialnum=game["trialnum"], neighborsize=game["neighborsize"],
+                                engine=game.get("engine") or PAIRING_ENGINE,
+                                topology=game.get("topology") or TOPOLOGY,
+                                trials=game["schedule_by_trial"])
+        schedule.inactive.update(game.get("inactive") or ())
+        session = cls(
+            game["game_id"], game["channel_id"], game["players"], schedule,
+            trialnum=game["trialnum"], neighborsize=game["neighborsize"],
+            csv_path=game["csv_path"], round_log=round_log,
+        )
+        session.current_trial = game["current_trial"]
+        session.rids_by_trial = game["rids_by_trial"]
+        session.finished = game["finished"]
+        return session
+
+    def __repr__(self):
+        return (f"GameSession({self.game_id!r}, channel={self.channel_id!r}, players={len(self.players)}, "
+                f"trial={self.current_trial}/{self.trialnum}, finished={self.finished})")
+
+
+class FinishedGame:
+    """What the scores and convergence commands still read once a game has ended."""
+
+    __slots__ = ("game_id", "channel_id", "points", "convergence")
+    finished = True
+
+    def __init__(self, session):
+        self.game_id = session.game_id
+        self.channel_id = session.channel_id
+        self.points = session.points
+        self.convergence = session.convergence
+
+    def __repr__(self):
+        return f"FinishedGame({self.game_id!r}, channel={self.channel_id!r})"
+
+
+class StripedLocks:
+    """
+    A fixed pool of locks; a key always maps to the same one. Different rounds
+    mostly land on different stripes, so they rarely wait on each other, and
+    memory does not grow with the number of rounds.
+    """
+
+    def __init__(self, stripes=64):
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+    def lock_for(self, key):
+        return self._locks[hash(key) % len(self._locks)]
+
+
+class SessionRegistry:
+    """Thread-safe index of running sessions by game ID, channel and open round ID."""
+
+    def __init__(self):
+        self._by_game = {}
+        self._by_channel = defaultdict(list)   # channel_id -> [session, ...] oldest first
+        self._by_rid = {}                      # open rounds only
+        self._finished = {}                    # channel_id -> FinishedGame of its last ended game
+        self._played = defaultdict(set)        # channel_id -> players of its ended games
+        self._lock = threading.Lock()
+
+    def add(self, session):
+        with self._lock:
+            self._by_game[session.game_id] = session
+            self._by_channel[session.channel_id].append(session)
+
+    def get(self, game_id):
+        with self._lock:
+            return self._by_game.get(game_id)
+
+    def for_channel(self, channel_id):
+        with self._lock:
+            return list(self._by_channel.get(channel_id, ()))
+
+    def latest_for_channel(self, channel_id):
+        """The channel's newest running session, else a FinishedGame of its last game (or None)."""
+        with self._lock:
+            sessions = self._by_channel.get(channel_id)
+            return sessions[-1] if sessions else self._finished.get(channel_id)
+
+    def finish(self, session):
+        """
+        Forget a game that has ended (call after its final record is saved), so its
+        schedule, round tables and result log can be freed.
+        """
+        with self._lock:
+            if self._by_game.pop(session.game_id, None) is None:
+                return
+            channel = self._by_channel.get(session.channel_id, [])
+            if session in channel:
+                channel.remove(session)
+            if not channel:
+                self._by_channel.pop(session.channel_id, None)
+            for rid in [rid for rid, s in self._by_rid.items() if s is session]:
+                del self._by_rid[rid]
+            self._finished[session.channel_id] = FinishedGame(session)
+            self._played[session.channel_id].update(session.players)
+
+    def in_game(self, channel_id):
+        """Players of the channel's running games, and of its ended ones (nobody plays twice)."""
+        with self._lock:
+            out = set(self._played.get(channel_id, ()))
+            for s in self._by_channel.get(channel_id, ()):
+                out.update(s.players)
+            return out
+
+    def add_rounds(self, session, rids):
+        with self._lock:
+            for rid in rids:
+                self._by_rid[rid] = session
+
+    def drop_rounds(self, rids):
+        with self._lock:
+            for rid in rids:
+                self._by_rid.pop(rid, None)
+
+    def for_rid(self, rid):
+        with self._lock:
+            return self._by_rid.get(rid)
+
+    def sessions(self):
+        with self._lock:
+            return list(self._by_game.values())
+
+    def __len__(self):
+        with self._lock:
+            return len(self._by_game)
@@ -0,0 +1,548 @@
+"""
+Asyncio runtime for the multiplayer Hashtag Game.
+
+Same game as hashtag_game_multiplayer.py, but everything runs on one event loop:
+    - slack_bolt's AsyncApp + AsyncSocketModeHandler instead of App + SocketModeHandler
+    - one timer heap task for every round deadline instead of a sleeping thread per round
+    - a semaphore caps in-flight Slack calls instead of a ThreadPoolExecutor per trial
+so memory and thread count stay flat as the number of players grows.
+
+Run it the same way as the threaded bot (needs `pip install aiohttp` for async Socket Mode):
+    python hashtag_game_async.py
+"""
+import os
+import asyncio
+from dotenv import load_dotenv
+from slack_bolt.async_app import AsyncApp
+from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
+from deadline_scheduler import DeadlineHeap
+from result_sinks import open_result_sink
+from state_store import open_state_store
+from game_sessions import GameSession, SessionRegistry
+from channel_members import MembershipCache, MEMBERS_PAGE_SIZE
+from admission import AdmissionWindow, plan_cohorts
+import metrics
+from game_logic import (
+    TRIALNUM, NEIGHBORSIZE, ROUND_TIMEOUT_SECONDS, MIN_PLAYERS, PAIRING_ENGINE, TOPOLOGY, RESULT_FORMATS, CSV_HEADER,
+    ADMISSION_QUIET_SECONDS, ADMISSION_MAX_WAIT_SECONDS, MAX_COHORT_SIZE, COHORT_OVERFLOW, DROPOUT_TIMEOUTS,
+    make_round_id, PairSchedule,
+    new_round, round_outcome, round_csv_row, new_csv_path,
+    trial_prompt_text, trial_prompt_blocks, submit_modal_view, result_text, submitted_value, leaderboard_text,
+    convergence_text,
+)
+
+
+load_dotenv()
+SLACK_BOT_TOKEN = os.environ["SLACK_BOT_TOKEN"]
+SLACK_SIGNING_SECRET = os.environ["SLACK_SIGNING_SECRET"]
+SLACK_APP_TOKEN = os.environ["SLACK_APP_TOKEN"]  # Socket Mode
+# Channels games may run in (comma separated); unset = any channel the bot is in
+GAME_CHANNEL_IDS = {c.strip() for c in os.environ.get("GAME_CHANNEL_ID", "").split(",") if c.strip()}
+GAME_STATE_DB = os.environ.get("GAME_STATE_DB", "game_state.sqlite3")   # "" = no durable state
+
+SLACK_CONCURRENCY = 20          # Max Slack Web API calls in flight at once
+
+app = AsyncApp(token=SLACK_BOT_TOKEN, signing_secret=SLACK_SIGNING_SECRET)
+
+# Write-through state store, as in hashtag_game_multiplayer.py. Its writes only
+# buffer (a background thread commits them), so they are safe to call on the loop.
+store = open_state_store(GAME_STATE_DB)
+
+sessions = SessionRegistry()      # one GameSession per game, as in hashtag_game_multiplayer.py
+_starting = set()                 # channels being admitted right now
+admission = AdmissionWindow(ADMISSION_QUIET_SECONDS, ADMISSION_MAX_WAIT_SECONDS)   # see admission.py
+_admission_timers = {}            # channel_id -> asyncio.TimerHandle of its quiet window
+
+_slack_slots = None   # asyncio.Semaphore(SLACK_CONCURRENCY), created on the running loop
+
+
+async def slack_call(method, **kwargs):
+    """Call client.<method>(**kwargs) with at most SLACK_CONCURRENCY calls in flight."""
+    global _slack_slots
+    if _slack_slots is None:
+        _slack_slots = asyncio.Semaphore(SLACK_CONCURRENCY)
+    async with _slack_slots:
+        try:
+            with metrics.timer("slack_call_seconds", method=method):
+                resp = await getattr(app.client, method)(**kwargs)
+        except Exception:
+            metrics.inc("slack_calls_total", method=method, outcome="error")
+            raise
+        metrics.inc("slack_calls_total", method=method, outcome="ok")
+        return resp
+
+
+class RoundTimers:
+    """
+    All round deadlines in one DeadlineHeap (see deadline_scheduler.py), served by a single task.
+    The task only wakes for real expirations, or when an earlier deadline is added. Each
+    expiry runs as its own task, so a timeout that opens the next trial (and awaits its
+    prompt fan-out) does not hold up the other deadlines.
+    """
+
+    def __init__(self, on_expire):
+        self.on_expire = on_expire   # async callable(rid)
+        self._heap = DeadlineHeap()
+        self._wake = asyncio.Event()
+        self._tasks = set()          # expiries still running (the loop only keeps weak references)
+
+    def schedule(self, rid, delay):
+        if self._heap.push(rid, asyncio.get_running_loop().time() + delay):
+            self._wake.set()
+
+    def cancel(self, rid):
+        return self._heap.cancel(rid)
+
+    def extend(self, rid, seconds):
+        return self._heap.extend(rid, seconds)
+
+    def pending(self):
+        return len(self._heap)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            for rid, _ in self._heap.pop_expired(loop.time()):
+                task = asyncio.create_task(self._expire(rid))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+            deadline = self._heap.next_deadline()
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), None if deadline is None else deadline - loop.time())
+            except asyncio.TimeoutError:
+                pass
+
+    async def _expire(self, rid):
+        try:
+            await self.on_expire(rid)
+        except Exception:
+            app.logger.error("Error handling round timeout", exc_info=True)
+
+
+# Session helpers
+def _open_round(rid):
+    """(session, RoundRecord) for an open round of a current trial, or (None, None)."""
+    session = sessions.for_rid(rid)
+    st = session.rounds.get(rid) if session else None
+    return (session, st) if st is not None else (None, None)
+
+async def resume_games():
+    """Reload every unfinished game from the state store and carry on with its current trial."""
+    resumed = 0
+    for game in await asyncio.to_thread(store.load_active_games):
+        if not game["rids_by_trial"]:
+            continue
+        t = game["current_trial"]
+        rids = set(game["rids_by_trial"].get(t, []))
+        rounds = await asyncio.to_thread(store.rounds_for_trial, game["game_id"], t)
+        rounds = {rid: st for rid, st in rounds.items() if rid in rids}
+
+        session = GameSession.from_record(
+            game, round_log=open_result_sink(game["csv_path"], CSV_HEADER, RESULT_FORMATS))
+        session.points.update(await asyncio.to_thread(store.load_points, game["game_id"]))
+        session.rounds.update(rounds)
+        session.convergence.load(await asyncio.to_thread(store.load_trial_stats, game["game_id"]))
+        session.convergence.replay(rounds.values())
+        sessions.add(session)
+        sessions.add_rounds(session, rounds)
+
+        open_rids = [rid for rid, st in rounds.items() if not st.closed]
+        session.open_trial(t, len(open_rids))
+        for rid in open_rids:
+            round_timers.schedule(rid, ROUND_TIMEOUT_SECONDS)
+        print(f"Resumed game {game['game_id']} in {game['channel_id']} at trial {t} ({len(open_rids)} open rounds)")
+        resumed += 1
+
+        if not open_rids:
+            await _advance_trial(session, t)
+    return resumed
+
+
+async def _on_round_timeout(rid):
+    """Deadline reached: if the round is still open, close it as a timeout and maybe advance."""
+    session, st = _open_round(rid)
+    if not st or st.closed:
+        return
+
+    st.closed = True
+    if not st.game_outcome:
+        st.game_outcome = "timeout"
+    store.save_round(rid, st, session.game_id)
+    session.convergence.round_closed(st.trial, "timeout")
+    _note_timeouts(session, st)
+
+    # Write a row even if one or both hashtags are missing
+    _append_round_to_csv(session, rid, st)
+    await maybe_advance_trial(session, st.trial)
+
+
+def _note_timeouts(session, st):
+    """A player who lets DROPOUT_TIMEOUTS rounds in a row time out is re-matched around from the next trial."""
+    for user in st.pair:
+        if not st.submitted(user) and session.missed_round(user) == DROPOUT_TIMEOUTS:
+            _drop_player(session, user, f"let {DROPOUT_TIMEOUTS} rounds in a row time out")
+
+
+def _drop_player(session, user, reason):
+    if session.drop_player(user):
+        store.save_game(session.to_record())     # a restarted bot keeps them out too
+        print(f"{user} {reason}: re-matching their partners in game {session.game_id} from the next trial")
+
+
+round_timers = RoundTimers(_on_round_timeout)
+
+
+# Channel members, kept up to date from join/leave events (see channel_members.py)
+members = MembershipCache()
+_member_syncs = {}   # channel_id -> asyncio.Lock, so one task fetches a channel at a time
+
+
+async def _fetch_members(channel_id):
+    """Every member of a channel, following conversations.members pagination."""
+    out = []
+    cursor = None
+    while True:
+        resp = await slack_call("conversations_members", channel=channel_id, limit=MEMBERS_PAGE_SIZE, cursor=cursor)
+        out.extend(resp.get("members", []))
+        cursor = (resp.get("response_metadata") or {}).get("next_cursor")
+        if not cursor:
+            return out
+
+
+async def get_channel_players(channel_id):
+    """Return all user IDs in the channel (excluding the bot itself)."""
+    if members.bot_user_id is None:
+        members.bot_user_id = (await slack_call("auth_test"))["user_id"]
+    if members.needs_sync(channel_id):
+        async with _member_syncs.setdefault(channel_id, asyncio.Lock()):
+            if members.needs_sync(channel_id):
+                members.replace(channel_id, await _fetch_members(channel_id))
+    return members.players(channel_id)
+
+
+def request_admission(channel_id):
+    """Someone joined a game channel: (re)start its quiet window (see admission.py)."""
+    if not channel_id:
+        return
+    if GAME_CHANNEL_IDS and channel_id not in GAME_CHANNEL_IDS:
+        return
+
+    handle = _admission_timers.pop(channel_id, None)
+    if handle:
+        handle.cancel()
+    _admission_timers[channel_id] = asyncio.get_running_loop().call_later(
+        admission.note_join(channel_id), lambda: asyncio.create_task(_on_admission_due(channel_id)))
+
+
+async def _on_admission_due(channel_id):
+    _admission_timers.pop(channel_id, None)
+    admission.close(channel_id)
+    try:
+        await start_game_when_min_players_reached(channel_id)
+    except Exception:
+        app.logger.error("Error admitting players", exc_info=True)
+
+
+async def start_game_when_min_players_reached(channel_id):
+    """
+    Start games for the channel members not in a game yet, once at least MIN_PLAYERS
+    are waiting (cohorts and overflow as in hashtag_game_multiplayer.py).
+    """
+    # One admission per channel at a time; joins that arrive meanwhile get the next window
+    if channel_id in _starting:
+        request_admission(channel_id)
+        return
+
+    _starting.add(channel_id)
+    try:
+        players = await get_channel_players(channel_id)
+
+        channel_sessions = sessions.for_channel(channel_id)
+        in_game = sessions.in_game(channel_id)
+        waiting = [u for u in players if u not in in_game]
+
+        if COHORT_OVERFLOW == "session":
+            max_cohorts = None
+        else:
+            max_cohorts = 0 if any(not s.finished for s in channel_sessions) else 1
+        cohorts, waitlist = plan_cohorts(waiting, MIN_PLAYERS, MAX_COHORT_SIZE, max_cohorts)
+
+        await asyncio.gather(*(start_game(channel_id, cohort) for cohort in cohorts))
+        if cohorts and waitlist:
+            print(f"{len(waitlist)} player(s) in {channel_id} waitlisted for the next game")
+    finally:
+        _starting.discard(channel_id)
+
+
+async def start_game(channel_id, players):
+    """Build the schedule and results file for one cohort, then open its first trial."""
+    # Only trial 1 is sampled before the game starts; later trials are built in
+    # the background while the one before runs (see start_trial)
+    schedule = PairSchedule(players, randseed=1, trialnum=TRIALNUM, neighborsize=NEIGHBORSIZE,
+                            engine=PAIRING_ENGINE, topology=TOPOLOGY)
+
+    game_id = make_round_id()
+    csv_path, round_log = _init_csv(game_id)
+    session = GameSession(
+        game_id, channel_id, players, schedule,
+        trialnum=TRIALNUM, neighborsize=NEIGHBORSIZE, csv_path=csv_path, round_log=round_log,
+    )
+    sessions.add(session)
+    store.save_game(session.to_record())
+
+    await slack_call(
+        "chat_postMessage",
+        channel=channel_id,
+        text=f"Hashtag Game starting automatically with {len(players)} players • {TRIALNUM} trials.",
+    )
+    await start_trial(session, 1)
+
+
+def score_and_outcome(session, rid, st):
+    """Evaluate a round, update points and store outcome."""
+    if not st.completed:
+        return
+    a, b = st.pair
+    st.game_outcome = round_outcome(st)
+    if st.game_outcome == "match":
+        store.save_points(session.game_id, a, session.points.add(a))
+        store.save_points(session.game_id, b, session.points.add(b))
+    store.save_round(rid, st, session.game_id)
+
+
+# CSV helpers (auto-write). append() only buffers, so it never blocks the loop
+# on disk I/O; the log's own thread writes batches (see log_writer.py).
+def _init_csv(game_id):
+    path = new_csv_path(game_id[:8])
+    return path, open_result_sink(path, CSV_HEADER, RESULT_FORMATS)
+
+def _append_round_to_csv(session, rid, st):
+    if session.round_log:
+        session.round_log.append(round_csv_row(rid, st))
+
+
+async def _announce_match(session, st):
+    """Send round result only to the two players in this pair (ephemeral)."""
+    a, b = st.pair
+    sa = st.sub_a.strip()
+    sb = st.sub_b.strip()
+    outcome = st.game_outcome or "no outcome recorded"
+
+    await asyncio.gather(
+        slack_call("chat_postEphemeral", channel=st.channel_id, user=a,
+                   text=result_text(st.trial, sa, sb, outcome, session.points.get(a, 0))),
+        slack_call("chat_postEphemeral", channel=st.channel_id, user=b,
+                   text=result_text(st.trial, sb, sa, outcome, session.points.get(b, 0))),
+    )
+
+
+async def _send_prompt(channel_id, user, partner, t, blocks):
+    try:
+        await slack_call("chat_postEphemeral", channel=channel_id, user=user,
+                         text=trial_prompt_text(t, partner), blocks=blocks)
+    except Exception:
+        app.logger.error(f"Could not send trial {t} prompt to {user}", exc_info=True)
+
+
+async def _prompt_pair(rid, st, blocks):
+    """
+    Send both players of a round their prompt, then start the round's clock. As in the
+    threaded bot, time spent waiting for Slack does not count against ROUND_TIMEOUT_SECONDS.
+    """
+    a, b = st.pair
+    await asyncio.gather(_send_prompt(st.channel_id, a, b, st.trial, blocks),
+                         _send_prompt(st.channel_id, b, a, st.trial, blocks))
+    if not st.closed:
+        round_timers.schedule(rid, ROUND_TIMEOUT_SECONDS)
+
+
+async def start_trial(session, t):
+    """Open all pairs for trial t and send every prompt concurrently (bounded by SLACK_CONCURRENCY)."""
+    ch = session.channel_id
+    schedule = session.schedule_by_trial
+    if not schedule.ready(t):
+        # The pairing sampler is CPU-bound; keep it off the event loop
+        await asyncio.to_thread(schedule.__getitem__, t)
+    pairs = schedule[t]
+
+    # Register every round before the first await, so a submit arriving
+    # mid-fan-out already sees the whole trial. Each round's deadline starts
+    # once its prompts are out (see _prompt_pair).
+    rids = []
+    sends = []
+    for a, b in pairs:
+        rid = make_round_id()
+        rids.append(rid)
+        st = session.rounds[rid] = new_round(a, b, t, ch)
+        store.save_round(rid, st, session.game_id)
+        sends.append(_prompt_pair(rid, st, trial_prompt_blocks(t, rid)))   # same button for both players
+    sessions.add_rounds(session, rids)
+    session.open_trial(t, len(rids))
+    session.rids_by_trial[t] = rids
+    session.current_trial = t
+    store.save_game(session.to_record())
+    schedule.prefetch(t + 1)
+
+    # Every player of this trial dropped out: there is nothing to wait for
+    if not rids:
+        await _advance_trial(session, t)
+        return
+    await asyncio.gather(*sends)
+
+
+async def maybe_advance_trial(session, t):
+    """
+    Call once after closing a round of trial t. When that was the trial's last open
+    round (the session's countdown reaches zero), open the next trial (if any).
+    Exactly one caller advances, even if the advance awaits and other rounds' handlers run meanwhile.
+    """
+    if session.close_round(t):
+        await _advance_trial(session, t)
+
+
+async def _advance_trial(session, t):
+    rids = session.rids_by_trial.get(t, [])
+
+    # The trial is over: its rounds now live only in the store
+    sessions.drop_rounds(rids)
+    for r in rids:
+        session.rounds.pop(r, None)
+
+    # Write this trial's rows (and its convergence stats) out before moving on (off the loop: it may fsync)
+    store.save_trial_stats(session.game_id, t, session.convergence.finish(t))
+    await asyncio.to_thread(session.round_log.flush)
+    await asyncio.to_thread(store.flush)
+
+    next_t = t + 1
+    if next_t <= session.trialnum:
+        await start_trial(session, next_t)
+    else:
+        # Every round is closed and logged: finish the files and stop the log's flusher thread
+        await asyncio.to_thread(session.round_log.close)
+        session.finished = True
+        store.save_game(session.to_record())
+        await asyncio.to_thread(store.flush)
+        sessions.finish(session)
+        await slack_call(
+            "chat_postMessage",
+            channel=session.channel_id,
+            text="All trials complete. Type `@Demo App scores` for the leaderboard.",
+        )
+
+        # Waitlisted players (if any) can start the channel's next game
+        request_admission(session.channel_id)
+
+
+# ============== Actions & Views ==============
+
+@app.action("open_submit_modal")
+async def open_submit_modal(ack, body, client):
+    await ack()
+    rid = body["actions"][0]["value"]
+    _, st = _open_round(rid)
+    if not st:
+        return
+    await client.views_open(trigger_id=body["trigger_id"], view=submit_modal_view(rid, st.trial))
+
+
+@app.view("submit_hashtag_view")
+async def handle_submit(ack, body, view):
+    """Record a player's hashtag; when both have submitted, score, log, announce and maybe advance."""
+    await ack()
+
+    rid = view["private_metadata"]
+    user = body["user"]["id"]
+    session, st = _open_round(rid)
+    if not st or st.closed or not st.has(user):   # only the round's two players can submit to it
+        return
+
+    value = submitted_value(view)
+    previous = st.sub(user) if st.submitted(user) else None
+    st.submit(user, value)
+    session.convergence.submitted(st.trial, value, previous)
+    both = st.both_submitted()
+    store.save_round(rid, st, session.game_id)
+    session.attended(user)
+
+    if both:
+        # Close before the first await so the timer and the partner's
+        # submit cannot both close the same round
+        st.completed = True
+        st.closed = True
+        round_timers.cancel(rid)
+        score_and_outcome(session, rid, st)
+        session.convergence.round_closed(st.trial, st.game_outcome)
+        _append_round_to_csv(session, rid, st)
+
+    # let this user know we're waiting on their partner
+    await slack_call("chat_postEphemeral", channel=st.channel_id, user=user,
+                     text="⏳ Waiting for your partner’s submission…")
+
+    if both:
+        await _announce_match(session, st)
+        await maybe_advance_trial(session, st.trial)
+
+
+# ============== Mention-based controls ==================
+
+@app.event("member_joined_channel")
+async def handle_member_joined_channel(body, logger):
+    try:
+        event = body.get("event", {})
+        members.joined(event.get("channel"), event.get("user"))
+        # A player who left a running game and came back is paired again in trials not built yet
+        for session in sessions.for_channel(event.get("channel")):
+            if not session.finished and session.restore_player(event.get("user")):
+                store.save_game(session.to_record())
+        request_admission(event.get("channel"))
+    except Exception:
+        logger.error("Error in handle_member_joined_channel", exc_info=True)
+
+
+@app.event("member_left_channel")
+async def handle_member_left_channel(body):
+    event = body.get("event", {})
+    channel_id, user = event.get("channel"), event.get("user")
+    members.left(channel_id, user)
+    for session in sessions.for_channel(channel_id):
+        if not session.finished:
+            _drop_player(session, user, "left the channel")
+
+
+@app.event("app_mention")
+async def on_mention(body, say):
+    event = body.get("event", {})
+    text = (event.get("text") or "").lower()
+    if "scores" in text:
+        # Leaderboard of the latest game in this channel
+        session = sessions.latest_for_channel(event.get("channel"))
+        top = session.points.top(3) if session else []
+        await say(leaderboard_text(top))
+        return
+    if "convergence" in text:
+        # Live per-trial hashtag stats of the latest game in this channel
+        session = sessions.latest_for_channel(event.get("channel"))
+        history = session.convergence.history() if session else []
+        await say(convergence_text(history, reveal_tags=bool(session and session.finished)))
+        return
+    await say("Try: `@Demo App scores` to view the leaderboard, or `@Demo App convergence` for per-trial hashtag stats.")
+
+
+# ============== Entrypoint ==============
+
+async def main():
+    metrics.start_from_env()
+    timers = asyncio.create_task(round_timers.run())
+    members.bot_user_id = (await slack_call("auth_test"))["user_id"]   # resolved once
+    await resume_games()
+    try:
+        await AsyncSocketModeHandler(app, SLACK_APP_TOKEN).start_async()
+    finally:
+        timers.cancel()
+
+
+if __name__ == "__main__":
+    print("Starting async Socket Mode handler...")
+    asyncio.run(main())
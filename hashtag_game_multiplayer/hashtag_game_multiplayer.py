@@ -1,437 +1,470 @@
-import os, time, csv
-import uuid
+import os
+import time
 import threading
-from collections import defaultdict
 from concurrent.futures import ThreadPoolExecutor
-from datetime import datetime
 from dotenv import load_dotenv
 from slack_bolt import App
 from slack_bolt.adapter.socket_mode import SocketModeHandler
-from mixing import network_connection_spatial
+from deadline_scheduler import DeadlineScheduler
+from result_sinks import open_result_sink
+from state_store import open_state_store
+from game_sessions import GameSession, SessionRegistry, StripedLocks
+from channel_members import MembershipCache, fetch_members
+from admission import AdmissionWindow, plan_cohorts
+from slack_dispatch import SlackDispatcher, parse_limits, PRIORITY_PROMPT, PRIORITY_RESULT, PRIORITY_ACK
+from game_logic import (
+    TRIALNUM, NEIGHBORSIZE, ROUND_TIMEOUT_SECONDS, MIN_PLAYERS, PAIRING_ENGINE, TOPOLOGY, RESULT_FORMATS, CSV_HEADER,
+    ADMISSION_QUIET_SECONDS, ADMISSION_MAX_WAIT_SECONDS, MAX_COHORT_SIZE, COHORT_OVERFLOW, DROPOUT_TIMEOUTS,
+    make_round_id, PairSchedule,
+    new_round, round_outcome, round_csv_row, new_csv_path,
+    trial_prompt_text, trial_prompt_blocks, submit_modal_view, result_text, submitted_value, leaderboard_text,
+    convergence_text,
+)
 import traceback 
+import metrics
+import profiling
+from schedule_cache import get_default_cache
 
 
 load_dotenv()
 SLACK_BOT_TOKEN = os.environ["SLACK_BOT_TOKEN"]
 SLACK_SIGNING_SECRET = os.environ["SLACK_SIGNING_SECRET"]
 SLACK_APP_TOKEN = os.environ["SLACK_APP_TOKEN"]  # Socket Mode
-GAME_CHANNEL_ID = os.environ.get("GAME_CHANNEL_ID") 
-
-# Game Settings
-TRIALNUM = 3                    # Number of rounds in a game
-NEIGHBORSIZE = 2                # Size of each player's neighborhood in the spatial network
-ROUND_TIMEOUT_SECONDS = 60      # How long players have to respond in each round (seconds)
-MIN_PLAYERS = 4                # Minimum number of players required to start a game 
-
-app = App(token=SLACK_BOT_TOKEN, signing_secret=SLACK_SIGNING_SECRET)
-
-round_state = {}                   # Tracks per-round metadata (e.g., start/end timestamps)
-# round_state structure:
-# {
-#   round_id: {
-#       "pair": (player_a, player_b),           # tuple of player IDs in this round
-#       "trial": int,                           # trial number this round belongs to
-#       "subs": {player_id: hashtag_str | None},# each player’s submission (None until submitted)
-#       "submitted": {player_id: bool},         # whether each player submitted
-#       "completed": bool,                      # True when both submitted
-#       "started_at": float,                    # Unix timestamp when round started
-#       "channel_id": str,                      # Slack channel ID for this round
-#       "game_outcome": str | None              # "match" or "no match"
-#   },
-#   ...
-# }
-player_points = defaultdict(int)   # Maps user_id -> accumulated score
-
-current_game = {
-    "players": [],         
-    "channel_id": None,
-    "trialnum": TRIALNUM,
-    "neighborsize": NEIGHBORSIZE,
-    "current_trial": 0,
-    "schedule_by_trial": {},   # {t: [(a,b), ...]}
-    "rids_by_trial": {},       # {t: [rid, ...]}
-    "csv_path": None,          # auto-append here
-}
-
-_csv_lock = threading.Lock() #creates a lock object — ensures only one thread at a time can access a the CSV file
-
-def make_round_id():
-    return uuid.uuid4().hex #changed round id from datetime-->UUID (due to concurrent player submissions)
-
-def normalize_tag(s):
-    """Lowercase, drop a single leading '#', trim whitespace. Return '' for no hashtag submissions."""
-    if not s:
-        return ""
-    s = s.strip()
-    if s.startswith("#"):
-        s = s[1:].strip()
-    return s.lower()
+# Channels games may run in (comma separated); unset = any channel the bot is in
+GAME_CHANNEL_IDS = {c.strip() for c in os.environ.get("GAME_CHANNEL_ID", "").split(",") if c.strip()}
+GAME_STATE_DB = os.environ.get("GAME_STATE_DB", "game_state.sqlite3")   # "" = no durable state
+# "0" skips the auth.test call at startup (offline runs with a stand-in client, see benchmark.py)
+SLACK_TOKEN_VERIFICATION = os.environ.get("SLACK_TOKEN_VERIFICATION", "1") != "0"
+
+# Game Settings live in game_logic.py (shared with the asyncio runtime, hashtag_game_async.py)
+
+app = App(token=SLACK_BOT_TOKEN, signing_secret=SLACK_SIGNING_SECRET,
+          token_verification_enabled=SLACK_TOKEN_VERIFICATION)
+
+# Every change to rounds, scores and games is written through to the state store
+# (SQLite, see state_store.py). Only the current trial's rounds stay in memory;
+# earlier ones are read back from the store by _find_round, and a restarted bot
+# picks up its unfinished games with resume_games.
+store = open_state_store(GAME_STATE_DB)
+
+# One GameSession per running game (see game_sessions.py), any number of channels at once.
+# session.rounds maps round_id -> RoundRecord (see round_records.py):
+#   pair          (player_a, player_b) user IDs (stored as small ints a, b)
+#   trial         trial number this round belongs to
+#   sub_a, sub_b  each player's submission ('' until submitted); st.submit(user, value)
+#   flags         submitted_a / submitted_b / completed / closed bits
+#   started_at    Unix timestamp (float) when the round started
+#   channel_id    Slack channel ID for this round
+#   game_outcome  "match", "no match", "timeout" or None
+sessions = SessionRegistry()
+
+# A round is only read-and-changed under its lock stripe, so a submit and a timeout
+# (or two submits) cannot both close it; closing decrements the session's per-trial
+# open-rounds count and whoever reaches zero advances the trial.
+ROUND_LOCK_STRIPES = 64
+round_locks = StripedLocks(ROUND_LOCK_STRIPES)
+
+# All outgoing chat messages go through this queue: rate limited per Slack method,
+# prompts sent before results before acks, 429s retried after Retry-After.
+SLACK_WORKERS = 8               # Max Slack chat calls in flight at once
+# e.g. SLACK_RATE_LIMITS="chat_postEphemeral=5:50" (calls/s:burst) on a workspace allowed more than the defaults
+SLACK_RATE_LIMITS = parse_limits(os.environ.get("SLACK_RATE_LIMITS", ""))
+outbox = SlackDispatcher(workers=SLACK_WORKERS, limits=SLACK_RATE_LIMITS)
+
+# Channel members, kept up to date from join/leave events (see channel_members.py)
+members = MembershipCache()
 
 def get_channel_players(client, channel_id):
     """Return all user IDs in the channel (excluding the bot itself)."""
-    bot_user_id = client.auth_test()["user_id"]
-    resp = client.conversations_members(channel=channel_id)
-    members = resp.get("members", [])
-    return [m for m in members if m != bot_user_id]
+    if members.bot_user_id is None:
+        members.bot_user_id = client.auth_test()["user_id"]
+    members.ensure(channel_id, lambda ch: fetch_members(client, ch))
+    return members.players(channel_id)
 
-def start_game_when_min_players_reached(client, channel_id):
+def request_admission(client, channel_id):
     """
-    Auto start the game in the designated game channel once MIN_PLAYERS
-    are present.
+    Someone joined a game channel: (re)start its quiet window. The players waiting
+    are admitted once, when the window closes (see admission.py).
     """
-
     if not channel_id:
         return
 
-    # Only run in the one designated game channel
-    if GAME_CHANNEL_ID and channel_id != GAME_CHANNEL_ID:
+    # Only run in the designated game channels
+    if GAME_CHANNEL_IDS and channel_id not in GAME_CHANNEL_IDS:
         return
 
-    # Do not start another game if one is already in progress
-    if current_game.get("channel_id") and current_game.get("current_trial", 0) > 0:
-        return
+    admission_timers.schedule(channel_id, admission.note_join(channel_id), client)
+
+def _on_admission_due(channel_id, client):
+    admission.close(channel_id)
+    try:
+        start_game_when_min_players_reached(client, channel_id)
+    except Exception:
+        traceback.print_exc()
+
+# Joins are debounced per channel; admissions run one at a time on this timer's thread
+admission = AdmissionWindow(ADMISSION_QUIET_SECONDS, ADMISSION_MAX_WAIT_SECONDS)
+admission_timers = DeadlineScheduler(_on_admission_due, name="admission")
 
+def start_game_when_min_players_reached(client, channel_id):
+    """
+    Start games for the channel members who are not in a game yet, once at least
+    MIN_PLAYERS are waiting: one game per cohort of up to MAX_COHORT_SIZE. With
+    COHORT_OVERFLOW = "waitlist" a channel runs one game at a time and the rest
+    wait for it to end. Games in different channels run side by side.
+    """
     players = get_channel_players(client, channel_id)
-    num_players = len(players)
 
-    # Wait until threshold is reached
-    if num_players < MIN_PLAYERS:
-        return
+    channel_sessions = sessions.for_channel(channel_id)
+    in_game = sessions.in_game(channel_id)
+    waiting = [u for u in players if u not in in_game]
+
+    if COHORT_OVERFLOW == "session":
+        max_cohorts = None
+    else:
+        max_cohorts = 0 if any(not s.finished for s in channel_sessions) else 1
+    cohorts, waitlist = plan_cohorts(waiting, MIN_PLAYERS, MAX_COHORT_SIZE, max_cohorts)
 
+    for cohort in cohorts:
+        start_game(client, channel_id, cohort)
+    if cohorts and waitlist:
+        print(f"{len(waitlist)} player(s) in {channel_id} waitlisted for the next game")
+
+def start_game(client, channel_id, players):
+    """Build the schedule and results file for one cohort, then open its first trial."""
+    num_players = len(players)
     trialnum = TRIALNUM       # tunable
     neighborsize = NEIGHBORSIZE   # tunable
 
-    # Generate round schedule using spatial pairing logic
-    schedule = build_pair_schedule_spatial(
-        players,
-        randseed=1,
-        trialnum=trialnum,
-        neighborsize=neighborsize,
+    # Generate round schedule using spatial pairing logic. Only trial 1 is sampled
+    # here; each later trial is built in the background while the one before runs
+    with metrics.timer("schedule_build_seconds"), profiling.section("schedule_build"):
+        schedule_by_trial = PairSchedule(
+            players,
+            randseed=1,
+            trialnum=trialnum,
+            neighborsize=neighborsize,
+            engine=PAIRING_ENGINE,
+            topology=TOPOLOGY,
+        )
+        schedule_by_trial[1]
+
+    # Create the session (player scores start at 0) with its own CSV log
+    game_id = make_round_id()
+    csv_path, round_log = _init_csv(game_id)
+    session = GameSession(
+        game_id, channel_id, players, schedule_by_trial,
+        trialnum=trialnum, neighborsize=neighborsize, csv_path=csv_path, round_log=round_log,
     )
-    schedule_by_trial = group_pairs_by_trial(schedule)
-
-    # Initialize player scores (ensures 0 shows on leaderboard)
-    for u in players:
-        _ = player_points[u]
-
-    # Create a new CSV log for this session
-    csv_path = _init_csv()
-
-    # Store the current game configuration
-    current_game.update({
-        "players": players,
-        "channel_id": channel_id,
-        "trialnum": trialnum,
-        "neighborsize": neighborsize,
-        "current_trial": 0,
-        "schedule_by_trial": schedule_by_trial,
-        "rids_by_trial": {},
-        "csv_path": csv_path,
-    })
+    sessions.add(session)
+    store.save_game(session.to_record())
 
     # Announce game start and begin first trial
-    app.client.chat_postMessage(
+    outbox.submit(
+        client, "chat_postMessage", PRIORITY_PROMPT,
         channel=channel_id,
         text=f"Hashtag Game starting automatically with {num_players} players • {trialnum} trials."
     )
 
-    start_trial(client, 1)
+    start_trial(client, session, 1)
+    return session
 
 
-def score_and_outcome(rid):
+# Session / state store helpers
+def _find_round(rid):
+    """
+    (session, RoundRecord) for rid, or (None, None). Open rounds are found through
+    the registry's rid index; rounds of finished trials are read back from the store.
+    """
+    session = sessions.for_rid(rid)
+    if session is not None:
+        st = session.rounds.get(rid)
+        if st is not None:
+            return session, st
+    found = store.find_round(rid)
+    if not found:
+        return None, None
+    st, game_id = found
+    session = sessions.get(game_id)
+    return (session, st) if session else (None, None)
+
+def resume_games(client):
+    """
+    Reload every unfinished game from the state store after a restart and carry on
+    with the trial each was in. Open rounds get a fresh timeout. Returns the number
+    of games resumed.
+    """
+    resumed = 0
+    for game in store.load_active_games():
+        if not game["rids_by_trial"]:
+            continue
+        t = game["current_trial"]
+        rids = set(game["rids_by_trial"].get(t, []))
+        rounds = {rid: st for rid, st in store.rounds_for_trial(game["game_id"], t).items() if rid in rids}
+
+        session = GameSession.from_record(
+            game, round_log=open_result_sink(game["csv_path"], CSV_HEADER, RESULT_FORMATS))
+        session.points.update(store.load_points(game["game_id"]))
+        session.rounds.update(rounds)
+        session.convergence.load(store.load_trial_stats(game["game_id"]))
+        session.convergence.replay(rounds.values())
+        sessions.add(session)
+        sessions.add_rounds(session, rounds)
+
+        open_rids = [rid for rid, st in rounds.items() if not st.closed]
+        session.open_trial(t, len(open_rids))
+        for rid in open_rids:
+            schedule_round_timeout(rid, client)
+        print(f"Resumed game {game['game_id']} in {game['channel_id']} at trial {t} ({len(open_rids)} open rounds)")
+        resumed += 1
+
+        if not open_rids:
+            _advance_trial(client, session, t)
+    return resumed
+
+
+def score_and_outcome(session, rid, st):
     """Evaluate a round, update points and store outcome."""
-    st = round_state.get(rid)
-    if not st or not st["completed"]:
+    if not st.completed:
         return
-    a, b = st["pair"]
-    sa = normalize_tag(st["subs"][a]) #hashtag submission from player a
-    sb = normalize_tag(st["subs"][b]) #hashtag submission from player b
-    if sa and sb and sa == sb:
-        st["game_outcome"] = "match"
-        player_points[a] += 1
-        player_points[b] += 1
-    else:
-        st["game_outcome"] = "no match"
-
-def build_pair_schedule_spatial(players, *, randseed=1, trialnum=5, neighborsize=4): #default parameters, do not change experiment values here
-    """Builds a pairing schedule (player1, player2, trial_number) using spatial network logic.
-    
-    Each row in the output corresponds to a pair of players for a given trial.
-    Example output of this function:
-        [
-            ('@U01', '@U02', 1),
-            ('@U03', '@U04', 1),
-            ('@U01', '@U03', 2),
-            ...
-        ]
-
-    Notes:
-    - Do NOT tune `trialnum` or `neighborsize` here.
-      These are default values only — the actual experiment parameters
-      should be set in the main control flow inside `on_mention()`
-    - For a fully connected (homogeneous) network where every player
-      interacts with every other player, set: 
-        neighborsize = len(players) - 1
-    """    
-    idx_to_user = {i + 1: u for i, u in enumerate(players)}
-    conn = network_connection_spatial(
-        randseed=randseed,
-        nodesnum=len(players),
-        trialnum=trialnum,
-        neighborsize=neighborsize,
-    )
-    # Convert the NumPy array of network connections into a standard Python list.
-    # Each row has the format: [player1_index, player2_index, trial_number]
-    connection_list = conn.tolist()
-
-    # Sort connections by trial number(row 2) first, then by player1 index(row 0), then by player2 index(row 1).
-    connection_list.sort(key=lambda row: (row[2], row[0], row[1]))
-
-    # Map player indices to usernames, keeping the trial number for scheduling
-    pair_schedule = []
-    for player1_idx, player2_idx, trial_num in connection_list:
-        player1 = idx_to_user[player1_idx]
-        player2 = idx_to_user[player2_idx]
-        pair_schedule.append((player1, player2, int(trial_num)))  # int(trial_num) because coming from numpy.int64
-
-    return pair_schedule
-
-
-def group_pairs_by_trial(schedule_with_trials):
-    """takes schedule made in build_pair_schedule_spatial and groups by trial number
-    [(a,b,t)] -> {t: [(a,b), ...]}"""
-    grouped = defaultdict(list)
-    for a, b, t in schedule_with_trials:
-        grouped[t].append((a, b))
-    return dict(sorted(grouped.items()))
-
-def schedule_round_timeout(rid, client, timeout=ROUND_TIMEOUT_SECONDS):
+    a, b = st.pair
+    st.game_outcome = round_outcome(st)
+    if st.game_outcome == "match":
+        store.save_points(session.game_id, a, session.points.add(a))
+        store.save_points(session.game_id, b, session.points.add(b))
+    store.save_round(rid, st, session.game_id)
+
+def _on_round_timeout(rid, client):
     """
-    After `timeout` seconds, if the round is still open,
-    mark it as closed due to timeout, write CSV, and maybe advance the trial.
+    Called by round_timers when a round's deadline passes. If the round is
+    still open, mark it as closed due to timeout, write CSV, and maybe advance the trial.
     """
-    def _timeout_worker():
-        time.sleep(timeout)       # Sleep for `timeout` seconds. After the pause, this thread will check if the round is still open.
-
-        st = round_state.get(rid)
-        if not st:
-            return
+    session, st = _find_round(rid)
+    if not st:
+        return
 
+    with round_locks.lock_for(rid):
         # If already closed (both submitted and handled), do nothing
-        if st.get("closed"):
+        if st.closed:
             return
 
         # Round timed out
-        st["closed"] = True
-        if not st.get("game_outcome"):
-            st["game_outcome"] = "timeout"   #If the round doesn’t already have an outcome recorded (like "submitted"),set the outcome to "timeout".
-
-        # Write a row even if one or both hashtags are missing
-        _append_round_to_csv(rid)
-
-        # Try to advance to the next trial
-        maybe_advance_trial(client)
-
-    # Start a background thread that waits `timeout` seconds, then checks
-    # whether the round is still open and times it out if needed. Using
-    # daemon=True ensures this timer thread won't block the bot from exiting.
-    threading.Thread(target=_timeout_worker, daemon=True).start()
+        st.closed = True
+        if not st.game_outcome:
+            st.game_outcome = "timeout"   #If the round doesn’t already have an outcome recorded (like "submitted"),set the outcome to "timeout".
+        store.save_round(rid, st, session.game_id)
+
+    metrics.inc("rounds_closed_total", outcome="timeout")
+    session.convergence.round_closed(st.trial, "timeout")
+    _note_timeouts(session, st)
+
+    # Write a row even if one or both hashtags are missing
+    _append_round_to_csv(session, rid, st)
+
+    # Try to advance to the next trial
+    maybe_advance_trial(client, session, st.trial)
+
+def _note_timeouts(session, st):
+    """A player who lets DROPOUT_TIMEOUTS rounds in a row time out is re-matched around from the next trial."""
+    for user in st.pair:
+        if not st.submitted(user) and session.missed_round(user) == DROPOUT_TIMEOUTS:
+            _drop_player(session, user, f"let {DROPOUT_TIMEOUTS} rounds in a row time out")
+
+def _drop_player(session, user, reason):
+    if session.drop_player(user):
+        store.save_game(session.to_record())     # a restarted bot keeps them out too
+        print(f"{user} {reason}: re-matching their partners in game {session.game_id} from the next trial")
+
+# One worker thread sleeps until the earliest round deadline (see deadline_scheduler.py),
+# instead of one sleeping thread per round. Rounds closed by handle_submit are cancelled.
+# Expired rounds are closed on a small pool, so the timeout that advances a trial
+# (stats, flushes, the next trial's pairs) does not delay the other deadlines.
+TIMEOUT_WORKERS = 4
+round_timers = DeadlineScheduler(
+    _on_round_timeout,
+    executor=ThreadPoolExecutor(TIMEOUT_WORKERS, thread_name_prefix="round-timeout"),
+)
+
+def schedule_round_timeout(rid, client, timeout=None):
+    """After `timeout` seconds (default ROUND_TIMEOUT_SECONDS), time the round out unless it was closed (and cancelled) first."""
+    if timeout is None:
+        timeout = ROUND_TIMEOUT_SECONDS
+    round_timers.schedule(rid, timeout, client)
 
 # CSV helpers (auto-write) 
-def _init_csv():
-    """Initializes CSV with headers and returns path."""
-    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-    path = f"submissions_{ts}.csv"
-    with _csv_lock, open(path, "w", newline="") as f:
-        w = csv.writer(f)
-        w.writerow([
-            "round_id",
-            "trial",
-            "player_a",
-            "player_b",
-            "player_a_hashtag",
-            "player_b_hashtag",
-            "completed",      # 0 = incomplete, 1 = both submitted
-            "started_at",
-            "game_outcome",
-        ])
-    return path
-
-def _append_round_to_csv(rid):
-    """Append one round's submission data and outcome to the game CSV."""
-    st = round_state.get(rid)
-    if not st:
-        return
+def _init_csv(game_id):
+    """
+    Opens a new session CSV with headers (plus any other RESULT_FORMATS) and returns (path, log).
+    The files stay open; rows are buffered and written in batches, one batch per trial at least.
+    """
+    path = new_csv_path(game_id[:8])
+    return path, open_result_sink(path, CSV_HEADER, RESULT_FORMATS)
 
-    a, b = st["pair"]
-
-    # Safe even if one or both players never submitted
-    sa = st["subs"].get(a, "")
-    sb = st["subs"].get(b, "")
-
-    row = [
-        rid,
-        st["trial"],
-        a,
-        b,
-        sa,
-        sb,
-        1 if st.get("completed") else 0,  # 1 only if both submitted
-        st["started_at"],
-        st.get("game_outcome"),
-    ]
-
-    path = current_game.get("csv_path")
-    if not path:
+def _append_round_to_csv(session, rid, st):
+    """Append one round's submission data and outcome to the game's CSV."""
+    if not session.round_log:
         return
 
-    with _csv_lock, open(path, "a", newline="") as f:
-        csv.writer(f).writerow(row)
+    session.round_log.append(round_csv_row(rid, st))
 
-def _announce_match(client, rid):
+def _announce_match(client, session, st):
     """
     Send round result only to the two players in this pair (ephemeral)
     """
-    st = round_state.get(rid)
-    if not st:
-        return
-
-    a, b = st["pair"]
-    ch = st["channel_id"]
+    a, b = st.pair
+    ch = st.channel_id
 
-    sa = (st["subs"].get(a) or "").strip()          #submission a
-    sb = (st["subs"].get(b) or "").strip()          #submission b
-    outcome = st.get("game_outcome") or "no outcome recorded"
+    sa = st.sub_a.strip()          #submission a
+    sb = st.sub_b.strip()          #submission b
+    outcome = st.game_outcome or "no outcome recorded"
 
-    # Get each player's current points (if you use player_points dict)
-    points_a = player_points.get(a, 0)
-    points_b = player_points.get(b, 0)
+    # Get each player's current points in this game
+    points_a = session.points.get(a, 0)
+    points_b = session.points.get(b, 0)
 
     # Message just for player a
-    client.chat_postEphemeral(
+    outbox.submit(
+        client, "chat_postEphemeral", PRIORITY_RESULT,
         channel=ch,
         user=a,
-        text=(
-            f"*Trial {st['trial']} result*\n"
-            f"• Your hashtag: `{sa or '(no hashtag)'}`\n"
-            f"• Partner: `{sb or '(no hashtag)'}`\n"
-            f"• Outcome: *{outcome}*\n"
-            f"• Your total points: *{points_a}*"
-        ),
+        text=result_text(st.trial, sa, sb, outcome, points_a),
     )
 
     # Message just for player b
-    client.chat_postEphemeral(
+    outbox.submit(
+        client, "chat_postEphemeral", PRIORITY_RESULT,
         channel=ch,
         user=b,
-        text=(
-            f"*Trial {st['trial']} result *\n"
-            f"• Your hashtag: `{sb or '(no hashtag)'}`\n"
-            f"• Partner: `{sa or '(no hashtag)'}`\n"
-            f"• Outcome: *{outcome}*\n"
-            f"• Your total points: *{points_b}*"
-        ),
+        text=result_text(st.trial, sb, sa, outcome, points_b),
     )
 
 
 
 
 # Trial orchestration 
-def _send_pair_ephemerals(client, channel_id, a, b, t, rid):
+def _send_pair_ephemerals(client, session, a, b, t, rid):
     """
     Set up round state for pair (a, b) in trial t and send each their ephemeral
-    with a 'Submit hashtag' button that opens the modal.
+    with a 'Submit hashtag' button that opens the modal. Returns the send futures.
     """
-    # Create round record
-    round_state[rid] = {
-        "pair": (a, b),
-        "trial": t,
-        "subs": {a: "", b: ""},           # empty string instead of None
-        "submitted": {a: False, b: False},
-        "completed": False,               # both submitted?
-        "closed": False,                  # finished by submit or timeout
-        "started_at": datetime.now().isoformat(),
-        "channel_id": channel_id,
-        "game_outcome": None,
-    }
-
-    # Send ephemerals to both, with a button that clearly shows the trial
-    for user, partner in ((a, b), (b, a)):
-        client.chat_postEphemeral(
-            channel=channel_id,
-            user=user,
-            text=f"*Trial {t}* • You are matched with <@{partner}>.",
-            blocks=[
-                {
-                    "type": "section",
-                    "text": {
-                        "type": "mrkdwn",
-                        "text": f"*Trial {t}*\n Click below to submit your hashtag."
-                    },
-                },
-                {
-                    "type": "actions",
-                    "elements": [
-                        {
-                            "type": "button",
-                            "text": {
-                                "type": "plain_text",
-                                "text": f"Submit hashtag (Trial {t})"
-                            },
-                            "style": "primary",
-                            "action_id": "open_submit_modal",  # wired to the @app.action below
-                            "value": rid,                       # we pass rid so we can look up trial later
-                        }
-                    ]
-                }
-            ],
-        )
-
-    # Start timeout clock for this round
-    schedule_round_timeout(rid, client)
-
+    channel_id = session.channel_id
 
+    # Create round record
+    st = session.rounds[rid] = new_round(a, b, t, channel_id)
+    store.save_round(rid, st, session.game_id)
 
-def start_trial(client, t):
-    """Open all pairs for trial t (concurrent within trial)."""
-    ch = current_game["channel_id"]
-    pairs = current_game["schedule_by_trial"][t]
-    rids = []
-
-    # Ensure everyone appears on /scores including players with 0 points.
-    for u in current_game["players"]:
-        _ = player_points[u]
-
-    # len(pairs) = number of player pairs for this trial
-    # we make 1 thread per pair so all pairs can start concurrently
-    with ThreadPoolExecutor(max_workers=len(pairs)) as pool:
-        for a, b in pairs:
-            rid = make_round_id()
-            rids.append(rid)
-            pool.submit(_send_pair_ephemerals, client, ch, a, b, t, rid)
-
-    # after all threads complete, store the round IDs for this trial
-    current_game["rids_by_trial"][t] = rids
-    current_game["current_trial"] = t
+    # Queue ephemerals to both, with a button that clearly shows the trial
+    blocks = trial_prompt_blocks(t, rid)       # same button for both players
+    sends = []
+    for user, partner in ((a, b), (b, a)):
+        sends.append(outbox.submit(
+            client, "chat_postEphemeral", PRIORITY_PROMPT,
+            channel=channel_id, user=user, text=trial_prompt_text(t, partner), blocks=blocks,
+        ))
+
+    # Start timeout clock for this round once both prompts are out (or gave up),
+    # so time spent waiting in the outbox under rate limits does not count
+    remaining = [len(sends)]
+    remaining_lock = threading.Lock()
+    def _on_sent(_):
+        with remaining_lock:
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+        schedule_round_timeout(rid, client)
+    for fut in sends:
+        fut.add_done_callback(_on_sent)
+    return sends
+
+
+
+def _observe_fanout(sends, started):
+    """Record how long the trial's prompts took to go out, once the last one is done."""
+    remaining = [len(sends)]
+    remaining_lock = threading.Lock()
+    def _on_sent(_):
+        with remaining_lock:
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+        metrics.observe("trial_fanout_seconds", time.perf_counter() - started)
+    for fut in sends:
+        fut.add_done_callback(_on_sent)
+
+@metrics.timed("trial_start_seconds")
+@profiling.hook("start_trial")
+def start_trial(client, session, t):
+    """Open all pairs for trial t (prompts are queued on the outbox and sent concurrently)."""
+    started = time.perf_counter()
+    profiling.trial_started(session.game_id, t)
+    pairs = session.schedule_by_trial[t]
+    rids = [make_round_id() for _ in pairs]
+
+    # Index and count the rounds first so a fast submit can already find (and close) its round
+    sessions.add_rounds(session, rids)
+    session.open_trial(t, len(rids))
+
+    # Queuing is cheap; the outbox workers deliver the prompts as fast as
+    # Slack's rate limits allow
+    sends = []
+    for (a, b), rid in zip(pairs, rids):
+        sends.extend(_send_pair_ephemerals(client, session, a, b, t, rid))
+    if metrics.ENABLED:
+        _observe_fanout(sends, started)
+    session.schedule_by_trial.prefetch(t + 1)
+
+    # store the round IDs for this trial
+    session.rids_by_trial[t] = rids
+    session.current_trial = t
+    store.save_game(session.to_record())
+
+    # Every player of this trial dropped out: there is nothing to wait for
+    if not rids:
+        _advance_trial(client, session, t)
 
 
-def maybe_advance_trial(client):
-    """If all pairs in current trial are closed (submitted or timed out), open the next trial (if any)."""
-    t = current_game["current_trial"]
-    rids = current_game["rids_by_trial"].get(t, [])
-    if not rids:
-        return
+def maybe_advance_trial(client, session, t):
+    """
+    Call once after closing a round of trial t (submitted or timed out). When that
+    was the trial's last open round, open the next trial (if any). O(1), and only
+    one caller per trial gets to advance.
+    """
+    if session.close_round(t):
+        _advance_trial(client, session, t)
+
+def _advance_trial(client, session, t):
+    """Every round of trial t is closed: write out its rows, then start trial t+1 or end the game."""
+    profiling.trial_finished(session.game_id, t)
+    rids = session.rids_by_trial.get(t, [])
+
+    # Every row of this trial is buffered; write them out (and the trial's convergence stats) before moving on
+    store.save_trial_stats(session.game_id, t, session.convergence.finish(t))
+    session.round_log.flush()
+    store.flush()
+
+    # The trial is over: its rounds now live only in the store
+    sessions.drop_rounds(rids)
+    for r in rids:
+        session.rounds.pop(r, None)
+
+    next_t = t + 1
+    if next_t <= session.trialnum:
+        start_trial(client, session, next_t)
+    else:
+        # Every round is closed and logged: finish the files and stop the log's flusher thread
+        session.round_log.close()
+        session.finished = True
+        store.save_game(session.to_record())
+        store.flush()
+        sessions.finish(session)
+        outbox.submit(
+            client, "chat_postMessage", PRIORITY_RESULT,
+            channel=session.channel_id,
+            text="All trials complete. Type `@Demo App scores` for the leaderboard."
+        )
 
-    # All rounds must be closed, regardless of whether both submitted
-    if all(round_state[r].get("closed") for r in rids):
-        next_t = t + 1
-        if next_t <= current_game["trialnum"]:
-            start_trial(client, next_t)
-        else:
-            app.client.chat_postMessage(
-                channel=current_game["channel_id"],
-                text="All trials complete. Type `@Demo App scores` for the leaderboard."
-            )
+        # Waitlisted players (if any) can start the channel's next game
+        request_admission(client, session.channel_id)
 
 
 
@@ -439,53 +472,28 @@ def maybe_advance_trial(client):
 # ============== Actions & Views ==============
 
 @app.action("open_submit_modal")
+@metrics.timed("handler_seconds", handler="open_submit_modal")
+@profiling.hook("open_submit_modal")
 def open_submit_modal(ack, body, client):
     ack()
 
     user = body["user"]["id"]
     rid = body["actions"][0]["value"]  # we passed rid in the button
-    st = round_state.get(rid)
+    _, st = _find_round(rid)
     if not st:
         return
 
-    trial_num = st["trial"]  # get the trial #
+    trial_num = st.trial  # get the trial #
 
     trigger_id = body["trigger_id"]
 
-    client.views_open(
-        trigger_id=trigger_id,
-        view={
-            "type": "modal",
-            "callback_id": "submit_hashtag_view",
-            "private_metadata": rid,
-            
-            # Modal title with trial #
-            "title": {
-                "type": "plain_text",
-                "text": f"Trial {trial_num}"
-            },
-
-            "submit": {"type": "plain_text", "text": "Submit"},
-            "close": {"type": "plain_text", "text": "Cancel"},
-
-            "blocks": [
-                {
-                    "type": "input",
-                    "block_id": "hs",
-                    "element": {
-                        "type": "plain_text_input",
-                        "action_id": "val",
-                        "initial_value": "#",
-                        "placeholder": {"type": "plain_text", "text": "#example"}
-                    },
-                    "label": {"type": "plain_text", "text": "Write a Hashtag for the event"}
-                }
-            ]
-        }
-    )
+    with metrics.timer("slack_call_seconds", method="views_open"):
+        client.views_open(trigger_id=trigger_id, view=submit_modal_view(rid, trial_num))
 
 
 @app.view("submit_hashtag_view")
+@metrics.timed("handler_seconds", handler="handle_submit")
+@profiling.hook("handle_submit")
 def handle_submit(ack, body, client, view):
     """
     Handles a player's hashtag submission from the modal form.
@@ -497,97 +505,139 @@ def handle_submit(ack, body, client, view):
     #Extract metadata from Slack payload
     rid = view["private_metadata"]    #passed from open_submit_modal()
     user = body["user"]["id"]
-    try:
-        value_raw = (view["state"]["values"]["hs"]["val"]["value"] or "").strip()
-    except Exception:
-        value_raw = ""
+    value_clean = submitted_value(view)   # CSV has no leading '#'
 
-    # If, for any reason, this round_id doesn’t exist in memory anymore, bail quietly
-    if rid not in round_state:
+    # If, for any reason, this round_id doesn’t exist anymore, bail quietly
+    session, st = _find_round(rid)
+    if not st:
+        return
+    # Only the round's two players can submit to it (a stale or forged submit is ignored)
+    if not st.has(user):
         return
 
-    st = round_state[rid]
-    a, b = st["pair"]
-    ch = st["channel_id"]
-
-    # store a cleaned value (CSV has no leading '#')
-    value_clean = value_raw[1:].strip() if value_raw.startswith("#") else value_raw
+    ch = st.channel_id
 
-    st["subs"][user] = value_clean
-    st["submitted"][user] = True
+    with round_locks.lock_for(rid):
+        # A round already closed (by its timeout, or a repeated submit) takes no more submissions
+        if st.closed:
+            return
+        previous = st.sub(user) if st.submitted(user) else None
+        st.submit(user, value_clean)
+        session.convergence.submitted(st.trial, value_clean, previous)
+        both = st.both_submitted()
+        if both:
+            st.completed = True
+            st.closed = True
+        store.save_round(rid, st, session.game_id)
+    session.attended(user)
+    metrics.inc("submissions_total")
 
     # let this user know we're waiting on their partner 
-    client.chat_postEphemeral(channel=ch, user=user, text="⏳ Waiting for your partner’s submission…")
+    outbox.submit(client, "chat_postEphemeral", PRIORITY_ACK,
+                  channel=ch, user=user, text="⏳ Waiting for your partner’s submission…")
 
-    # If both submitted: complete, score, outcome, notify both, append CSV, maybe advance trial
-    if st["submitted"][a] and st["submitted"][b]:
-        st["completed"] = True
-        st["closed"] = True
+    # If both submitted: score, outcome, notify both, append CSV, maybe advance trial
+    if both:
+        round_timers.cancel(rid)
 
-        score_and_outcome(rid)  # sets st['game_outcome'] and gives +1 each on match
+        score_and_outcome(session, rid, st)  # sets st.game_outcome and gives +1 each on match
+        metrics.inc("rounds_closed_total", outcome=st.game_outcome)
+        session.convergence.round_closed(st.trial, st.game_outcome)
 
         # append to CSV immediately
-        _append_round_to_csv(rid)
+        _append_round_to_csv(session, rid, st)
 
-        _announce_match(client, rid)
+        _announce_match(client, session, st)
 
-        # Check if all rounds in this trial are complete/closed and start the next one
-        maybe_advance_trial(client)
+        # If this was the trial's last open round, start the next one
+        maybe_advance_trial(client, session, st.trial)
 
 
 
 # ============== Mention-based controls ==================
 @app.event("member_joined_channel")
+@metrics.timed("handler_seconds", handler="member_joined_channel")
+@profiling.hook("member_joined_channel")
 def handle_member_joined_channel(body, client, logger):
     """
-    Whenever someone joins a channel, check if we should auto start the game.
+    Whenever someone joins a channel, (re)arm its admission window; a game starts
+    once joins have gone quiet.
     """
     try:
         event = body.get("event", {})
         channel_id = event.get("channel")
-        start_game_when_min_players_reached(client, channel_id)
+        members.joined(channel_id, event.get("user"))
+        # A player who left a running game and came back is paired again in trials not built yet
+        for session in sessions.for_channel(channel_id):
+            if not session.finished and session.restore_player(event.get("user")):
+                store.save_game(session.to_record())
+        request_admission(client, channel_id)
     except Exception:
         logger.error("Error in handle_member_joined_channel", exc_info=True)
 
+@app.event("member_left_channel")
+@metrics.timed("handler_seconds", handler="member_left_channel")
+@profiling.hook("member_left_channel")
+def handle_member_left_channel(body, logger):
+    """Keep the membership cache in step when someone leaves a channel, and stop pairing them."""
+    event = body.get("event", {})
+    channel_id, user = event.get("channel"), event.get("user")
+    members.left(channel_id, user)
+    for session in sessions.for_channel(channel_id):
+        if not session.finished:
+            _drop_player(session, user, "left the channel")
+
 @app.event("app_mention")
+@metrics.timed("handler_seconds", handler="app_mention")
+@profiling.hook("app_mention")
 def on_mention(body, say, client):
     """
     Mention controls in channel:
       @Demo App scores
+      @Demo App convergence
     """
     event = body.get("event", {})
     text = (event.get("text") or "").lower()
 
     if "scores" in text:
-        # Ensure every current player has a score entry
-        players = current_game.get("players", [])
-        for u in players:
-            _ = player_points[u]
-
-        # Build (user, points) list only for current players
-        scores = [(u, player_points[u]) for u in players]
-
-        # Sort by points (desc), then user ID, and take top 3
-        top_three = sorted(scores, key=lambda x: (-x[1], x[0]))[:3]
-
-        if not top_three:
-            say("*Leaderboard*\n_No scores yet._")
+        # Leaderboard of the latest game in this channel
+        session = sessions.latest_for_channel(event.get("channel"))
+        if not session:
+            say(leaderboard_text([]))
             return
 
-        masked = lambda uid: f"Anon-{uid[-3:]}"
-        lines = [f"{masked(u)}: {pts}" for u, pts in top_three]
+        # Top 3 by points (desc), then user ID, kept in order by the session's Leaderboard
+        top_three = session.points.top(3)
+        say(leaderboard_text(top_three))
+        return
 
-        say("*Top 3 Leaderboard*\n" + "\n".join(lines))
+    if "convergence" in text:
+        # Live per-trial hashtag stats of the latest game in this channel
+        session = sessions.latest_for_channel(event.get("channel"))
+        history = session.convergence.history() if session else []
+        say(convergence_text(history, reveal_tags=bool(session and session.finished)))
         return
 
     # Fallback help
-    say("Try: `@Demo App scores` to view the leaderboard.")
+    say("Try: `@Demo App scores` to view the leaderboard, or `@Demo App convergence` for per-trial hashtag stats.")
+
+
 
 
 
 
 
 
+# ============== Metrics ==============
+# Read when /metrics is scraped (see metrics.py; off unless METRICS_PORT or METRICS_JSON is set)
+metrics.gauge("threads", threading.active_count)
+metrics.gauge("outbox_queue_depth", outbox.queue_depth)
+metrics.gauge("outbox_in_flight", lambda: outbox.stats()["in_flight"])
+metrics.gauge("round_timers_pending", round_timers.pending)
+metrics.gauge("games_running", lambda: sum(not s.finished for s in sessions.sessions()))
+metrics.gauge("rounds_open", lambda: sum(sum(s.open_rounds.values()) for s in sessions.sessions()))
+metrics.gauge("schedule_cache_hits", lambda: get_default_cache().hits + get_default_cache().disk_hits)
+metrics.gauge("schedule_cache_misses", lambda: get_default_cache().misses)
 
 
 # ============== Entrypoint ==============
@@ -595,5 +645,9 @@ if __name__ == "__main__":
     missing = [k for k in ["SLACK_BOT_TOKEN", "SLACK_SIGNING_SECRET", "SLACK_APP_TOKEN"] if not os.environ.get(k)]
     if missing:
         raise RuntimeError(f"Missing env vars: {', '.join(missing)}")
+    metrics.start_from_env()
+    profiling.start_from_env()
+    members.bot_user_id = app.client.auth_test()["user_id"]   # resolved once
+    resume_games(app.client)
     print("Starting Socket Mode handler...")
     SocketModeHandler(app, SLACK_APP_TOKEN).start()
\ No newline at end of file
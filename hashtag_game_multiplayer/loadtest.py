@@ -0,0 +1,374 @@
+"""
+Load test: thousands of simulated participants against the threaded bot.
+
+The bot's Bolt app is driven the way Socket Mode drives it: synthetic
+block_actions (the trial button) and view_submission (the modal) payloads go
+through app.dispatch, so middleware, ack and Bolt's listener thread pool are
+all in the path. Every Web API call the bot makes goes to a local
+FakeSlackServer (fake_slack.py); no Slack workspace is needed.
+
+When players submit, per trial (never before their own prompt arrives):
+    burst    everyone within --burst-window seconds (default 1) of the trial opening
+    uniform  spread evenly at random over --spread seconds
+and --timeout-fraction of the players never submit, so their rounds time out.
+
+Reported (JSON, --out): per-trial turnaround (trial opened -> next trial or
+game end), prompt fan-out time, time from the trial's last submission to its
+close, ack latency of the dispatched payloads, submit-to-announce latency, and
+contention: how often and how long threads waited for the round lock stripes
+and the state store lock, and time spent appending to the results log.
+
+Example:
+    python loadtest.py --players 2000 --distribution burst --timeout-fraction 0.05 \\
+        --round-timeout 10 --out loadtest.json
+"""
+import os
+import re
+import json
+import time
+import heapq
+import random
+import shutil
+import argparse
+import platform
+import threading
+import contextlib
+from datetime import datetime
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmark import offline_workdir, _percentiles_ms, _peak_rss_mb
+
+
+DISTRIBUTIONS = ("burst", "uniform")
+LOAD_CHANNEL = "CLOAD"
+UNLIMITED = (1e9, 1e9)
+PROMPT_POLL_SECONDS = 0.01       # recheck a player whose prompt has not arrived yet
+PROMPT_TEXT = re.compile(r"\*Trial (\d+)\* • You are matched")
+RESULT_TEXT = re.compile(r"\*Trial (\d+) result\*")
+HASHTAGS = ("cats", "dogs", "birds")
+
+
+class WaitStats:
+    """Acquisitions of one kind of lock: how many had to wait, and for how long."""
+
+    def __init__(self):
+        self.acquired = 0
+        self.waits = []               # seconds, contended acquisitions only
+        self._lock = threading.Lock()
+
+    def record(self, waited):
+        with self._lock:
+            self.acquired += 1
+            if waited is not None:
+                self.waits.append(waited)
+
+    def summary(self):
+        with self._lock:
+            out = {"acquired": self.acquired, "contended": len(self.waits),
+                   "total_wait_s": sum(self.waits)}
+            out["wait_ms"] = _percentiles_ms(self.waits)
+            return out
+
+
+class TimedLock:
+    """Wraps a Lock/RLock; an acquire that cannot succeed at once is timed."""
+
+    def __init__(self, lock, stats):
+        self._lock = lock
+        self._stats = stats
+
+    def acquire(self, blocking=True, timeout=-1):
+        if self._lock.acquire(False):
+            self._stats.record(None)
+            return True
+        if not blocking:
+            return False
+        t0 = time.perf_counter()
+        ok = self._lock.acquire(True, timeout)
+        if ok:
+            self._stats.record(time.perf_counter() - t0)
+        return ok
+
+    def release(self):
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def _timed_calls(func, durations):
+    def timed(*args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            durations.append(time.perf_counter() - t0)
+    return timed
+
+
+def block_actions_payload(user, rid, channel_id):
+    return {
+        "type": "block_actions",
+        "team": {"id": "TFAKE"},
+        "user": {"id": user},
+        "api_app_id": "AFAKE",
+        "trigger_id": f"trigger-{rid}-{user}",
+        "channel": {"id": channel_id},
+        "container": {"type": "message", "is_ephemeral": True},
+        "actions": [{
+            "type": "button",
+            "action_id": "open_submit_modal",
+            "block_id": "trial",
+            "value": rid,
+            "action_ts": f"{time.time():.6f}",
+        }],
+    }
+
+
+def view_submission_payload(user, rid, hashtag):
+    return {
+        "type": "view_submission",
+        "team": {"id": "TFAKE"},
+        "user": {"id": user},
+        "api_app_id": "AFAKE",
+        "view": {
+            "id": "VFAKE",
+            "type": "modal",
+            "callback_id": "submit_hashtag_view",
+            "private_metadata": rid,
+            "state": {"values": {"hs": {"val": {"type": "plain_text_input", "value": "#" + hashtag}}}},
+        },
+    }
+
+
+def submission_offsets(n, distribution, rng, burst_window=1.0, spread=10.0):
+    """Seconds after the trial opens at which each of n players submits."""
+    width = burst_window if distribution == "burst" else spread
+    return [rng.uniform(0.0, width) for _ in range(n)]
+
+
+def run(cfg):
+    from slack_bolt.request import BoltRequest
+    import hashtag_game_multiplayer as bot
+    from fake_slack import FakeSlackApi, FakeSlackServer
+
+    players = [f"U{i:06d}" for i in range(cfg["players"])]
+    trial_opened, trial_closed = {}, {}          # t -> monotonic()
+    prompts_done = defaultdict(float)            # t -> last prompt delivered
+    prompted = set()                             # (t, user) whose prompt was delivered
+    last_submit = defaultdict(float)             # t -> last view_submission dispatched
+    submitted_at, announced_at = {}, {}          # (t, user) -> monotonic()
+    ack_ms, dispatch_errors = [], []
+
+    def on_call(method, payload, when):
+        if method != "chat.postEphemeral":
+            return
+        text = payload.get("text") or ""
+        m = RESULT_TEXT.match(text)
+        if m:
+            announced_at[(int(m.group(1)), payload.get("user"))] = when
+            return
+        m = PROMPT_TEXT.match(text)
+        if m:
+            t = int(m.group(1))
+            prompts_done[t] = max(prompts_done[t], when)
+            prompted.add((t, payload.get("user")))
+
+    api = FakeSlackApi(players, latency=cfg["latency"], jitter=cfg["jitter"], rate_limit=cfg["rate_limit"],
+                       retry_after=cfg["retry_after"], seed=cfg["seed"], on_call=on_call)
+    server = FakeSlackServer(api).start()
+    bot.app.client.base_url = server.base_url    # Bolt's per-request clients copy this
+    client = bot.app.client
+
+    bot.ROUND_TIMEOUT_SECONDS = cfg["round_timeout"]
+    if not cfg["slack_limits"]:
+        for method in list(bot.outbox.limits):
+            bot.outbox.limits[method] = UNLIMITED
+
+    # Contention probes
+    round_lock_stats, store_lock_stats, log_appends = WaitStats(), WaitStats(), []
+    bot.round_locks._locks = [TimedLock(lock, round_lock_stats) for lock in bot.round_locks._locks]
+    if hasattr(bot.store, "_lock"):
+        bot.store._lock = TimedLock(bot.store._lock, store_lock_stats)
+
+    start_trial, advance_trial = bot.start_trial, bot._advance_trial
+    def timed_start_trial(client, session, t):
+        trial_opened[t] = time.monotonic()
+        return start_trial(client, session, t)
+    def timed_advance_trial(client, session, t):
+        trial_closed[t] = time.monotonic()
+        return advance_trial(client, session, t)
+    bot.start_trial, bot._advance_trial = timed_start_trial, timed_advance_trial
+
+    def dispatch(payload):
+        t0 = time.perf_counter()
+        resp = bot.app.dispatch(BoltRequest(body=payload, mode="socket_mode"))
+        ack_ms.append(time.perf_counter() - t0)
+        if resp.status != 200:
+            dispatch_errors.append(resp.status)
+
+    def play(t, user, rid, hashtag):
+        dispatch(block_actions_payload(user, rid, LOAD_CHANNEL))
+        submitted_at[(t, user)] = now = time.monotonic()
+        last_submit[t] = max(last_submit[t], now)
+        dispatch(view_submission_payload(user, rid, hashtag))
+
+    rng = random.Random(cfg["seed"])
+    socket_pool = ThreadPoolExecutor(cfg["socket_threads"], thread_name_prefix="socket-mode")
+    deadline = time.monotonic() + cfg["max_seconds"]
+    peak_threads = [threading.active_count()]
+    no_show = 0
+
+    t_game = time.monotonic()
+    session = bot.start_game(client, LOAD_CHANNEL, players)
+    log = session.round_log
+    log.append = _timed_calls(log.append, log_appends)
+    try:
+        for t in range(1, session.trialnum + 1):
+            while t not in trial_opened or session.current_trial < t:
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"trial {t} never opened")
+                time.sleep(0.001)
+            opened = trial_opened[t]
+
+            # Everyone's submission time for this trial, released in order by this thread.
+            # Nobody can click before their prompt arrives, so a player still waiting for
+            # it is retried shortly after (and given up on once the trial has closed).
+            events = []
+            for rid in list(session.rids_by_trial[t]):
+                st = session.rounds.get(rid)
+                if st is None:
+                    continue
+                for user in st.pair:
+                    if rng.random() < cfg["timeout_fraction"]:
+                        no_show += 1
+                    else:
+                        events.append((rid, user))
+            offsets = submission_offsets(len(events), cfg["distribution"], rng,
+                                         cfg["burst_window"], cfg["spread"])
+            queue = [(opened + off, i) for i, off in enumerate(offsets)]
+            heapq.heapify(queue)
+            while queue:
+                due, i = heapq.heappop(queue)
+                delay = due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                rid, user = events[i]
+                if (t, user) not in prompted:
+                    if t not in trial_closed:
+                        heapq.heappush(queue, (time.monotonic() + PROMPT_POLL_SECONDS, i))
+                    continue
+                socket_pool.submit(play, t, user, rid, rng.choice(HASHTAGS))
+                peak_threads[0] = max(peak_threads[0], threading.active_count())
+
+            while t not in trial_closed:
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"trial {t} never closed")
+                peak_threads[0] = max(peak_threads[0], threading.active_count())
+                time.sleep(0.001)
+        bot.outbox.join(max(0.0, deadline - time.monotonic()))
+        game_seconds = time.monotonic() - t_game
+    finally:
+        socket_pool.shutdown(wait=True)
+        server.shutdown()
+
+    trials = []
+    for t in sorted(trial_opened):
+        trials.append({
+            "trial": t,
+            "turnaround_s": trial_closed.get(t, float("nan")) - trial_opened[t],
+            "prompt_fanout_s": (prompts_done[t] - trial_opened[t]) if t in prompts_done else None,
+            "last_submit_to_close_s": (trial_closed[t] - last_submit[t]) if last_submit.get(t) else None,
+        })
+
+    latencies = []
+    for t, pairs in session.schedule_by_trial.items():
+        for a, b in pairs:
+            if (t, a) in submitted_at and (t, b) in submitted_at:
+                last = max(submitted_at[(t, a)], submitted_at[(t, b)])
+                latencies.extend(announced_at[(t, u)] - last for u in (a, b) if (t, u) in announced_at)
+
+    outbox = bot.outbox.stats()
+    return {
+        "players": cfg["players"],
+        "trials": trials,
+        "game_seconds": game_seconds,
+        "submissions": len(submitted_at),
+        "no_shows": no_show,
+        "dispatch_errors": len(dispatch_errors),
+        "ack_ms": _percentiles_ms(ack_ms),
+        "submit_to_announce_ms": _percentiles_ms(latencies),
+        "contention": {
+            "round_locks": round_lock_stats.summary(),
+            "state_store_lock": store_lock_stats.summary(),
+            "log_append_ms": _percentiles_ms(log_appends),
+        },
+        "peak_threads": peak_threads[0],
+        "peak_rss_mb": _peak_rss_mb(),
+        "slack_calls": dict(api.counts),
+        "slack_429s": sum(api.rate_limited.values()),
+        "outbox": {k: outbox[k] for k in ("sent", "retried", "rate_limited", "failed")},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate many concurrent participants against the multiplayer bot.")
+    parser.add_argument("--players", type=int, default=1000)
+    parser.add_argument("--distribution", choices=DISTRIBUTIONS, default="burst", help="when players submit")
+    parser.add_argument("--burst-window", type=float, default=1.0, help="burst: seconds everyone submits within")
+    parser.add_argument("--spread", type=float, default=10.0, help="uniform: seconds submissions are spread over")
+    parser.add_argument("--timeout-fraction", type=float, default=0.0, help="fraction of players who never submit")
+    parser.add_argument("--round-timeout", type=float, default=15.0, help="ROUND_TIMEOUT_SECONDS for the run")
+    parser.add_argument("--socket-threads", type=int, default=10,
+                        help="threads dispatching payloads (the Socket Mode client's default is 10)")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every Slack call")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many more seconds, at random")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="fraction of Slack calls answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with a 429")
+    parser.add_argument("--slack-limits", action="store_true", help="keep the outbox's per-method rate limits")
+    parser.add_argument("--memory-state", action="store_true", help="in-memory state store instead of SQLite")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--max-seconds", type=float, default=900.0, help="give up after this long")
+    parser.add_argument("--out", default="loadtest.json", help="JSON report path")
+    args = parser.parse_args(argv)
+
+    cfg = {k: v for k, v in vars(args).items() if k != "out"}
+    out = os.path.abspath(args.out)
+    cwd = os.getcwd()
+    workdir = offline_workdir("loadtest", args.memory_state)
+    try:
+        # the bot prints progress; keep the report readable
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            result = run(cfg)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for tr in result["trials"]:
+        print(f"trial {tr['trial']}: turnaround {tr['turnaround_s']:.2f}s, prompts out in {tr['prompt_fanout_s'] or 0:.2f}s")
+    c = result["contention"]
+    print(f"ack p99 {result['ack_ms'].get('p99', 0):.1f} ms, submit->announce p99 "
+          f"{result['submit_to_announce_ms'].get('p99', 0):.1f} ms, round lock waits "
+          f"{c['round_locks']['contended']}/{c['round_locks']['acquired']}, store lock waits "
+          f"{c['state_store_lock']['contended']}/{c['state_store_lock']['acquired']}")
+
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": cfg,
+        "result": result,
+    }
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""
+Outbound Slack message dispatcher for hashtag_game_multiplayer.py.
+
+Messages are queued with a priority and sent by a small, fixed pool of worker
+threads. Each Web API method has its own token bucket sized to Slack's rate
+tier (chat.postMessage one per channel, as Slack limits it per channel). A
+429 pauses that bucket for its Retry-After, since Slack rejects every call to
+the method (or channel) in that window, and the message is retried after it.
+Rate-limit retries do not count against max_retries; other transient
+failures back off exponentially and do. With a
+large cohort a trial start therefore drains at the rate Slack allows, prompts
+first, instead of firing every call at once and collecting 429s.
+
+The limits can be changed without editing code (workspaces on higher tiers,
+or Slack changing them): SLACK_RATE_LIMITS="chat_postEphemeral=5:50,views_open=2"
+sets calls per second and, after the colon, the burst (see parse_limits).
+"""
+import time
+import heapq
+import random
+import itertools
+import threading
+from concurrent.futures import Future
+from slack_sdk.errors import SlackApiError
+import metrics
+
+
+# Lower number = sent first
+PRIORITY_PROMPT = 0     # trial prompts and game announcements
+PRIORITY_RESULT = 1     # round results
+PRIORITY_ACK = 2        # "Waiting for your partner" acknowledgements
+
+# (sustained calls per second, burst) per method, from Slack's rate tiers.
+# chat.postEphemeral / views.open / conversations.members are Tier 4 (100+/min);
+# chat.postMessage is limited to about 1 message per second per channel.
+# Override with SLACK_RATE_LIMITS (see parse_limits).
+METHOD_LIMITS = {
+    "chat_postEphemeral": (100 / 60, 20),
+    "chat_postMessage": (1.0, 3),
+    "views_open": (100 / 60, 20),
+    "conversations_members": (100 / 60, 10),
+    "auth_test": (100 / 60, 10),
+}
+DEFAULT_LIMIT = (50 / 60, 10)   # Tier 3
+PER_CHANNEL_METHODS = {"chat_postMessage"}   # one bucket per channel instead of one per method
+
+RETRYABLE_ERRORS = {"ratelimited", "internal_error", "fatal_error", "service_unavailable", "request_timeout"}
+
+
+def parse_limits(spec):
+    """
+    "method=rate[:burst],..." -> {method: (rate, burst)}; rate is calls per second.
+    A method given without a burst keeps its default burst.
+    """
+    limits = {}
+    for item in (spec or "").split(","):
+        if not item.strip():
+            continue
+        method, _, value = item.partition("=")
+        rate, _, burst = value.partition(":")
+        method = method.strip()
+        default_burst = METHOD_LIMITS.get(method, DEFAULT_LIMIT)[1]
+        try:
+            limits[method] = (float(rate), float(burst) if burst.strip() else default_burst)
+        except ValueError:
+            raise ValueError(f"Bad rate limit {item.strip()!r}; expected method=rate[:burst].") from None
+    return limits
+
+
+class TokenBucket:
+    """Thread-safe token bucket; acquire() blocks until a token is available."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._resume_at = 0.0           # no tokens before this (set by pause)
+        self._lock = threading.Lock()
+
+    def pause(self, seconds):
+        """Hand out no tokens for `seconds`, then refill from empty at the sustained rate."""
+        with self._lock:
+            resume_at = time.monotonic() + seconds
+            if resume_at > self._resume_at:
+                self._resume_at = self._updated = resume_at
+                self._tokens = 0.0
+
+    def paused_for(self):
+        """Seconds left of a pause (0 if the bucket is not paused)."""
+        with self._lock:
+            return max(0.0, self._resume_at - time.monotonic())
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._resume_at:
+                    wait = self._resume_at - now
+                else:
+                    self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class _Job:
+    __slots__ = ("client", "method", "kwargs", "priority", "future", "enqueued_at", "attempt")
+
+    def __init__(self, client, method, kwargs, priority):
+        self.client = client
+        self.method = method
+        self.kwargs = kwargs
+        self.priority = priority
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+        self.attempt = 0
+
+
+class SlackDispatcher:
+    """
+    Priority queue + per-method token buckets + `workers` sender threads.
+
+    submit() returns a concurrent.futures.Future resolved with the Slack
+    response (or the final exception), so callers can chain work onto delivery.
+    """
+
+    def __init__(self, workers=8, max_retries=5, base_backoff=1.0, limits=None):
+        self.workers = workers
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.limits = dict(METHOD_LIMITS, **(limits or {}))
+        self._buckets = {}
+        self._queue = []                  # (priority, seq, job)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._in_flight = 0
+        self._later = []                  # (ready_at, seq, job) waiting out a backoff or a pause
+        # counters / latency (enqueue -> delivered, seconds) per method
+        self.sent = 0
+        self.retried = 0
+        self.rate_limited = 0
+        self.failed = 0
+        self._latency = {}                # method -> (count, total, max)
+
+    def submit(self, client, method, priority=PRIORITY_RESULT, **kwargs):
+        """Queue client.<method>(**kwargs)."""
+        job = _Job(client, method, kwargs, priority)
+        self._push(job)
+        return job.future
+
+    def queue_depth(self):
+        with self._cond:
+            return len(self._queue)
+
+    def stats(self):
+        with self._cond:
+            latency = {
+                m: {"count": c, "avg_s": total / c, "max_s": mx}
+                for m, (c, total, mx) in self._latency.items()
+            }
+            return {
+                "queue_depth": len(self._queue),
+                "in_flight": self._in_flight,
+                "sent": self.sent,
+                "retried": self.retried,
+                "rate_limited": self.rate_limited,
+                "failed": self.failed,
+                "latency": latency,
+            }
+
+    def join(self, timeout=None):
+        """Block until the queue is empty and nothing is in flight (e.g. before shutdown)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._queue or self._in_flight or self._later:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def _bucket(self, job):
+        key = job.method
+        if key in PER_CHANNEL_METHODS:
+            key = (key, job.kwargs.get("channel"))
+        with self._cond:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(*self.limits.get(job.method, DEFAULT_LIMIT))
+            return bucket
+
+    def _push(self, job, delay=0.0):
+        with self._cond:
+            if delay > 0:
+                # wait without holding a worker: the workers move it to the queue when due
+                heapq.heappush(self._later, (time.monotonic() + delay, next(self._seq), job))
+                self._ensure_workers()
+                self._cond.notify_all()     # idle workers re-check when to wake up
+                return
+            heapq.heappush(self._queue, (job.priority, next(self._seq), job))
+            self._ensure_workers()
+            self._cond.notify()
+
+    # caller holds self._cond
+    def _ensure_workers(self):
+        self._threads = [t for t in self._threads if t.is_alive()]
+        while len(self._threads) < self.workers:
+            t = threading.Thread(target=self._run, name=f"slack-out-{len(self._threads)}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    # caller holds self._cond; returns seconds until the next delayed job is due (None = none)
+    def _release_due(self):
+        now = time.monotonic()
+        while self._later and self._later[0][0] <= now:
+            _, _, job = heapq.heappop(self._later)
+            heapq.heappush(self._queue, (job.priority, next(self._seq), job))
+        return self._later[0][0] - now if self._later else None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    wait = self._release_due()
+                    if self._queue:
+                        break
+                    self._cond.wait(wait)
+                _, _, job = heapq.heappop(self._queue)
+                self._in_flight += 1
+            try:
+                self._send(job)
+            finally:
+                with self._cond:
+                    self._in_flight -= 1
+                    self._cond.notify_all()
+
+    def _send(self, job):
+        bucket = self._bucket(job)
+        paused = bucket.paused_for()
+        if paused:
+            # set the job aside rather than hold a worker the other methods could use
+            self._push(job, paused)
+            return
+        bucket.acquire()
+        job.attempt += 1
+        try:
+            with metrics.timer("slack_call_seconds", method=job.method):
+                resp = getattr(job.client, job.method)(**job.kwargs)
+        except SlackApiError as e:
+            status = getattr(e.response, "status_code", None)
+            error = e.response.get("error") if e.response is not None else None
+            limited = status == 429 or error == "ratelimited"
+            metrics.inc("slack_calls_total", method=job.method, outcome="ratelimited" if limited else "error")
+            if limited:
+                retry_after = float(e.response.headers.get("Retry-After", 1)) if e.response is not None else 1.0
+                with self._cond:
+                    self.rate_limited += 1
+                # Slack refuses the whole method (or channel) until Retry-After passes,
+                # so hold the bucket; being paced is not a failed attempt
+                bucket.pause(retry_after)
+                job.attempt -= 1
+                self._retry(job, e, retry_after)
+            elif error in RETRYABLE_ERRORS or (status or 0) >= 500:
+                self._retry(job, e, self._backoff(job))
+            else:
+                self._fail(job, e)
+            return
+        except Exception as e:   # connection errors, timeouts
+            metrics.inc("slack_calls_total", method=job.method, outcome="error")
+            self._retry(job, e, self._backoff(job))
+            return
+
+        metrics.inc("slack_calls_total", method=job.method, outcome="ok")
+        latency = time.monotonic() - job.enqueued_at
+        with self._cond:
+            self.sent += 1
+            c, total, mx = self._latency.get(job.method, (0, 0.0, 0.0))
+            self._latency[job.method] = (c + 1, total + latency, max(mx, latency))
+        job.future.set_result(resp)
+
+    def _backoff(self, job):
+        return self.base_backoff * (2 ** (job.attempt - 1)) * (0.5 + random.random())
+
+    def _retry(self, job, error, delay):
+        if job.attempt > self.max_retries:
+            self._fail(job, error)
+            return
+        with self._cond:
+            self.retried += 1
+        self._push(job, delay)
+
+    def _fail(self, job, error):
+        with self._cond:
+            self.failed += 1
+        print(f"Slack {job.method} failed after {job.attempt} attempt(s): {error}")
+        job.future.set_exception(error)
@@ -0,0 +1,143 @@
+"""
+Buffered, append-only CSV log shared by both Hashtag Game bots.
+
+The file is opened once and kept open. append() only adds the row to an
+in-memory buffer; a background thread writes everything buffered in one go
+(group commit) once `max_rows` rows are waiting or `max_delay` seconds have
+passed, so many near-simultaneous appends share one write and one fsync
+instead of each opening and closing the file.
+
+fsync policy:
+    "commit" - fsync after every group commit (default)
+    "close"  - fsync only on flush(sync=True) and close()
+    "never"  - leave durability to the OS
+"""
+import io
+import os
+import csv
+import atexit
+import threading
+import weakref
+import metrics
+
+
+FSYNC_POLICIES = ("commit", "close", "never")
+
+_open_logs = weakref.WeakSet()
+
+
+class BufferedCsvLog:
+    def __init__(self, path, header=None, *, max_rows=200, max_delay=1.0,
+                 fsync="commit", encoding="utf-8"):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy {fsync!r}; expected one of {FSYNC_POLICIES}.")
+        self.path = path
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.fsync = fsync
+        self.commits = 0                # group commits written so far
+        self.rows_written = 0
+        self._buffer = []
+        self._appended = 0              # rows ever appended (sequence number)
+        self._committed = 0             # rows ever written to the file
+        self._cond = threading.Condition()     # guards the buffer and counters
+        self._io_lock = threading.RLock()       # one batch write at a time
+        self._closed = False
+
+        # Write the header once, only for a new or empty file
+        self._file = open(path, "a", newline="", encoding=encoding)
+        if header is not None and self._file.tell() == 0:
+            csv.writer(self._file).writerow(header)
+            self._file.flush()
+
+        self._flusher = threading.Thread(target=self._run, name=f"log-{os.path.basename(path)}", daemon=True)
+        self._flusher.start()
+        _open_logs.add(self)
+
+    def append(self, row, wait=False):
+        """
+        Buffer one row. With wait=True, block until the group commit holding
+        this row has been written (and fsynced, under the "commit" policy).
+        """
+        with self._cond:
+            if self._closed:
+                raise ValueError(f"{self.path} is closed")
+            self._buffer.append(row)
+            self._appended += 1
+            seq = self._appended
+            if len(self._buffer) >= self.max_rows:
+                self._cond.notify_all()
+            if wait:
+                while self._committed < seq:
+                    self._cond.notify_all()
+                    self._cond.wait()
+
+    def flush(self, sync=False):
+        """Write everything buffered now (e.g. at the end of a trial)."""
+        self._commit(force_sync=sync)
+
+    def close(self):
+        """Flush, fsync and close. Safe to call more than once."""
+        with self._io_lock:
+            with self._cond:
+                if self._closed:
+                    return
+                self._closed = True     # from here on append() raises instead of losing the row
+            self._write_buffer(force_sync=self.fsync != "never")
+            self._file.close()
+        _open_logs.discard(self)
+
+    def pending(self):
+        with self._cond:
+            return len(self._buffer)
+
+    def _commit(self, force_sync=False):
+        """
+        Take the whole buffer and write it as one batch. Appends keep going
+        into a fresh buffer while the write and fsync happen.
+        """
+        with self._io_lock:
+            if not self._closed:
+                self._write_buffer(force_sync)
+
+    # caller holds self._io_lock
+    def _write_buffer(self, force_sync):
+        with self._cond:
+            rows, self._buffer = self._buffer, []
+        with metrics.timer("csv_commit_seconds"):
+            if rows:
+                out = io.StringIO()
+                csv.writer(out).writerows(rows)
+                self._file.write(out.getvalue())
+                self._file.flush()
+            if (rows and self.fsync == "commit") or force_sync:
+                os.fsync(self._file.fileno())
+        if rows:
+            metrics.inc("csv_rows_total", len(rows))
+        with self._cond:
+            if rows:
+                self._committed += len(rows)
+                self.rows_written += len(rows)
+                self.commits += 1
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._closed:
+                    return
+                # sleep until the buffer is full or max_delay has passed
+                if len(self._buffer) < self.max_rows:
+                    self._cond.wait(self.max_delay)
+                if self._closed:
+                    return
+                if not self._buffer:
+                    continue
+            self._commit()
+
+
+@atexit.register
+def close_all_logs():
+    """Flush and close every open log (runs automatically at interpreter exit)."""
+    for log in list(_open_logs):
+        log.close()
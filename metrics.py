@@ -0,0 +1,294 @@
+"""
+Lightweight metrics (counters, histograms, gauges) for the Hashtag Game bots.
+
+Off by default. Set one of these before starting a bot to turn it on:
+    METRICS_PORT=9108        serve Prometheus text on http://127.0.0.1:9108/metrics
+                             (and the same numbers as JSON on /metrics.json)
+    METRICS_JSON=metrics.json   rewrite a JSON snapshot every METRICS_JSON_INTERVAL
+                             seconds (default 15)
+When off, inc()/observe() return immediately, timer() hands back a shared
+no-op context manager and @timed leaves the function undecorated, so the hot
+paths pay for one flag check at most.
+
+Names follow Prometheus conventions: *_total for counters, *_seconds for
+timing histograms. Labels are keyword arguments, e.g.
+    metrics.inc("slack_calls_total", method="chat_postEphemeral", outcome="ok")
+    with metrics.timer("schedule_build_seconds"):
+        ...
+"""
+import os
+import json
+import time
+import atexit
+import threading
+import functools
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+METRICS_PORT = int(os.environ.get("METRICS_PORT") or 0)
+METRICS_JSON = os.environ.get("METRICS_JSON", "")
+METRICS_JSON_INTERVAL = float(os.environ.get("METRICS_JSON_INTERVAL") or 15)
+ENABLED = bool(METRICS_PORT or METRICS_JSON or os.environ.get("METRICS", "") not in ("", "0"))
+
+# Histogram bucket upper bounds (seconds): 1 ms to 1 minute
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+HELP = {
+    "handler_seconds": "Time spent in a Slack handler",
+    "slack_call_seconds": "Duration of one Slack Web API call",
+    "slack_calls_total": "Slack Web API calls by method and outcome",
+    "csv_commit_seconds": "Time to write (and fsync) one batch of result rows",
+    "csv_rows_total": "Result rows written",
+    "schedule_build_seconds": "Time to build a game's pairing schedule",
+    "schedule_generate_seconds": "Time to generate a schedule on a cache miss",
+    "trial_start_seconds": "Time to open a trial and queue its prompts",
+    "trial_fanout_seconds": "Time from opening a trial until every prompt was delivered",
+    "submissions_total": "Hashtag submissions accepted",
+    "rounds_closed_total": "Rounds closed, by outcome",
+}
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, n=1):
+        with self._lock:
+            self.value += n
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)   # last slot = above the largest bucket
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += value
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.count, self.sum
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._counters = {}      # (name, labels) -> Counter
+        self._histograms = {}    # (name, labels) -> Histogram
+        self._gauges = {}        # name -> fn() returning a number
+        self._lock = threading.Lock()
+
+    def counter(self, name, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        metric = self._counters.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._counters.setdefault(key, Counter())
+        return metric
+
+    def histogram(self, name, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        metric = self._histograms.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._histograms.setdefault(key, Histogram())
+        return metric
+
+    def gauge(self, name, fn):
+        """Report fn() (read when the metrics are scraped or dumped) as `name`."""
+        with self._lock:
+            self._gauges[name] = fn
+
+    def _read_gauges(self):
+        with self._lock:
+            gauges = dict(self._gauges)
+        out = {}
+        for name, fn in gauges.items():
+            try:
+                out[name] = float(fn())
+            except Exception:
+                continue          # a gauge that cannot be read right now is left out
+        return out
+
+    def snapshot(self):
+        """Everything as plain dicts (the JSON dump)."""
+        with self._lock:
+            counters = list(self._counters.items())
+            histograms = list(self._histograms.items())
+        out = {"time": time.time(), "counters": [], "histograms": [], "gauges": self._read_gauges()}
+        for (name, labels), c in sorted(counters, key=lambda kv: kv[0]):
+            out["counters"].append({"name": name, "labels": dict(labels), "value": c.value})
+        for (name, labels), h in sorted(histograms, key=lambda kv: kv[0]):
+            counts, count, total = h.snapshot()
+            out["histograms"].append({
+                "name": name, "labels": dict(labels), "count": count, "sum": total,
+                "buckets": dict(zip([str(b) for b in h.buckets] + ["+Inf"], counts)),
+            })
+        return out
+
+    def render(self):
+        """Prometheus text exposition format."""
+        with self._lock:
+            counters = sorted(self._counters.items(), key=lambda kv: kv[0])
+            histograms = sorted(self._histograms.items(), key=lambda kv: kv[0])
+        lines, typed = [], set()
+
+        def header(name, kind):
+            if name not in typed:
+                typed.add(name)
+                if name in HELP:
+                    lines.append(f"# HELP {name} {HELP[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), c in counters:
+            header(name, "counter")
+            lines.append(f"{name}{_labels(labels)} {c.value}")
+        for (name, labels), h in histograms:
+            header(name, "histogram")
+            counts, count, total = h.snapshot()
+            cumulative = 0
+            for bound, n in zip(list(h.buckets) + ["+Inf"], counts):
+                cumulative += n
+                lines.append(f"{name}_bucket{_labels(labels + (('le', str(bound)),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {total}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+        for name, value in sorted(self._read_gauges().items()):
+            header(name, "gauge")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    inner = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in labels)
+    return "{" + inner + "}"
+
+
+REGISTRY = MetricsRegistry()
+
+
+# Module-level helpers; all of them do nothing when metrics are off
+def inc(name, n=1, **labels):
+    if ENABLED:
+        REGISTRY.counter(name, **labels).inc(n)
+
+def observe(name, value, **labels):
+    if ENABLED:
+        REGISTRY.histogram(name, **labels).observe(value)
+
+def gauge(name, fn):
+    if ENABLED:
+        REGISTRY.gauge(name, fn)
+
+
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+def timer(name, **labels):
+    """Context manager observing the block's duration (seconds) into histogram `name`."""
+    if not ENABLED:
+        return _NULL_TIMER
+    return _Timer(REGISTRY.histogram(name, **labels))
+
+def timed(name, **labels):
+    """Decorator version of timer(). Keeps the signature visible (Bolt injects arguments by name)."""
+    def decorate(func):
+        if not ENABLED:
+            return func
+        histogram = REGISTRY.histogram(name, **labels)
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+# Exposition
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith("/metrics.json"):
+            body, ctype = json.dumps(REGISTRY.snapshot()).encode("utf-8"), "application/json"
+        elif self.path.startswith("/metrics"):
+            body, ctype = REGISTRY.render().encode("utf-8"), "text/plain; version=0.0.4"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, host="127.0.0.1"):
+    """Serve /metrics (Prometheus text) and /metrics.json from a daemon thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def write_json(path):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(REGISTRY.snapshot(), f, indent=1)
+    os.replace(tmp, path)          # readers never see a half-written file
+
+
+def start_json_dump(path, interval=METRICS_JSON_INTERVAL):
+    """Rewrite `path` with a snapshot every `interval` seconds, and once more at exit."""
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                write_json(path)
+            except OSError as e:
+                print(f"Could not write metrics to {path}: {e}")
+    threading.Thread(target=run, name="metrics-json", daemon=True).start()
+    atexit.register(write_json, path)
+
+
+def start_from_env():
+    """Start whatever exposition METRICS_PORT / METRICS_JSON ask for (no-op when both are unset)."""
+    if METRICS_PORT:
+        start_http_server(METRICS_PORT)
+        print(f"Metrics on http://127.0.0.1:{METRICS_PORT}/metrics")
+    if METRICS_JSON:
+        start_json_dump(METRICS_JSON)
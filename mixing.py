@@ -2,7 +2,13 @@ import numpy as np
 import random
 import csv
 
-def network_connection_spatial(randseed, nodesnum, trialnum, neighborsize, flagsavefig=0):
+from topology import TOPOLOGIES, make_topology, ring_neighbor_index
+
+ENGINES = ("matlab", "fast")
+
+
+def network_connection_spatial(randseed, nodesnum, trialnum, neighborsize, flagsavefig=0, engine="matlab", savecsv=True,
+                               topology="ring", verbose=False):
     """
     Generate spatial network connections (Python version of MATLAB function).
 
@@ -12,9 +18,71 @@ def network_connection_spatial(randseed, nodesnum, trialnum, neighborsize, flags
         trialnum (int): Number of trials (rounds)
         neighborsize (int): Neighborhood size
         flagsavefig (int): 1 to save figure (unused)
+        engine (str): "matlab" for the original rejection sampler,
+            "fast" for network_connection_fast (see below)
+        savecsv (bool): write connection_{nodes}.{trials}.{neighbors}_{seed}.csv
+            to the working directory
+        topology (str): "ring" (the original neighborhood) or another graph
+            from topology.py ("torus", "small_world", "random_regular",
+            "complete"), matched by network_connection_topology; `engine`
+            only applies to the ring
+        verbose (bool): print "Trial t" as the MATLAB sampler builds each
+            trial (the original script's progress output)
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine!r}; expected one of {ENGINES}.")
+    if topology != "ring":
+        connectmat = network_connection_topology(randseed, nodesnum, trialnum, neighborsize, topology)
+        if savecsv:
+            _save_connection_csv(connectmat.tolist(), randseed, nodesnum, trialnum, neighborsize)
+        return connectmat
+    if engine == "fast":
+        connectmat = network_connection_fast(randseed, nodesnum, trialnum, neighborsize)
+        if savecsv:
+            _save_connection_csv(connectmat.tolist(), randseed, nodesnum, trialnum, neighborsize)
+        return connectmat
+
+    connectmat = []
+    for rows in _matlab_trials(randseed, nodesnum, neighborsize, trialnum, verbose):
+        connectmat.extend(rows)
+
+    # Optionally save to CSV
+    if savecsv:
+        _save_connection_csv(connectmat, randseed, nodesnum, trialnum, neighborsize)
+    return np.array(connectmat)
+
+
+def iter_trial_connections(randseed, nodesnum, neighborsize, engine="matlab", trialnum=None, topology="ring"):
+    """
+    Yield network_connection_spatial's connection matrix one trial at a time.
+
+    Trial t is an np.ndarray of [node1, node2, t] rows, exactly the rows
+    network_connection_spatial(randseed, nodesnum, trialnum, neighborsize,
+    engine=engine, topology=topology) returns for t: the generator draws from
+    the same seeded random stream, so trial t does not depend on how many
+    trials are asked for. Only the trial being built is held in memory.
+    Stops after `trialnum` trials (None = never); nothing is written to disk.
+
+    A "Cycle detected" RuntimeError from the MATLAB sampler ends the generator.
     """
-    random.seed(randseed)
-    np.random.seed(randseed)
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine!r}; expected one of {ENGINES}.")
+    if topology != "ring":
+        yield from _topology_trials(make_topology(topology, nodesnum, neighborsize, seed=randseed),
+                                    randseed, trialnum)
+        return
+    if engine == "fast":
+        yield from _fast_trials(_fast_neighbor_index(nodesnum, neighborsize), randseed, trialnum)
+        return
+    for rows in _matlab_trials(randseed, nodesnum, neighborsize, trialnum):
+        yield np.array(rows)
+
+
+def _matlab_trials(randseed, nodesnum, neighborsize, trialnum=None, verbose=False):
+    """The MATLAB-faithful sampler, one trial's rows (lists) per iteration."""
+    # A private generator seeded like random.seed(randseed) gives the same
+    # draws as the module-level functions without touching global state
+    rng = random.Random(randseed)
 
     nodearrayraw = np.arange(1, nodesnum + 1)
     nodenb = round(neighborsize / 2)
@@ -32,40 +100,39 @@ def network_connection_spatial(randseed, nodesnum, trialnum, neighborsize, flags
         nb.pop(nodenb)  # remove the node itself
         neighbornodes.append(nb)
 
-    connectmat = []
-    ccount = 0
-
-    for ti in range(1, trialnum + 1):
+    ti = 0
+    while trialnum is None or ti < trialnum:
+        ti += 1
         nodeflag = np.zeros(nodesnum, dtype=int)
         resampleflag = True
-        print(f"Trial {ti}")
+        if verbose:
+            print(f"Trial {ti}")
 
-        k = random.randint(0, nodesnum - 1)
+        k = rng.randint(0, nodesnum - 1)
         nodeseq = np.roll(np.arange(1, nodesnum + 1), k)
 
+        rows = []
         while resampleflag:
             nodeflag[:] = 0
-            count1 = ccount
+            rows.clear()
 
             for i in nodeseq:
                 if nodeflag[i - 1] == 0:
                     counttemp = 0
                     while True:
                         counttemp += 1
-                        indsample = random.randint(0, neighborsize - 1)
+                        indsample = rng.randint(0, neighborsize - 1)
                         nodecontemp = neighbornodes[i - 1][indsample]
 
                         # if all neighbors are taken
                         if np.prod(nodeflag[np.array(neighbornodes[i - 1]) - 1]) == 1:
                             resampleflag = True
-                            connectmat = connectmat[:count1]
-                            ccount = count1
+                            rows.clear()
                             break
 
                         # if the proposed partner is still available
                         if nodeflag[nodecontemp - 1] == 0:
-                            ccount += 1
-                            connectmat.append([i, nodecontemp, ti])
+                            rows.append([i, nodecontemp, ti])
                             nodeflag[i - 1] = 1
                             nodeflag[nodecontemp - 1] = 1
                             resampleflag = False
@@ -83,12 +150,14 @@ def network_connection_spatial(randseed, nodesnum, trialnum, neighborsize, flags
         if np.prod(nodeflag) == 0:
             raise RuntimeError("Missing nodes in connection matrix.")
 
-    # Sort pairs so smaller node index comes first
-    for row in connectmat:
-        if row[0] > row[1]:
-            row[0], row[1] = row[1], row[0]
+        # Sort pairs so smaller node index comes first
+        for row in rows:
+            if row[0] > row[1]:
+                row[0], row[1] = row[1], row[0]
+        yield rows
 
-    # Optionally save to CSV
+
+def _save_connection_csv(connectmat, randseed, nodesnum, trialnum, neighborsize):
     filename = f"connection_{nodesnum}.{trialnum}.{neighborsize}_{randseed}.csv"
     with open(filename, 'w', newline='') as f:
         writer = csv.writer(f)
@@ -96,9 +165,249 @@ def network_connection_spatial(randseed, nodesnum, trialnum, neighborsize, flags
         writer.writerows(connectmat)
 
     #print(f"Connection matrix saved to {filename}")
-    return np.array(connectmat)
 
 
+def network_connection_fast(randseed, nodesnum, trialnum, neighborsize):
+    """
+    Rejection-free alternative to the MATLAB-faithful sampler.
+
+    Each trial is built as one perfect matching on the ring neighborhood:
+    the free node with the fewest free neighbors is matched to its least
+    constrained free neighbor (ties broken at random), and the free-neighbor
+    counts are updated incrementally. A node left without free neighbors is
+    rescued with a length-3 augmenting path; if that fails too, the trial
+    falls back to a randomly rotated ring of adjacent pairs. A trial
+    therefore costs O(nodesnum * (nodesnum + width^2)) at worst and never
+    restarts.
+
+    Uses its own np.random.Generator, so results depend only on randseed.
+    Nothing is written to disk and nothing is printed.
+
+    Args:
+        randseed (int): Random seed
+        nodesnum (int): Number of nodes (must be even)
+        trialnum (int): Number of trials (rounds)
+        neighborsize (int): Neighborhood size
+
+    Returns:
+        np.ndarray: rows of [node1, node2, trial] with 1-based node1 < node2,
+        the same layout as network_connection_spatial.
+    """
+    nbr = _fast_neighbor_index(nodesnum, neighborsize)
+
+    connectmat = np.empty((trialnum * nodesnum // 2, 3), dtype=np.int64)
+    for ti, rows in enumerate(_fast_trials(nbr, randseed, trialnum), start=1):
+        connectmat[(ti - 1) * nodesnum // 2: ti * nodesnum // 2] = rows
+
+    return connectmat
+
+
+def _fast_neighbor_index(nodesnum, neighborsize):
+    if nodesnum < 2 or nodesnum % 2:
+        raise ValueError("nodesnum must be an even number >= 2 for a perfect matching.")
+    nbr = ring_neighbor_index(nodesnum, neighborsize)
+    if nbr.shape[1] == 0:
+        raise ValueError("neighborsize is too small to give any node a neighbor.")
+    return nbr
+
+
+def _fast_trials(nbr, randseed, trialnum=None):
+    """network_connection_fast one trial at a time: a (nodesnum // 2, 3) array per iteration."""
+    nodesnum = nbr.shape[0]
+    rng = np.random.default_rng(randseed)
+
+    ti = 0
+    while trialnum is None or ti < trialnum:
+        ti += 1
+        partner = _match_trial(nbr, rng)
+        if partner is None:
+            partner = _ring_fallback_matching(nodesnum, rng)
+
+        node1 = np.flatnonzero(np.arange(nodesnum) < partner)
+        rows = np.empty((nodesnum // 2, 3), dtype=np.int64)
+        rows[:, 0] = node1 + 1
+        rows[:, 1] = partner[node1] + 1
+        rows[:, 2] = ti
+        yield rows
+
+
+def network_connection_topology(randseed, nodesnum, trialnum, neighborsize, topology):
+    """
+    Pairing schedule on any graph from topology.py (see TOPOLOGIES).
+
+    The graph is built once from randseed; each trial is then a matching
+    found greedily in random order, with every node left over re-matched
+    along the shortest alternating path (the search repair_matching uses).
+    That search does not shrink odd cycles (no blossoms), so the matching is
+    maximum on bipartite graphs (an even ring with neighborsize 2, a torus
+    with an even number of rows and columns) but on graphs with triangles
+    (wider rings, small world) it can now and then leave two nodes unpaired
+    that a maximum matching would pair. On the complete graph a trial is
+    simply a random permutation cut into pairs. A node the matching cannot
+    reach, e.g. the odd one out, sits the trial out, so a trial can have
+    fewer than nodesnum // 2 rows. Nothing is written to disk and nothing is
+    printed.
+
+    Returns:
+        np.ndarray: rows of [node1, node2, trial] with 1-based node1 < node2,
+        the same layout as network_connection_spatial.
+    """
+    if topology not in TOPOLOGIES:
+        raise ValueError(f"Unknown topology {topology!r}; expected one of {TOPOLOGIES}.")
+    trials = list(_topology_trials(make_topology(topology, nodesnum, neighborsize, seed=randseed),
+                                   randseed, trialnum))
+    if not trials:
+        return np.empty((0, 3), dtype=np.int64)
+    return np.concatenate(trials)
+
+
+def _topology_trials(graph, randseed, trialnum=None):
+    """network_connection_topology one trial at a time."""
+    nodesnum = graph.nodesnum
+    rng = np.random.default_rng([randseed, 1])     # apart from the draws that built the graph
+    active = np.ones(nodesnum, dtype=bool)
+
+    ti = 0
+    while trialnum is None or ti < trialnum:
+        ti += 1
+        partner = np.full(nodesnum, -1, dtype=np.int64)
+        if graph.kind == "complete":
+            order = rng.permutation(nodesnum)[:nodesnum // 2 * 2]
+            partner[order[0::2]] = order[1::2]
+            partner[order[1::2]] = order[0::2]
+        else:
+            repair_matching(partner, active, graph, rng)
+
+        node1 = np.flatnonzero(np.arange(nodesnum) < partner)
+        rows = np.empty((len(node1), 3), dtype=np.int64)
+        rows[:, 0] = node1 + 1
+        rows[:, 1] = partner[node1] + 1
+        rows[:, 2] = ti
+        yield rows
+
+
+def _match_trial(nbr, rng):
+    """
+    Greedy min-availability matching over the neighbor index `nbr`.
+    Returns partner[i] for every node, or None if the matching got stuck.
+    """
+    nodesnum = nbr.shape[0]
+    free = np.ones(nodesnum, dtype=bool)
+    partner = np.full(nodesnum, -1, dtype=np.int64)
+    # free-neighbor count per node, plus a random fraction as tie-break;
+    # matched nodes are set to inf so argmin only ever picks free nodes
+    avail = nbr.shape[1] + rng.random(nodesnum)
+
+    def take(u):
+        free[u] = False
+        avail[u] = np.inf
+        avail[nbr[u]] -= 1
+
+    for _ in range(nodesnum // 2):
+        u = int(np.argmin(avail))
+        cand = nbr[u][free[nbr[u]]]
+        if cand.size:
+            v = int(cand[np.argmin(avail[cand])])
+            partner[u], partner[v] = v, u
+            take(u)
+            take(v)
+            continue
+
+        # u is stranded: find a matched neighbor v whose partner w can move
+        # to another free node x, then pair (u, v) and (w, x)
+        for v in rng.permutation(nbr[u]):
+            w = partner[v]
+            alt = nbr[w][free[nbr[w]]]
+            alt = alt[alt != u]
+            if alt.size:
+                x = int(alt[rng.integers(alt.size)])
+                partner[u], partner[v] = v, u
+                partner[w], partner[x] = x, w
+                take(u)
+                take(x)
+                break
+        else:
+            return None
+
+    return partner
+
+
+def _ring_fallback_matching(nodesnum, rng):
+    """Pair every node with an adjacent one: (k, k+1), (k+2, k+3), ... for random k in {0, 1}."""
+    first = (np.arange(0, nodesnum, 2) + rng.integers(2)) % nodesnum
+    second = (first + 1) % nodesnum
+    partner = np.empty(nodesnum, dtype=np.int64)
+    partner[first] = second
+    partner[second] = first
+    return partner
+
+
+def repair_matching(partner, active, nbr, rng):
+    """
+    Re-match one trial after some nodes became inactive, touching only the
+    pairs that involve them.
+
+    partner[i] is node i's partner (0-based, -1 = none) and is changed in
+    place; active is a boolean mask and nbr a ring_neighbor_index array
+    or any graph from topology.py.
+    Inactive nodes lose their pairs. Each active node left without a partner
+    is then re-matched along the shortest alternating path to another free
+    active node: directly with a free neighbor if there is one, otherwise
+    by shifting the fewest existing pairs along the ring neighborhood. Active
+    nodes that cannot be reached that way sit the trial out (-1).
+
+    Returns the sorted list of nodes that were unpaired or re-paired.
+    """
+    changed = set()
+    for u in np.flatnonzero(~active & (partner >= 0)):
+        v = partner[u]
+        if v >= 0:               # not unpaired already by an inactive partner
+            partner[u] = partner[v] = -1
+            changed.update((int(u), int(v)))
+
+    for u in rng.permutation(np.flatnonzero(active & (partner < 0))):
+        if partner[u] < 0:
+            changed.update(_augment(int(u), partner, active, nbr, rng))
+    return sorted(changed)
+
+
+def _augment(u, partner, active, nbr, rng):
+    """
+    Breadth-first search from free node u for the shortest alternating path
+    (free u - v = w - ... - free x) and flip it. Returns the nodes re-paired
+    (none if no free active node can be reached).
+    """
+    via = {}                 # node entered over a non-matching edge -> node it came from
+    seen = {u}               # every node is used once, so the search tree gives simple paths
+    frontier = [u]
+    while frontier:
+        nxt = []
+        for x in frontier:
+            for v in rng.permutation(nbr[x]):
+                v = int(v)
+                if v in seen or not active[v]:
+                    continue
+                seen.add(v)
+                via[v] = x
+                if partner[v] < 0:
+                    # Flip the path back to u: every node on it gets the neighbor it was reached from
+                    touched = []
+                    y = v
+                    while True:
+                        x = via[y]
+                        prev = int(partner[x])
+                        partner[x], partner[y] = y, x
+                        touched += (x, y)
+                        if x == u:
+                            return touched
+                        y = prev
+                w = int(partner[v])
+                if w not in seen:
+                    seen.add(w)
+                    nxt.append(w)
+        frontier = nxt
+    return []
+
 #conn = network_connection_spatial(randseed=1, nodesnum=40, trialnum=5, neighborsize=39)
 #print(conn[:40])
 
@@ -0,0 +1,175 @@
+"""Precompute pairing schedules for a whole parameter grid before a study.
+
+Every (nodesnum, neighborsize, randseed, trialnum) combination is generated
+with mixing.network_connection_spatial in a process pool. A seed that hits
+the "Cycle detected" RuntimeError is retried with a new seed, and the result
+is stored under the seed that produced it: a cache hit must give exactly what
+an uncached run with the same seed would, so the requested seed stays
+uncached and is reported as retried. All results go into one compressed .npz
+archive, indexed by the same content hash the schedule cache uses, which the
+bot can preload (SCHEDULE_ARCHIVE=...). nodesnum must be even.
+
+Example:
+    python precompute_schedules.py --nodes 20 40 80 --neighborsize 2 4 \\
+        --seeds 1 2 3 --trials 5 --out schedules.npz
+"""
+
+import time
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from mixing import ENGINES, network_connection_spatial
+from topology import TOPOLOGIES
+from schedule_cache import schedule_key, key_digest, compact_connectmat
+
+SEED_RETRY_STRIDE = 100003      # retried seeds: seed + attempt * stride
+
+# One row per schedule in the archive's "index" array
+INDEX_DTYPE = np.dtype([
+    ("name", "U40"),            # array name inside the archive
+    ("randseed", np.int64),     # requested seed
+    ("nodesnum", np.int64),
+    ("trialnum", np.int64),
+    ("neighborsize", np.int64),
+    ("engine", "U16"),
+    ("used_seed", np.int64),    # seed that actually produced the schedule (the cache key)
+    ("attempts", np.int64),
+    ("seconds", np.float64),
+    ("topology", "U16"),
+])
+
+
+def archive_name(key):
+    return f"s_{key_digest(key)}"
+
+
+def check_nodesnum(nodesnum):
+    """Pairing needs an even cohort; the MATLAB-faithful sampler never returns on an odd one."""
+    if nodesnum < 2 or nodesnum % 2:
+        raise ValueError(f"nodesnum must be an even number >= 2, got {nodesnum}.")
+
+
+def build_one(randseed, nodesnum, trialnum, neighborsize, engine, max_retries, topology="ring"):
+    """
+    Generate one schedule, retrying with a new seed on "Cycle detected".
+    Runs inside a worker process; returns (used_seed, attempts, seconds, conn).
+    """
+    check_nodesnum(nodesnum)
+    t0 = time.perf_counter()
+    for attempt in range(max_retries + 1):
+        seed = randseed + attempt * SEED_RETRY_STRIDE
+        try:
+            conn = network_connection_spatial(
+                randseed=seed,
+                nodesnum=nodesnum,
+                trialnum=trialnum,
+                neighborsize=neighborsize,
+                engine=engine,
+                savecsv=False,
+                topology=topology,
+            )
+        except RuntimeError as e:
+            if "Cycle detected" not in str(e):
+                raise
+            continue
+        return seed, attempt + 1, time.perf_counter() - t0, compact_connectmat(conn, nodesnum, trialnum)
+
+    raise RuntimeError(
+        f"No valid schedule for nodesnum={nodesnum}, neighborsize={neighborsize} "
+        f"after {max_retries + 1} seeds starting at {randseed}."
+    )
+
+
+def precompute(grid, *, engine="matlab", topology="ring", workers=None, max_retries=5, report=print):
+    """
+    Build every configuration in `grid` (iterable of (randseed, nodesnum, trialnum, neighborsize)).
+
+    Returns (arrays, index, failures): {name: conn}, a structured INDEX_DTYPE array,
+    and [(config, error_message), ...] for configurations that could not be built.
+    A schedule that needed a retried seed is keyed by that seed (index rows
+    with used_seed != randseed).
+    """
+    arrays, rows, failures = {}, [], []
+    grid = list(dict.fromkeys(grid))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(build_one, randseed, nodesnum, trialnum, neighborsize, engine, max_retries, topology):
+                (randseed, nodesnum, trialnum, neighborsize)
+            for randseed, nodesnum, trialnum, neighborsize in grid
+        }
+        for fut in as_completed(futures):
+            randseed, nodesnum, trialnum, neighborsize = cfg = futures[fut]
+            try:
+                used_seed, attempts, seconds, conn = fut.result()
+            except Exception as e:
+                failures.append((cfg, str(e)))
+                report(f"FAILED  nodes={nodesnum:<6} k={neighborsize:<4} seed={randseed:<6} {e}")
+                continue
+
+            name = archive_name(schedule_key(used_seed, nodesnum, trialnum, neighborsize, engine, topology))
+            arrays[name] = conn
+            rows.append((name, randseed, nodesnum, trialnum, neighborsize, engine,
+                         used_seed, attempts, seconds, topology))
+            status = "ok     " if used_seed == randseed else "RETRIED"
+            report(
+                f"{status} nodes={nodesnum:<6} k={neighborsize:<4} seed={randseed:<6} "
+                f"trials={trialnum:<4} used_seed={used_seed:<8} attempts={attempts:<3} {seconds:8.3f}s"
+            )
+
+    index = np.array(sorted(rows, key=lambda r: r[1:5]), dtype=INDEX_DTYPE)
+    return arrays, index, failures
+
+
+def save_archive(path, arrays, index):
+    np.savez_compressed(path, index=index, **arrays)
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Precompute pairing schedules over a parameter grid.")
+    p.add_argument("--nodes", type=int, nargs="+", required=True, help="nodesnum values")
+    p.add_argument("--neighborsize", type=int, nargs="+", required=True, help="neighborsize values")
+    p.add_argument("--seeds", type=int, nargs="+", default=[1], help="randseed values")
+    p.add_argument("--trials", type=int, nargs="+", default=[5], help="trialnum values")
+    p.add_argument("--engine", choices=ENGINES, default="matlab")
+    p.add_argument("--topology", choices=TOPOLOGIES, default="ring")
+    p.add_argument("--workers", type=int, default=None, help="process pool size (default: CPU count)")
+    p.add_argument("--max-retries", type=int, default=5, help="new seeds to try after 'Cycle detected'")
+    p.add_argument("--out", default="schedules.npz", help="output archive path")
+    args = p.parse_args(argv)
+    for nodes in args.nodes:
+        try:
+            check_nodesnum(nodes)
+        except ValueError as e:
+            p.error(f"--nodes: {e}")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    grid = [
+        (seed, nodes, trials, k)
+        for nodes, k, seed, trials in itertools.product(args.nodes, args.neighborsize, args.seeds, args.trials)
+    ]
+    print(f"Precomputing {len(grid)} schedules with engine={args.engine}, topology={args.topology}...")
+
+    t0 = time.perf_counter()
+    arrays, index, failures = precompute(
+        grid, engine=args.engine, topology=args.topology, workers=args.workers, max_retries=args.max_retries
+    )
+    save_archive(args.out, arrays, index)
+
+    retried = index[index["used_seed"] != index["randseed"]]
+    print(f"Saved {len(index)} schedules to {args.out} in {time.perf_counter() - t0:.2f}s "
+          f"({len(failures)} failed, {len(retried)} stored under a retried seed)")
+    for row in retried:
+        print(f"  seed {row['randseed']} (nodes={row['nodesnum']}, k={row['neighborsize']}, "
+              f"trials={row['trialnum']}) is not cached; its retry is cached as seed {row['used_seed']}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
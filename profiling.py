@@ -0,0 +1,300 @@
+"""
+Opt-in profiling for the Hashtag Game bots: where does a slow trial spend its time?
+
+Set PROFILE_DIR before starting a bot to turn it on (PROFILE_INTERVAL sets the
+sampling period, default 0.01 s). Then:
+    - every function wrapped with @hook (the Bolt handlers, start_trial) and
+      every `with section(...)` block records its calls, wall time and CPU
+      time; wall minus CPU is time spent waiting (Slack I/O, locks, sleeps);
+    - a sampler thread snapshots every thread's stack each PROFILE_INTERVAL
+      and marks the sample [cpu] if the thread used CPU since the last
+      sample, [wait] if it did not;
+    - when a trial ends, PROFILE_DIR/<game>_t<trial>.json (hook totals for the
+      trial's window) and .stacks (the window's samples, one "frame;frame;...
+      count" line per stack, the collapsed format flame graph tools read) are
+      written, plus session.json / session.stacks for the whole run at exit.
+With several games running at once their trial windows overlap, so a trial's
+files also contain the other games' work. Stack sampling is used instead of
+cProfile because it sees every thread at once and costs the same however
+many calls a handler makes.
+
+Summarize a run (hottest functions by CPU samples, where threads wait, and
+the hooks):
+    python profiling.py report profiles/ --top 20
+With PROFILE_DIR unset, @hook leaves functions undecorated and section(),
+trial_started() and trial_finished() do nothing.
+"""
+import os
+import sys
+import json
+import time
+import atexit
+import argparse
+import threading
+import functools
+from collections import Counter, defaultdict
+
+
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "")
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL") or 0.01)
+ENABLED = bool(PROFILE_DIR)
+
+
+def _frame_name(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse(frame):
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    names.reverse()
+    return ";".join(names)
+
+
+class Profiler:
+    def __init__(self, out_dir, interval=PROFILE_INTERVAL):
+        self.out_dir = out_dir
+        self.interval = interval
+        self.samples = Counter()                   # "[cpu];thread;frame;..." -> samples, whole run
+        self.hooks = defaultdict(lambda: [0, 0.0, 0.0])   # name -> [calls, wall, cpu], whole run
+        self._trials = {}                          # (game_id, t) -> snapshot at trial start
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._cpu_seen = {}                        # thread ident -> thread CPU time at last sample
+        self._thread = None
+
+    def start(self):
+        """Start sampling; the whole-run files are written at exit."""
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+        return self
+
+    def close(self):
+        self._stop.set()
+        self._write("session", self._hook_totals({}), dict(self.samples), wall=None, cpu=time.process_time())
+
+    # Hooks
+    def record(self, name, wall, cpu):
+        with self._lock:
+            h = self.hooks[name]
+            h[0] += 1
+            h[1] += wall
+            h[2] += cpu
+
+    # Trial windows
+    def trial_started(self, game_id, t):
+        with self._lock:
+            self._trials[(game_id, t)] = (time.perf_counter(), time.process_time(),
+                                          Counter(self.samples), {k: list(v) for k, v in self.hooks.items()})
+
+    def trial_finished(self, game_id, t):
+        with self._lock:
+            start = self._trials.pop((game_id, t), None)
+            if start is None:
+                return
+            wall0, cpu0, samples0, hooks0 = start
+            samples = self.samples - samples0
+            hooks = self._hook_totals(hooks0)
+        self._write(f"{game_id[:8]}_t{t}", hooks, dict(samples),
+                    wall=time.perf_counter() - wall0, cpu=time.process_time() - cpu0,
+                    game_id=game_id, trial=t)
+
+    def _hook_totals(self, since):
+        """Hook totals minus a snapshot taken earlier (caller holds the lock, or it does not matter)."""
+        out = {}
+        for name, (calls, wall, cpu) in list(self.hooks.items()):
+            c0, w0, p0 = since.get(name, (0, 0.0, 0.0))
+            if calls - c0:
+                out[name] = {"calls": calls - c0, "wall_s": wall - w0, "cpu_s": cpu - p0,
+                             "wait_s": max(0.0, (wall - w0) - (cpu - p0))}
+        return out
+
+    def _write(self, stem, hooks, samples, wall, cpu, **extra):
+        summary = dict(extra, wall_s=wall, process_cpu_s=cpu, interval_s=self.interval,
+                       samples=sum(samples.values()), hooks=hooks)
+        try:
+            os.makedirs(self.out_dir, exist_ok=True)
+            with open(os.path.join(self.out_dir, f"{stem}.json"), "w") as f:
+                json.dump(summary, f, indent=1)
+            with open(os.path.join(self.out_dir, f"{stem}.stacks"), "w") as f:
+                for stack, n in sorted(samples.items()):
+                    f.write(f"{stack} {n}\n")
+        except OSError as e:
+            print(f"Could not write profile {stem}: {e}")
+
+    # Sampler
+    def _thread_cpu(self, ident):
+        try:
+            return time.clock_gettime(time.pthread_getcpuclockid(ident))
+        except (AttributeError, OSError, ValueError):
+            return None            # not supported here: every sample counts as [cpu]
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            frames = sys._current_frames()
+            batch, seen = [], {}
+            for ident, frame in frames.items():
+                if ident == me:
+                    continue
+                cpu = seen[ident] = self._thread_cpu(ident)
+                if cpu is not None and ident not in self._cpu_seen:
+                    continue                       # first sight of this thread: nothing to compare yet
+                state = "[wait]" if cpu is not None and cpu == self._cpu_seen[ident] else "[cpu]"
+                batch.append(f"{state};{names.get(ident, ident)};{_collapse(frame)}")
+            del frames
+            self._cpu_seen = seen
+            with self._lock:
+                self.samples.update(batch)
+
+
+PROFILER = Profiler(PROFILE_DIR) if ENABLED else None
+
+
+def start_from_env():
+    """Start the stack sampler if PROFILE_DIR is set (call once, from the bot's entry point)."""
+    if ENABLED:
+        PROFILER.start()
+        print(f"Profiling into {PROFILE_DIR}/ every {PROFILE_INTERVAL}s")
+
+
+class _Section:
+    __slots__ = ("name", "wall", "cpu")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.wall = time.perf_counter()
+        self.cpu = time.thread_time()
+        return self
+
+    def __exit__(self, *exc):
+        PROFILER.record(self.name, time.perf_counter() - self.wall, time.thread_time() - self.cpu)
+
+
+class _NullSection:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NULL_SECTION = _NullSection()
+
+def section(name):
+    """Context manager recording the block's wall and CPU time under `name`."""
+    return _Section(name) if ENABLED else _NULL_SECTION
+
+def hook(name):
+    """Decorator version of section(); the signature stays visible to Bolt."""
+    def decorate(func):
+        if not ENABLED:
+            return func
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Section(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def trial_started(game_id, t):
+    if ENABLED:
+        PROFILER.trial_started(game_id, t)
+
+def trial_finished(game_id, t):
+    if ENABLED:
+        PROFILER.trial_finished(game_id, t)
+
+
+# Report
+def _read_stacks(path):
+    samples = Counter()
+    with open(path) as f:
+        for line in f:
+            stack, _, n = line.rstrip("\n").rpartition(" ")
+            if stack:
+                samples[stack] += int(n)
+    return samples
+
+
+def hottest(samples, state="[cpu]", top=20):
+    """(function, self samples, inclusive samples) for the functions seen most in `state` samples."""
+    self_counts, incl_counts = Counter(), Counter()
+    for stack, n in samples.items():
+        frames = stack.split(";")
+        if frames[0] != state or len(frames) < 3:
+            continue
+        frames = frames[2:]                        # drop the state and the thread name
+        self_counts[frames[-1]] += n
+        for name in set(frames):
+            incl_counts[name] += n
+    ranked = sorted(incl_counts, key=lambda k: (self_counts[k], incl_counts[k]), reverse=True)
+    return [(name, self_counts[name], incl_counts[name]) for name in ranked[:top]]
+
+
+def report(profile_dir, top=20):
+    session = os.path.join(profile_dir, "session.stacks")
+    if os.path.exists(session):
+        samples = _read_stacks(session)
+    else:                                          # the bot did not exit cleanly: add up the trials
+        samples = Counter()
+        for name in sorted(os.listdir(profile_dir)):
+            if name.endswith(".stacks"):
+                samples.update(_read_stacks(os.path.join(profile_dir, name)))
+    total = sum(samples.values()) or 1
+    cpu = sum(n for s, n in samples.items() if s.startswith("[cpu]"))
+
+    print(f"{sum(samples.values())} samples, {100 * cpu / total:.0f}% on CPU")
+    for state, title in (("[cpu]", "Hottest functions (on CPU)"), ("[wait]", "Where threads wait")):
+        print(f"\n{title}:  self  incl  function")
+        for name, own, incl in hottest(samples, state, top):
+            print(f"  {100 * own / total:5.1f}% {100 * incl / total:5.1f}%  {name}")
+
+    trials = []
+    for name in sorted(os.listdir(profile_dir)):
+        if name.endswith(".json") and name != "session.json":
+            with open(os.path.join(profile_dir, name)) as f:
+                trials.append(json.load(f))
+    if trials:
+        print("\nTrials:  wall  cpu  (process)")
+        for tr in sorted(trials, key=lambda tr: (tr.get("game_id", ""), tr.get("trial", 0))):
+            print(f"  {tr['game_id'][:8]} trial {tr['trial']}: {tr['wall_s']:.2f}s  {tr['process_cpu_s']:.2f}s")
+
+    # Trial windows overlap when games run side by side, so prefer the whole-run totals
+    session_json = os.path.join(profile_dir, "session.json")
+    if os.path.exists(session_json):
+        with open(session_json) as f:
+            sources = [json.load(f)]
+    else:
+        sources = trials
+    hooks = defaultdict(lambda: [0, 0.0, 0.0])
+    for tr in sources:
+        for name, h in tr["hooks"].items():
+            hooks[name][0] += h["calls"]
+            hooks[name][1] += h["wall_s"]
+            hooks[name][2] += h["cpu_s"]
+    if hooks:
+        print("\nHooks:  calls  wall  cpu  waiting")
+        for name, (calls, wall, cpu_s) in sorted(hooks.items(), key=lambda kv: -kv[1][1]):
+            print(f"  {name}: {calls}  {wall:.3f}s  {cpu_s:.3f}s  {max(0.0, wall - cpu_s):.3f}s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize a PROFILE_DIR written by the bots.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rep = sub.add_parser("report", help="hottest functions, waits and hook totals")
+    rep.add_argument("profile_dir")
+    rep.add_argument("--top", type=int, default=20)
+    args = parser.parse_args(argv)
+    if args.command == "report":
+        report(args.profile_dir, args.top)
+
+
+if __name__ == "__main__":
+    main()
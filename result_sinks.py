@@ -0,0 +1,276 @@
+"""
+Where game results go.
+
+Every sink has the same small interface as log_writer.BufferedCsvLog:
+    append(row)         one row in the bot's CSV column order
+    flush(sync=False)   end of a trial: write what is buffered
+    close()
+so the bots can log to CSV, Parquet, or both (MultiSink) without caring which.
+
+ParquetSink writes typed columns (integer trial/completed, timestamp started_at,
+dictionary-encoded player IDs and game_outcome), one row group per flush, which
+for the multiplayer bot means one row group per trial. Parquet support needs
+pyarrow (`pip install pyarrow`); CSV logging works without it.
+
+Existing CSVs can be converted from the command line:
+    python result_sinks.py submissions_20250101_120000.csv hashtag_single_trial.csv
+"""
+import os
+import csv
+import atexit
+import argparse
+import threading
+from datetime import datetime, timezone
+
+from log_writer import BufferedCsvLog
+
+_open_sinks = set()
+_open_sinks_lock = threading.Lock()
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("Parquet output needs pyarrow: pip install pyarrow") from e
+    return pyarrow, pyarrow.parquet
+
+
+def _column_types():
+    """Parquet type of each column the bots write; the columns themselves come from each bot's CSV_HEADER."""
+    pa, _ = _require_pyarrow()
+    player = pa.dictionary(pa.int32(), pa.string())
+    return {
+        # multiplayer rounds (game_logic.CSV_HEADER)
+        "round_id": pa.string(),
+        "trial": pa.int32(),
+        "player_a": player,
+        "player_b": player,
+        "player_a_hashtag": pa.string(),
+        "player_b_hashtag": pa.string(),
+        "completed": pa.int8(),
+        "started_at": pa.timestamp("us"),
+        "game_outcome": pa.dictionary(pa.int8(), pa.string()),
+        # individual hashtags (individual.CSV_HEADER)
+        "unix_time": pa.timestamp("us", tz="UTC"),
+        "user_id": player,
+        "hashtag": pa.string(),
+    }
+
+
+def schema_for(header):
+    """Parquet schema for a CSV header, in its column order; a column with no known type is a string."""
+    pa, _ = _require_pyarrow()
+    types = _column_types()
+    return pa.schema([(name, types.get(name, pa.string())) for name in header])
+
+
+def _to_int(v):
+    return None if v in (None, "") else int(v)
+
+def _to_str(v):
+    return None if v is None else str(v)
+
+def _to_datetime(v):
+    if v in (None, ""):
+        return None
+    return v if isinstance(v, datetime) else datetime.fromisoformat(v)
+
+def _to_utc(v):
+    if v in (None, ""):
+        return None
+    return datetime.fromtimestamp(float(v), tz=timezone.utc)
+
+# column name -> converter from a CSV/bot value to the typed value
+_CONVERTERS = {
+    "round_id": _to_str,
+    "trial": _to_int,
+    "player_a": _to_str,
+    "player_b": _to_str,
+    "player_a_hashtag": _to_str,
+    "player_b_hashtag": _to_str,
+    "completed": _to_int,
+    "started_at": _to_datetime,
+    "game_outcome": _to_str,
+    "unix_time": _to_utc,
+    "user_id": _to_str,
+    "hashtag": _to_str,
+}
+
+
+CsvSink = BufferedCsvLog   # the plain CSV log (see log_writer.py)
+
+
+class ParquetSink:
+    """
+    Typed columnar log. Rows are buffered and written as one row group per
+    flush(); the file is complete once close() runs (at the latest, at exit).
+    """
+
+    def __init__(self, path, schema):
+        _, pq = _require_pyarrow()
+        self.path = path
+        self.schema = schema
+        self.row_groups = 0
+        self._rows = []
+        self._lock = threading.Lock()
+        self._writer = pq.ParquetWriter(path, schema)
+        with _open_sinks_lock:
+            _open_sinks.add(self)
+
+    def append(self, row, wait=False):
+        with self._lock:
+            if self._writer is None:
+                raise ValueError(f"{self.path} is closed")
+            self._rows.append(row)
+        if wait:
+            self.flush()
+
+    def flush(self, sync=False):
+        with self._lock:
+            self._write_row_group()
+
+    def close(self):
+        with self._lock:
+            if self._writer is None:
+                return
+            self._write_row_group()
+            self._writer.close()
+            self._writer = None
+        with _open_sinks_lock:
+            _open_sinks.discard(self)
+
+    def pending(self):
+        with self._lock:
+            return len(self._rows)
+
+    # caller holds self._lock
+    def _write_row_group(self):
+        if not self._rows or self._writer is None:
+            return
+        rows, self._rows = self._rows, []
+        self._writer.write_table(rows_to_table(rows, self.schema))
+        self.row_groups += 1
+
+
+class MultiSink:
+    """Fan every call out to several sinks (e.g. CSV and Parquet side by side)."""
+
+    def __init__(self, sinks):
+        self.sinks = list(sinks)
+
+    @property
+    def path(self):
+        return self.sinks[0].path
+
+    def append(self, row, wait=False):
+        for s in self.sinks:
+            s.append(row, wait=wait)
+
+    def flush(self, sync=False):
+        for s in self.sinks:
+            s.flush(sync=sync)
+
+    def close(self):
+        for s in self.sinks:
+            s.close()
+
+    def pending(self):
+        return max(s.pending() for s in self.sinks)
+
+
+def rows_to_table(rows, schema):
+    """Build a pyarrow Table from rows in schema column order, converting each value to its type."""
+    pa, _ = _require_pyarrow()
+    arrays = []
+    for i, field in enumerate(schema):
+        conv = _CONVERTERS.get(field.name, _to_str)
+        values = [conv(r[i]) for r in rows]
+        if pa.types.is_dictionary(field.type):
+            arrays.append(pa.array(values, type=field.type.value_type).dictionary_encode()
+                          .cast(field.type))
+        else:
+            arrays.append(pa.array(values, type=field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def open_result_sink(path, header, formats=("csv",)):
+    """
+    Open the sinks named in `formats` ("csv", "parquet") for a results file.
+    `path` is the CSV path; the Parquet file sits next to it with a .parquet suffix.
+    A CSV can be appended to across restarts but a Parquet file cannot, so an
+    existing .parquet gets a timestamped sibling instead of being overwritten.
+    """
+    sinks = []
+    for fmt in formats:
+        if fmt == "csv":
+            sinks.append(CsvSink(path, header=header))
+        elif fmt == "parquet":
+            schema = schema_for(header)
+            base = os.path.splitext(path)[0]
+            pq_path = base + ".parquet"
+            if os.path.exists(pq_path):
+                pq_path = f"{base}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.parquet"
+            sinks.append(ParquetSink(pq_path, schema))
+        else:
+            raise ValueError(f"Unknown result format {fmt!r}; expected 'csv' or 'parquet'.")
+    return sinks[0] if len(sinks) == 1 else MultiSink(sinks)
+
+
+def convert_csv(csv_path, out_path=None, row_group_size=None):
+    """
+    Convert a bot CSV (submissions_*.csv or hashtag_single_trial.csv) to Parquet.
+    Files with a trial column get one row group per trial. Returns the output path.
+    """
+    out_path = out_path or os.path.splitext(csv_path)[0] + ".parquet"
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        rows = list(reader)
+
+    schema = schema_for(header)
+    if "trial" in header:
+        trial_idx = header.index("trial")
+        groups = {}
+        for r in rows:
+            groups.setdefault(r[trial_idx], []).append(r)
+        batches = [groups[t] for t in sorted(groups, key=lambda t: _to_int(t) or 0)]
+    else:
+        size = row_group_size or max(len(rows), 1)
+        batches = [rows[i:i + size] for i in range(0, len(rows), size)]
+
+    sink = ParquetSink(out_path, schema)
+    for batch in batches:
+        for r in batch:
+            sink.append(r)
+        sink.flush()
+    sink.close()
+    return out_path
+
+
+@atexit.register
+def close_all_sinks():
+    """Finish every open Parquet file (runs automatically at interpreter exit)."""
+    with _open_sinks_lock:
+        sinks = list(_open_sinks)
+    for s in sinks:
+        s.close()
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Convert Hashtag Game CSV results to Parquet.")
+    p.add_argument("csv_files", nargs="+", help="submissions_*.csv and/or hashtag_single_trial.csv files")
+    p.add_argument("--out-dir", default=None, help="write .parquet files here (default: next to each CSV)")
+    args = p.parse_args(argv)
+
+    for path in args.csv_files:
+        out = None
+        if args.out_dir:
+            os.makedirs(args.out_dir, exist_ok=True)
+            out = os.path.join(args.out_dir, os.path.splitext(os.path.basename(path))[0] + ".parquet")
+        print(f"{path} -> {convert_csv(path, out)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Compact per-round records for the multiplayer Hashtag Game.
+
+A round used to be a dict holding two nested dicts, a tuple and an ISO date
+string (~1 KB each). A RoundRecord is one __slots__ object (~100 bytes):
+    - players are small integer indices into the process-wide PLAYERS table
+      instead of Slack user-ID strings (like idx_to_user in
+      build_pair_schedule_spatial, but shared by every game),
+    - the submitted/completed/closed booleans are bits of one int,
+    - started_at is a float Unix timestamp.
+"""
+import time
+import threading
+
+
+class PlayerTable:
+    """Interns Slack user IDs to small ints (index <-> user ID)."""
+
+    __slots__ = ("_users", "_index", "_lock")
+
+    def __init__(self):
+        self._users = []      # index -> user ID
+        self._index = {}      # user ID -> index
+        self._lock = threading.Lock()
+
+    def index(self, user):
+        i = self._index.get(user)
+        if i is None:
+            with self._lock:
+                i = self._index.get(user)
+                if i is None:
+                    i = self._index[user] = len(self._users)
+                    self._users.append(user)
+        return i
+
+    def lookup(self, user):
+        """Index of an interned user, or None (unlike index(), never adds one)."""
+        return self._index.get(user)
+
+    def user(self, i):
+        return self._users[i]
+
+    def __len__(self):
+        return len(self._users)
+
+
+PLAYERS = PlayerTable()
+
+# RoundRecord.flags bits
+SUBMITTED_A = 1
+SUBMITTED_B = 2
+COMPLETED = 4     # both submitted
+CLOSED = 8        # finished by submit or timeout
+
+
+class RoundRecord:
+    """One round: pair (a, b) in a trial, their hashtags and its outcome."""
+
+    __slots__ = ("trial", "a", "b", "sub_a", "sub_b", "flags", "started_at", "channel_id", "game_outcome")
+
+    def __init__(self, a, b, trial, channel_id, started_at=None):
+        self.trial = trial
+        self.a = PLAYERS.index(a)
+        self.b = PLAYERS.index(b)
+        self.sub_a = ""               # empty string instead of None
+        self.sub_b = ""
+        self.flags = 0
+        self.started_at = time.time() if started_at is None else started_at
+        self.channel_id = channel_id
+        self.game_outcome = None      # "match", "no match" or "timeout"
+
+    @property
+    def pair(self):
+        """(player_a, player_b) as Slack user IDs."""
+        return PLAYERS.user(self.a), PLAYERS.user(self.b)
+
+    def has(self, user):
+        """True if `user` is one of the round's two players."""
+        i = PLAYERS.lookup(user)
+        return i is not None and (i == self.a or i == self.b)
+
+    def _side(self, user):
+        i = PLAYERS.lookup(user)
+        if i is not None and i == self.a:
+            return 0
+        if i is not None and i == self.b:
+            return 1
+        raise KeyError(f"{user} is not in this round")
+
+    def sub(self, user):
+        """Hashtag submitted by user ('' if none yet)."""
+        return self.sub_b if self._side(user) else self.sub_a
+
+    def submitted(self, user):
+        return bool(self.flags & (SUBMITTED_B if self._side(user) else SUBMITTED_A))
+
+    def submit(self, user, value):
+        if self._side(user):
+            self.sub_b = value
+            self.flags |= SUBMITTED_B
+        else:
+            self.sub_a = value
+            self.flags |= SUBMITTED_A
+
+    def both_submitted(self):
+        return self.flags & (SUBMITTED_A | SUBMITTED_B) == SUBMITTED_A | SUBMITTED_B
+
+    @property
+    def completed(self):
+        return bool(self.flags & COMPLETED)
+
+    @completed.setter
+    def completed(self, value):
+        self.flags = self.flags | COMPLETED if value else self.flags & ~COMPLETED
+
+    @property
+    def closed(self):
+        return bool(self.flags & CLOSED)
+
+    @closed.setter
+    def closed(self, value):
+        self.flags = self.flags | CLOSED if value else self.flags & ~CLOSED
+
+    def __repr__(self):
+        a, b = self.pair
+        return (f"RoundRecord(trial={self.trial}, pair=({a!r}, {b!r}), flags={self.flags}, "
+                f"outcome={self.game_outcome!r})")
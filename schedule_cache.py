@@ -0,0 +1,233 @@
+"""Cache for the connection matrices produced by mixing.network_connection_spatial.
+
+A schedule depends only on (randseed, nodesnum, trialnum, neighborsize, engine, topology),
+so each one is stored once under a hash of those parameters:
+    - an in-memory LRU keeps the most recently used schedules,
+    - behind it, a directory of compact .npy files (opened memory-mapped)
+      survives restarts of the bot.
+Both layers are bounded in bytes; the least recently used entries are evicted first.
+"""
+
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from mixing import network_connection_spatial
+import metrics
+
+CACHE_FORMAT_VERSION = 1
+DEFAULT_CACHE_DIR = os.environ.get("SCHEDULE_CACHE_DIR", ".schedule_cache")
+DEFAULT_MAX_MEMORY_BYTES = 64 * 1024 * 1024     # in-memory LRU budget
+DEFAULT_MAX_DISK_BYTES = 512 * 1024 * 1024      # on-disk store budget
+
+
+def schedule_key(randseed, nodesnum, trialnum, neighborsize, engine="matlab", topology="ring"):
+    """Normalized cache key for one generator call."""
+    return (int(randseed), int(nodesnum), int(trialnum), int(neighborsize), str(engine), str(topology))
+
+
+def key_digest(key):
+    """Content address of a key: stable across processes and Python versions."""
+    if key[5:] == ("ring",):
+        key = key[:5]            # ring schedules keep the digests they had before topologies existed
+    payload = json.dumps([CACHE_FORMAT_VERSION, *key]).encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()[:32]
+
+
+def compact_connectmat(conn, nodesnum, trialnum):
+    """Downcast a connection matrix to the smallest integer type that holds it."""
+    dtype = np.int16 if max(nodesnum, trialnum) <= np.iinfo(np.int16).max else np.int32
+    return np.ascontiguousarray(conn, dtype=dtype)
+
+
+class ScheduleCache:
+    """
+    Two-level (memory LRU -> .npy directory) cache of connection matrices.
+
+    Arrays handed out are read-only; call .tolist() or .astype() to get a copy.
+    Safe to share between the bot's handler threads.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR,
+                 max_memory_bytes=DEFAULT_MAX_MEMORY_BYTES,
+                 max_disk_bytes=DEFAULT_MAX_DISK_BYTES):
+        self.cache_dir = cache_dir
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()     # digest -> np.ndarray, oldest first
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _path(self, digest):
+        return os.path.join(self.cache_dir, f"{digest}.npy")
+
+    def get(self, randseed, nodesnum, trialnum, neighborsize, engine="matlab", topology="ring"):
+        """Return the cached matrix, or None if it was never stored (or was evicted)."""
+        digest = key_digest(schedule_key(randseed, nodesnum, trialnum, neighborsize, engine, topology))
+        with self._lock:
+            conn = self._memory.get(digest)
+            if conn is not None:
+                self._memory.move_to_end(digest)
+                self.hits += 1
+                return conn
+
+            if not self.cache_dir:       # memory only
+                self.misses += 1
+                return None
+            path = self._path(digest)
+            try:
+                conn = np.load(path, mmap_mode="r")
+                os.utime(path)   # refresh mtime so disk eviction stays LRU
+            except (FileNotFoundError, ValueError, OSError):
+                self.misses += 1
+                return None
+
+            self.disk_hits += 1
+            self._remember(digest, conn)
+            return conn
+
+    def put(self, randseed, nodesnum, trialnum, neighborsize, conn, engine="matlab", topology="ring"):
+        """Store a matrix in memory and on disk; returns the compacted read-only copy."""
+        digest = key_digest(schedule_key(randseed, nodesnum, trialnum, neighborsize, engine, topology))
+        conn = compact_connectmat(conn, nodesnum, trialnum)
+        conn.setflags(write=False)
+
+        with self._lock:
+            if self.cache_dir:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                path = self._path(digest)
+                tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp, "wb") as f:
+                    np.save(f, conn)
+                os.replace(tmp, path)   # atomic, so readers never see a partial file
+                self._evict_disk(keep=path)
+            self._remember(digest, conn)
+        return conn
+
+    def get_or_build(self, randseed, nodesnum, trialnum, neighborsize, engine="matlab", topology="ring"):
+        """Return the cached matrix, generating (and storing) it on a miss."""
+        conn = self.get(randseed, nodesnum, trialnum, neighborsize, engine, topology)
+        if conn is not None:
+            return conn
+        with metrics.timer("schedule_generate_seconds", engine=engine):
+            conn = network_connection_spatial(
+                randseed=randseed,
+                nodesnum=nodesnum,
+                trialnum=trialnum,
+                neighborsize=neighborsize,
+                engine=engine,
+                savecsv=False,
+                topology=topology,
+            )
+        return self.put(randseed, nodesnum, trialnum, neighborsize, conn, engine, topology)
+
+    def preload_archive(self, path):
+        """Load every schedule from a precompute_schedules.py archive into the cache."""
+        schedules = load_schedule_archive(path)
+        for (randseed, nodesnum, trialnum, neighborsize, engine, topology), conn in schedules.items():
+            self.put(randseed, nodesnum, trialnum, neighborsize, conn, engine, topology)
+        return len(schedules)
+
+    def clear_memory(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+
+    def disk_usage(self):
+        """Total bytes of .npy files currently in the cache directory."""
+        return sum(size for _, size, _ in self._disk_entries())
+
+    # caller holds self._lock
+    def _remember(self, digest, conn):
+        old = self._memory.pop(digest, None)
+        if old is not None:
+            self._memory_bytes -= old.nbytes
+        self._memory[digest] = conn
+        self._memory_bytes += conn.nbytes
+        while self._memory_bytes > self.max_memory_bytes and len(self._memory) > 1:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted.nbytes
+
+    def _disk_entries(self):
+        """[(path, size, mtime), ...] for every cached file."""
+        entries = []
+        try:
+            names = os.listdir(self.cache_dir)
+        except FileNotFoundError:
+            return entries
+        for name in names:
+            if not name.endswith(".npy"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((path, st.st_size, st.st_mtime))
+        return entries
+
+    # caller holds self._lock
+    def _evict_disk(self, keep=None):
+        entries = self._disk_entries()
+        total = sum(size for _, size, _ in entries)
+        # oldest first, never the file that was just written
+        for path, size, _ in sorted(entries, key=lambda e: e[2]):
+            if total <= self.max_disk_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+def load_schedule_archive(path):
+    """
+    Read an archive written by precompute_schedules.py.
+    Returns {schedule_key(...): conn}, keyed by the seed that produced each
+    schedule (the "used_seed" column), so a hit is always what an uncached run
+    with that seed gives, and by its topology ("ring" in archives written
+    before topologies existed).
+    """
+    out = {}
+    with np.load(path, allow_pickle=False) as data:
+        index = data["index"]
+        has_topology = "topology" in (index.dtype.names or ())
+        for row in index:
+            key = schedule_key(row["used_seed"], row["nodesnum"], row["trialnum"], row["neighborsize"],
+                               row["engine"], row["topology"] if has_topology else "ring")
+            out[key] = data[row["name"]]
+    return out
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache():
+    """
+    Process-wide cache rooted at SCHEDULE_CACHE_DIR (default: ./.schedule_cache).
+    If SCHEDULE_ARCHIVE points to a precomputed archive it is loaded on first use.
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ScheduleCache()
+            archive = os.environ.get("SCHEDULE_ARCHIVE")
+            if archive:
+                _default_cache.preload_archive(archive)
+        return _default_cache
+
+
+def cached_network_connection(randseed, nodesnum, trialnum, neighborsize, engine="matlab", topology="ring"):
+    """Drop-in for network_connection_spatial that goes through the default cache (no CSV written)."""
+    return get_default_cache().get_or_build(randseed, nodesnum, trialnum, neighborsize, engine, topology)
@@ -0,0 +1,172 @@
+"""Diagnostics for a pairing schedule before a cohort is run.
+
+Takes the `conn` matrix network_connection_spatial returns (rows of
+[node1, node2, trial], 1-based nodes) and reports, over the whole matrix at
+once with NumPy sorting and bincount:
+    - how often each pair meets (repeat pairs and the largest repeat count),
+    - how many distinct partners each player gets over the game,
+    - how many trials each player is paired in (someone sitting out shows here),
+    - the ring distance of every pairing: how far apart the two players sit
+      on the ring of node indices (1 = next to each other).
+A 10,000-node x 100-trial schedule takes a fraction of a second.
+
+Python:
+    from schedule_diagnostics import summarize
+    report = summarize(conn, nodesnum=40)
+
+Command line, on a saved schedule (connection_*.csv, or a .npy from the
+schedule cache) or on one generated on the spot:
+    python schedule_diagnostics.py connection_40.5.39_1.csv
+    python schedule_diagnostics.py --nodes 10000 --trials 100 --neighborsize 4 --engine fast
+"""
+
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+
+def _columns(conn):
+    conn = np.asarray(conn)
+    if conn.size == 0:
+        conn = conn.reshape(0, 3)
+    a = conn[:, 0].astype(np.int64) - 1
+    b = conn[:, 1].astype(np.int64) - 1
+    return np.minimum(a, b), np.maximum(a, b), conn[:, 2].astype(np.int64)
+
+
+def _nodesnum(conn, nodesnum):
+    if nodesnum is not None:
+        return int(nodesnum)
+    conn = np.asarray(conn)
+    return int(conn[:, :2].max()) if conn.size else 0
+
+
+def pair_counts(conn, nodesnum=None):
+    """(node1, node2, meetings) for every pair that meets at least once; nodes 1-based, node1 < node2."""
+    n = _nodesnum(conn, nodesnum)
+    lo, hi, _ = _columns(conn)
+    keys, counts = np.unique(lo * n + hi, return_counts=True)
+    return keys // n + 1, keys % n + 1, counts
+
+
+def distinct_partners(conn, nodesnum=None):
+    """Number of different partners each node (index 0 = node 1) meets over the schedule."""
+    n = _nodesnum(conn, nodesnum)
+    a, b, _ = pair_counts(conn, n)
+    return np.bincount(a - 1, minlength=n) + np.bincount(b - 1, minlength=n)
+
+
+def trials_paired(conn, nodesnum=None):
+    """Number of trials each node is paired in."""
+    n = _nodesnum(conn, nodesnum)
+    lo, hi, _ = _columns(conn)
+    return np.bincount(lo, minlength=n) + np.bincount(hi, minlength=n)
+
+
+def ring_distance(conn, nodesnum=None):
+    """For every row, the distance between its two nodes around the ring of nodesnum nodes."""
+    n = _nodesnum(conn, nodesnum)
+    lo, hi, _ = _columns(conn)
+    d = hi - lo
+    return np.minimum(d, n - d)
+
+
+def _spread(x):
+    if not len(x):
+        return {"min": 0, "mean": 0.0, "max": 0}
+    return {"min": int(x.min()), "mean": float(x.mean()), "max": int(x.max())}
+
+
+def summarize(conn, nodesnum=None):
+    """All diagnostics as one JSON-ready dict (histograms are lists indexed by value)."""
+    n = _nodesnum(conn, nodesnum)
+    _, _, trial = _columns(conn)
+    _, _, meetings = pair_counts(conn, n)
+    partners = distinct_partners(conn, n)
+    paired = trials_paired(conn, n)
+    dist = ring_distance(conn, n)
+    trials = int(len(np.unique(trial)))
+
+    return {
+        "nodes": n,
+        "trials": trials,
+        "pairings": int(len(trial)),
+        "pairs": {
+            "distinct": int(len(meetings)),
+            "repeated": int((meetings > 1).sum()),                # pairs that meet more than once
+            "repeat_pairings": int((meetings - 1).sum()),         # pairings that were a repeat
+            "max_meetings": int(meetings.max()) if len(meetings) else 0,
+            "meetings_histogram": np.bincount(meetings).tolist(),
+        },
+        "distinct_partners": dict(_spread(partners), histogram=np.bincount(partners).tolist()),
+        "trials_paired": dict(_spread(paired), sitting_out=int((trials - paired).sum()) if trials else 0),
+        "ring_distance": dict(_spread(dist), histogram=np.bincount(dist).tolist()),
+    }
+
+
+def load_conn(path):
+    """A schedule saved as connection_*.csv (Node1,Node2,Trial header) or .npy."""
+    if path.endswith(".npy"):
+        return np.load(path)
+    return np.loadtxt(path, delimiter=",", skiprows=1, dtype=np.int64, ndmin=2)
+
+
+def format_report(report):
+    pairs, partners = report["pairs"], report["distinct_partners"]
+    paired, dist = report["trials_paired"], report["ring_distance"]
+    lines = [
+        f"{report['nodes']} nodes, {report['trials']} trials, {report['pairings']} pairings",
+        f"pairs: {pairs['distinct']} distinct, {pairs['repeated']} meet more than once "
+        f"({pairs['repeat_pairings']} repeat pairings), at most {pairs['max_meetings']} times",
+        f"distinct partners per node: min {partners['min']}, mean {partners['mean']:.2f}, max {partners['max']}",
+        f"trials paired per node: min {paired['min']}, mean {paired['mean']:.2f}, max {paired['max']} "
+        f"({paired['sitting_out']} sit-outs)",
+        f"ring distance: min {dist['min']}, mean {dist['mean']:.2f}, max {dist['max']}",
+    ]
+    hist = dist["histogram"]
+    if len(hist) <= 12:
+        lines.append("  " + "  ".join(f"{d}:{c}" for d, c in enumerate(hist) if c))
+    return "\n".join(lines)
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Repeat-pair, partner and ring-distance statistics for a schedule.")
+    p.add_argument("path", nargs="?", help="connection_*.csv or .npy schedule (omit to generate one)")
+    p.add_argument("--nodes", type=int, help="nodesnum (default: largest node in the file)")
+    p.add_argument("--trials", type=int, default=5, help="trialnum when generating")
+    p.add_argument("--neighborsize", type=int, default=4, help="neighborsize when generating")
+    p.add_argument("--seed", type=int, default=1, help="randseed when generating")
+    p.add_argument("--engine", default="matlab", help="pairing engine when generating")
+    p.add_argument("--topology", default="ring", help="topology when generating (see topology.py)")
+    p.add_argument("--json", help="also write the report as JSON here")
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.path:
+        conn = load_conn(args.path)
+    elif args.nodes:
+        from mixing import network_connection_spatial
+        conn = network_connection_spatial(args.seed, args.nodes, args.trials, args.neighborsize,
+                                          engine=args.engine, savecsv=False, topology=args.topology)
+    else:
+        print("Give a schedule file, or --nodes (and --trials, --neighborsize, ...) to generate one.")
+        return 2
+
+    t0 = time.perf_counter()
+    report = summarize(conn, args.nodes)
+    seconds = time.perf_counter() - t0
+    print(format_report(report))
+    print(f"({seconds:.3f}s)", file=sys.stderr)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=1)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
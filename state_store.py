@@ -0,0 +1,395 @@
+"""
+Durable game state for the Hashtag Game bots.
+
+The bots keep only what they are actively using in memory (the open rounds of
+the current trial, scores, the current game) and write every change through to
+a StateStore. With SqliteStateStore that is a WAL-mode SQLite file, so:
+    - finished rounds can be dropped from memory and looked up again by rid,
+      trial or player when needed,
+    - a bot restarted after a crash can reload the games it was running and
+      carry on with the trial each was in.
+
+Writes are buffered and committed in batches (every `batch_size` changes or
+`flush_interval` seconds, and on flush()); reads see buffered changes too.
+All SQL uses fixed parameterized statements, which sqlite3 keeps prepared in
+its per-connection statement cache.
+
+MemoryStateStore has the same interface and keeps everything in dicts (no
+durability), for tests or when GAME_STATE_DB is set to an empty string.
+"""
+import json
+import time
+import atexit
+import sqlite3
+import threading
+import weakref
+
+from round_records import RoundRecord, SUBMITTED_A, SUBMITTED_B, COMPLETED, CLOSED
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    game_id       TEXT PRIMARY KEY,
+    channel_id    TEXT,
+    trialnum      INTEGER NOT NULL,
+    neighborsize  INTEGER NOT NULL,
+    current_trial INTEGER NOT NULL,
+    players       TEXT NOT NULL,      -- JSON list of user IDs
+    schedule      TEXT NOT NULL,      -- JSON {trial: [[a, b], ...]}
+    rids_by_trial TEXT NOT NULL,      -- JSON {trial: [rid, ...]}
+    csv_path      TEXT,
+    finished      INTEGER NOT NULL DEFAULT 0,
+    updated_at    REAL NOT NULL,
+    engine        TEXT,               -- pairing engine and topology the schedule was built with
+    topology      TEXT,
+    inactive      TEXT                -- JSON list of players left out of the schedule (dropouts)
+);
+CREATE TABLE IF NOT EXISTS rounds (
+    rid           TEXT PRIMARY KEY,
+    game_id       TEXT,
+    trial         INTEGER NOT NULL,
+    player_a      TEXT NOT NULL,
+    player_b      TEXT NOT NULL,
+    sub_a         TEXT NOT NULL DEFAULT '',
+    sub_b         TEXT NOT NULL DEFAULT '',
+    submitted_a   INTEGER NOT NULL DEFAULT 0,
+    submitted_b   INTEGER NOT NULL DEFAULT 0,
+    completed     INTEGER NOT NULL DEFAULT 0,
+    closed        INTEGER NOT NULL DEFAULT 0,
+    started_at    REAL,
+    channel_id    TEXT,
+    game_outcome  TEXT
+);
+CREATE INDEX IF NOT EXISTS rounds_by_trial ON rounds (game_id, trial);
+CREATE INDEX IF NOT EXISTS rounds_by_player_a ON rounds (player_a);
+CREATE INDEX IF NOT EXISTS rounds_by_player_b ON rounds (player_b);
+CREATE TABLE IF NOT EXISTS points (
+    game_id       TEXT NOT NULL,
+    user_id       TEXT NOT NULL,
+    points        INTEGER NOT NULL,
+    PRIMARY KEY (game_id, user_id)
+);
+CREATE TABLE IF NOT EXISTS awaiting (
+    user_id       TEXT PRIMARY KEY,
+    awaiting      INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS trial_stats (
+    game_id       TEXT NOT NULL,
+    trial         INTEGER NOT NULL,
+    stats         TEXT NOT NULL,      -- JSON, see convergence.py
+    PRIMARY KEY (game_id, trial)
+);
+"""
+
+_UPSERT_ROUND = """
+INSERT OR REPLACE INTO rounds (rid, game_id, trial, player_a, player_b, sub_a, sub_b,
+    submitted_a, submitted_b, completed, closed, started_at, channel_id, game_outcome)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+_UPSERT_GAME = """
+INSERT OR REPLACE INTO games (game_id, channel_id, trialnum, neighborsize, current_trial,
+    players, schedule, rids_by_trial, csv_path, finished, updated_at, engine, topology, inactive)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+_GAME_COLUMNS = ("game_id, channel_id, trialnum, neighborsize, current_trial, players, schedule, "
+                 "rids_by_trial, csv_path, finished, updated_at, engine, topology, inactive")
+# Columns added after the first release; older databases get them on open
+_ADDED_GAME_COLUMNS = (("engine", "TEXT"), ("topology", "TEXT"), ("inactive", "TEXT"))
+_UPSERT_POINTS = "INSERT OR REPLACE INTO points (game_id, user_id, points) VALUES (?, ?, ?)"
+_UPSERT_AWAITING = "INSERT OR REPLACE INTO awaiting (user_id, awaiting) VALUES (?, ?)"
+_UPSERT_TRIAL_STATS = "INSERT OR REPLACE INTO trial_stats (game_id, trial, stats) VALUES (?, ?, ?)"
+
+_ROUND_COLUMNS = ("rid, game_id, trial, player_a, player_b, sub_a, sub_b, submitted_a, submitted_b, "
+                  "completed, closed, started_at, channel_id, game_outcome")
+_SELECT_ROUND = f"SELECT {_ROUND_COLUMNS} FROM rounds WHERE rid = ?"
+_SELECT_TRIAL = f"SELECT {_ROUND_COLUMNS} FROM rounds WHERE game_id = ? AND trial = ?"
+_SELECT_PLAYER = (f"SELECT {_ROUND_COLUMNS} FROM rounds WHERE player_a = ? "
+                  f"UNION ALL SELECT {_ROUND_COLUMNS} FROM rounds WHERE player_b = ?")
+
+_open_stores = weakref.WeakSet()
+
+
+def round_to_params(rid, st, game_id=None):
+    """Flatten a RoundRecord into an _UPSERT_ROUND row (players as Slack user IDs)."""
+    a, b = st.pair
+    return (
+        rid, game_id, st.trial, a, b, st.sub_a, st.sub_b,
+        int(st.submitted(a)), int(st.submitted(b)), int(st.completed), int(st.closed),
+        st.started_at, st.channel_id, st.game_outcome,
+    )
+
+
+def params_to_round(row):
+    """Inverse of round_to_params: (rid, RoundRecord, game_id)."""
+    (rid, game_id, trial, a, b, sa, sb, suba, subb, completed, closed,
+     started_at, channel_id, outcome) = row
+    st = RoundRecord(a, b, trial, channel_id, started_at=float(started_at))
+    st.sub_a, st.sub_b = sa, sb
+    st.flags = ((SUBMITTED_A if suba else 0) | (SUBMITTED_B if subb else 0)
+                | (COMPLETED if completed else 0) | (CLOSED if closed else 0))
+    st.game_outcome = outcome
+    return rid, st, game_id
+
+
+def game_to_params(game):
+    return (
+        game["game_id"], game.get("channel_id"), game["trialnum"], game["neighborsize"],
+        game["current_trial"], json.dumps(game["players"]),
+        json.dumps({str(t): [list(p) for p in pairs] for t, pairs in game["schedule_by_trial"].items()}),
+        json.dumps({str(t): rids for t, rids in game["rids_by_trial"].items()}),
+        game.get("csv_path"), int(bool(game.get("finished"))), time.time(),
+        game.get("engine"), game.get("topology"), json.dumps(sorted(game.get("inactive") or ())),
+    )
+
+
+def params_to_game(row):
+    (game_id, channel_id, trialnum, neighborsize, current_trial, players, schedule,
+     rids_by_trial, csv_path, finished, _, engine, topology, inactive) = row
+    return {
+        "game_id": game_id,
+        "channel_id": channel_id,
+        "trialnum": trialnum,
+        "neighborsize": neighborsize,
+        "current_trial": current_trial,
+        "players": json.loads(players),
+        "schedule_by_trial": {int(t): [tuple(p) for p in pairs] for t, pairs in json.loads(schedule).items()},
+        "rids_by_trial": {int(t): rids for t, rids in json.loads(rids_by_trial).items()},
+        "csv_path": csv_path,
+        "finished": bool(finished),
+        "engine": engine,               # None for games saved before these were recorded
+        "topology": topology,
+        "inactive": json.loads(inactive) if inactive else [],
+    }
+
+
+class SqliteStateStore:
+    def __init__(self, path, *, batch_size=500, flush_interval=0.5):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.commits = 0
+        self._lock = threading.RLock()
+        self._pending = {}      # (table, key) -> (sql, params); latest write wins
+        self._wake = threading.Condition(self._lock)
+        self._closed = False
+
+        self._db = sqlite3.connect(path, check_same_thread=False, cached_statements=64)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")   # durable at each WAL checkpoint; fast commits
+        self._db.executescript(SCHEMA)
+        have = {row[1] for row in self._db.execute("PRAGMA table_info(games)")}
+        for name, kind in _ADDED_GAME_COLUMNS:
+            if name not in have:
+                self._db.execute(f"ALTER TABLE games ADD COLUMN {name} {kind}")
+        self._db.commit()
+
+        self._flusher = threading.Thread(target=self._run, name="state-store", daemon=True)
+        self._flusher.start()
+        _open_stores.add(self)
+
+    # writes (buffered)
+    def save_round(self, rid, st, game_id=None):
+        self._put(("rounds", rid), _UPSERT_ROUND, round_to_params(rid, st, game_id))
+
+    def save_points(self, game_id, user_id, points):
+        self._put(("points", game_id, user_id), _UPSERT_POINTS, (game_id, user_id, int(points)))
+
+    def save_game(self, game):
+        self._put(("games", game["game_id"]), _UPSERT_GAME, game_to_params(game))
+
+    def set_awaiting(self, user_id, awaiting):
+        self._put(("awaiting", user_id), _UPSERT_AWAITING, (user_id, int(bool(awaiting))))
+
+    def save_trial_stats(self, game_id, trial, stats):
+        self._put(("trial_stats", game_id, trial), _UPSERT_TRIAL_STATS, (game_id, trial, json.dumps(stats)))
+
+    # reads (see buffered writes)
+    def load_round(self, rid):
+        """RoundRecord for rid, or None."""
+        found = self.find_round(rid)
+        return found[0] if found else None
+
+    def find_round(self, rid):
+        """(RoundRecord, game_id) for rid, or None."""
+        with self._lock:
+            pending = self._pending.get(("rounds", rid))
+            if pending:
+                row = pending[1]
+            else:
+                row = self._db.execute(_SELECT_ROUND, (rid,)).fetchone()
+        if not row:
+            return None
+        _, st, game_id = params_to_round(row)
+        return st, game_id
+
+    def rounds_for_trial(self, game_id, trial):
+        """{rid: RoundRecord} for one trial of a game."""
+        with self._lock:
+            self._flush_locked()
+            rows = self._db.execute(_SELECT_TRIAL, (game_id, trial)).fetchall()
+        return {rid: st for rid, st, _ in map(params_to_round, rows)}
+
+    def rounds_for_player(self, user_id):
+        """{rid: RoundRecord} for every round a player was in."""
+        with self._lock:
+            self._flush_locked()
+            rows = self._db.execute(_SELECT_PLAYER, (user_id, user_id)).fetchall()
+        return {rid: st for rid, st, _ in map(params_to_round, rows)}
+
+    def load_points(self, game_id):
+        with self._lock:
+            self._flush_locked()
+            return dict(self._db.execute(
+                "SELECT user_id, points FROM points WHERE game_id = ?", (game_id,)
+            ).fetchall())
+
+    def load_trial_stats(self, game_id):
+        """{trial: stats} saved for a game's finished trials."""
+        with self._lock:
+            self._flush_locked()
+            rows = self._db.execute(
+                "SELECT trial, stats FROM trial_stats WHERE game_id = ?", (game_id,)
+            ).fetchall()
+        return {trial: json.loads(stats) for trial, stats in rows}
+
+    def load_active_games(self):
+        """Every unfinished game, oldest first."""
+        with self._lock:
+            self._flush_locked()
+            rows = self._db.execute(f"SELECT {_GAME_COLUMNS} FROM games WHERE finished = 0 ORDER BY updated_at").fetchall()
+        return [params_to_game(row) for row in rows]
+
+    def get_awaiting(self, user_id):
+        with self._lock:
+            pending = self._pending.get(("awaiting", user_id))
+            if pending:
+                return bool(pending[1][1])
+            row = self._db.execute("SELECT awaiting FROM awaiting WHERE user_id = ?", (user_id,)).fetchone()
+        return bool(row[0]) if row else False
+
+    def flush(self):
+        """Commit every buffered write now (one transaction)."""
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._flush_locked()
+            self._closed = True
+            self._wake.notify_all()
+            self._db.close()
+        _open_stores.discard(self)
+
+    def _put(self, key, sql, params):
+        with self._lock:
+            if self._closed:
+                raise ValueError(f"{self.path} is closed")
+            self._pending[key] = (sql, params)
+            if len(self._pending) >= self.batch_size:
+                self._flush_locked()
+
+    # caller holds self._lock
+    def _flush_locked(self):
+        if not self._pending or self._closed:
+            return
+        by_sql = {}
+        for sql, params in self._pending.values():
+            by_sql.setdefault(sql, []).append(params)
+        self._pending = {}
+        with self._db:   # one transaction for the whole batch
+            for sql, rows in by_sql.items():
+                self._db.executemany(sql, rows)
+        self.commits += 1
+
+    def _run(self):
+        with self._lock:
+            while not self._closed:
+                self._wake.wait(self.flush_interval)
+                self._flush_locked()
+
+
+class MemoryStateStore:
+    """Same interface as SqliteStateStore, kept in dicts (nothing survives a restart)."""
+
+    def __init__(self):
+        self._rounds = {}      # rid -> (game_id, st)
+        self._games = {}
+        self._points = {}
+        self._awaiting = {}
+        self._trial_stats = {}
+        self._lock = threading.Lock()
+
+    def save_round(self, rid, st, game_id=None):
+        with self._lock:
+            self._rounds[rid] = (game_id, st)
+
+    def save_points(self, game_id, user_id, points):
+        with self._lock:
+            self._points[game_id, user_id] = int(points)
+
+    def save_game(self, game):
+        with self._lock:
+            # A snapshot, as SQLite would keep it (the schedule is a live PairSchedule)
+            self._games[game["game_id"]] = (time.time(), params_to_game(game_to_params(game)))
+
+    def set_awaiting(self, user_id, awaiting):
+        with self._lock:
+            self._awaiting[user_id] = bool(awaiting)
+
+    def save_trial_stats(self, game_id, trial, stats):
+        with self._lock:
+            self._trial_stats[game_id, trial] = dict(stats)
+
+    def load_round(self, rid):
+        found = self.find_round(rid)
+        return found[0] if found else None
+
+    def find_round(self, rid):
+        with self._lock:
+            entry = self._rounds.get(rid)
+        return (entry[1], entry[0]) if entry else None
+
+    def rounds_for_trial(self, game_id, trial):
+        with self._lock:
+            return {rid: st for rid, (g, st) in self._rounds.items() if g == game_id and st.trial == trial}
+
+    def rounds_for_player(self, user_id):
+        with self._lock:
+            return {rid: st for rid, (_, st) in self._rounds.items() if user_id in st.pair}
+
+    def load_points(self, game_id):
+        with self._lock:
+            return {u: p for (g, u), p in self._points.items() if g == game_id}
+
+    def load_trial_stats(self, game_id):
+        with self._lock:
+            return {t: s for (g, t), s in self._trial_stats.items() if g == game_id}
+
+    def load_active_games(self):
+        with self._lock:
+            games = [(ts, g) for ts, g in self._games.values() if not g.get("finished")]
+        return [g for _, g in sorted(games, key=lambda e: e[0])]
+
+    def get_awaiting(self, user_id):
+        with self._lock:
+            return self._awaiting.get(user_id, False)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@atexit.register
+def close_all_stores():
+    """Commit and close every open SQLite store (runs automatically at interpreter exit)."""
+    for store in list(_open_stores):
+        store.close()
+
+
+def open_state_store(path):
+    """SqliteStateStore at `path`, or MemoryStateStore if path is empty/None."""
+    return SqliteStateStore(path) if path else MemoryStateStore()
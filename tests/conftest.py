@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The modules import each other by bare name (the bots run from their own folder)
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, "hashtag_game_multiplayer")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
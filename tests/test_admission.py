@@ -0,0 +1,50 @@
+import pytest
+
+from admission import AdmissionWindow, plan_cohorts
+
+
+def sizes(cohorts):
+    return [len(c) for c in cohorts]
+
+
+@pytest.mark.parametrize("n, min_players, max_size, max_cohorts, expected, waitlisted", [
+    (3, 4, None, None, [], 3),             # too few to play
+    (5, 4, None, None, [4], 1),            # odd player out waits
+    (8, 4, None, None, [8], 0),
+    (30, 4, 20, None, [16, 14], 0),        # 15 + 15 would leave a player unpaired in each
+    (31, 4, 20, None, [16, 14], 1),
+    (41, 4, 20, None, [14, 14, 12], 1),
+    (45, 4, 20, 1, [20], 25),              # waitlist mode: one game at a time
+    (30, 4, 21, 1, [20], 10),              # an odd cap is rounded down
+    (10, 4, 5, None, [4, 4], 2),
+    (9, 4, 4, None, [4, 4], 1),
+    (10, 4, 20, 0, [], 10),
+])
+def test_plan_cohorts_sizes(n, min_players, max_size, max_cohorts, expected, waitlisted):
+    waiting = [f"U{i:03d}" for i in range(n)]
+    cohorts, waitlist = plan_cohorts(waiting, min_players, max_size, max_cohorts)
+    assert sizes(cohorts) == expected
+    assert len(waitlist) == waitlisted
+    assert all(len(c) % 2 == 0 and len(c) >= min_players for c in cohorts)
+    if max_size:
+        assert all(len(c) <= max_size for c in cohorts)
+    # join order is kept and nobody is lost or admitted twice
+    assert [u for c in cohorts for u in c] + waitlist == waiting
+
+
+def test_plan_cohorts_every_size_is_even():
+    for n in range(60):
+        for max_size in (None, 4, 5, 7, 10, 20):
+            cohorts, waitlist = plan_cohorts(range(n), 4, max_size)
+            assert all(len(c) % 2 == 0 and len(c) >= 4 for c in cohorts)
+            assert sum(sizes(cohorts)) + len(waitlist) == n
+
+
+def test_admission_window_caps_the_wait():
+    now = [0.0]
+    window = AdmissionWindow(10, 25, clock=lambda: now[0])
+    assert window.note_join("C1") == 10
+    now[0] = 20
+    assert window.note_join("C1") == 5      # 25 s after the first join at most
+    window.close("C1")
+    assert window.note_join("C1") == 10
@@ -0,0 +1,79 @@
+import asyncio
+import os
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+
+@pytest.fixture
+def bot(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)          # result CSVs land here
+    monkeypatch.setenv("GAME_STATE_DB", "")
+    monkeypatch.setenv("SCHEDULE_CACHE_DIR", str(tmp_path / "cache"))
+    for name in ("SLACK_BOT_TOKEN", "SLACK_SIGNING_SECRET", "SLACK_APP_TOKEN"):
+        monkeypatch.setenv(name, os.environ.get(name, "x"))
+    import hashtag_game_async
+    monkeypatch.setattr(hashtag_game_async, "ROUND_TIMEOUT_SECONDS", 0.5)
+    return hashtag_game_async
+
+
+class SlowSlack:
+    """Async stand-in for app.client: every prompt takes `delay` seconds to reach Slack."""
+
+    def __init__(self, players, delay):
+        self.players = players
+        self.delay = delay
+        self.prompted = {}              # user -> loop time their prompt arrived
+        self.posts = []
+
+    def __getattr__(self, name):
+        async def call(**kwargs):
+            loop = asyncio.get_running_loop()
+            if name == "auth_test":
+                return {"user_id": "UBOT"}
+            if name == "conversations_members":
+                return {"members": ["UBOT"] + self.players, "response_metadata": {"next_cursor": ""}}
+            if name == "chat_postEphemeral" and "blocks" in kwargs:
+                await asyncio.sleep(self.delay)
+                self.prompted[kwargs["user"]] = loop.time()
+            if name == "chat_postMessage":
+                self.posts.append(kwargs["text"])
+            return {"ok": True}
+        return call
+
+
+def test_round_clock_starts_once_its_prompts_are_out(bot, monkeypatch):
+    players = [f"U{i:03d}" for i in range(8)]
+    slack = SlowSlack(players, delay=0.3)
+    monkeypatch.setattr(bot.app, "_async_client", slack)
+
+    async def play():
+        timers = asyncio.create_task(bot.round_timers.run())
+        try:
+            await bot.start_game_when_min_players_reached("CASYNC")
+            session = bot.sessions.latest_for_channel("CASYNC")
+            deadlines = {rid: bot.round_timers._heap.deadline(rid) for rid in session.rids_by_trial[1]}
+            for rid, deadline in deadlines.items():
+                sent = max(slack.prompted[u] for u in session.rounds[rid].pair)
+                assert deadline - sent >= bot.ROUND_TIMEOUT_SECONDS - 0.01
+
+            for rid in list(session.rids_by_trial[1]):
+                for user in session.rounds[rid].pair:
+                    await bot.handle_submit(_ack, {"user": {"id": user}},
+                                            {"private_metadata": rid,
+                                             "state": {"values": {"hs": {"val": {"value": "#cats"}}}}})
+            while not session.finished:         # later trials time out
+                await asyncio.sleep(0.05)
+            return session
+        finally:
+            timers.cancel()
+
+    session = asyncio.run(play())
+    assert session.points.top(1)[0][1] == 1
+    assert bot.sessions.latest_for_channel("CASYNC").finished
+    assert slack.posts[-1].startswith("All trials complete")
+
+
+async def _ack():
+    pass
@@ -0,0 +1,58 @@
+import threading
+import time
+
+from channel_members import MembershipCache, fetch_members
+
+
+class PagedClient:
+    def __init__(self, members, page):
+        self.members = members
+        self.page = page
+        self.calls = 0
+
+    def conversations_members(self, channel, limit, cursor=None):
+        self.calls += 1
+        start = int(cursor or 0)
+        end = start + self.page
+        more = end < len(self.members)
+        return {"members": self.members[start:end],
+                "response_metadata": {"next_cursor": str(end) if more else ""}}
+
+
+def test_fetch_members_follows_every_page():
+    client = PagedClient([f"U{i}" for i in range(7)], page=3)
+    assert fetch_members(client, "C1", page_size=3) == [f"U{i}" for i in range(7)]
+    assert client.calls == 3
+
+
+def test_events_update_the_cache_until_it_is_reconciled():
+    now = [0.0]
+    cache = MembershipCache(reconcile_after=10, clock=lambda: now[0])
+    cache.bot_user_id = "UBOT"
+    cache.joined("C1", "U9")                              # not loaded yet: ignored
+    cache.ensure("C1", lambda channel: ["UBOT", "U1", "U2"])
+    cache.joined("C1", "U3")
+    cache.left("C1", "U1")
+    cache.ensure("C1", lambda channel: ["U8"])           # still fresh: not fetched
+    assert cache.players("C1") == ["U2", "U3"] and cache.fetches == 1
+
+    now[0] = 10
+    cache.ensure("C1", lambda channel: ["U1", "U2"])
+    assert cache.players("C1") == ["U1", "U2"] and cache.fetches == 2
+
+
+def test_concurrent_joins_fetch_once():
+    cache = MembershipCache()
+    calls = []
+
+    def fetch(channel):
+        calls.append(channel)
+        time.sleep(0.05)
+        return ["U1"]
+
+    threads = [threading.Thread(target=cache.ensure, args=("C1", fetch)) for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert calls == ["C1"] and cache.players("C1") == ["U1"]
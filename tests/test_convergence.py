@@ -0,0 +1,38 @@
+import math
+
+import pytest
+
+from convergence import Convergence
+
+
+def test_tally_entropy_dominant_and_resubmission():
+    conv = Convergence()
+    for tag in ["#Cats", "cats", "dogs", "birds"]:
+        conv.submitted(1, tag)
+    stats = conv.stats(1)
+    assert (stats["submissions"], stats["distinct"], stats["dominant"]) == (4, 3, "cats")
+    assert stats["entropy_bits"] == pytest.approx(1.5)
+
+    conv.submitted(1, "cats", previous="birds")    # a player changes their tag
+    conv.round_closed(1, "match")
+    conv.round_closed(1, "timeout")
+    stats = conv.stats(1)
+    assert (stats["submissions"], stats["distinct"], stats["dominant_share"]) == (4, 2, 0.75)
+    assert stats["entropy_bits"] == pytest.approx(round(-(0.75 * math.log2(0.75) + 0.25 * math.log2(0.25)), 4))
+    assert (stats["matches"], stats["timeouts"], stats["match_rate"]) == (1, 1, 0.5)
+
+
+def test_ties_and_finished_trials():
+    conv = Convergence()
+    conv.submitted(1, "b")
+    conv.submitted(1, "a")
+    assert conv.stats(1)["dominant"] == "a"
+    finished = conv.finish(1)
+    conv.submitted(2, "x")
+    assert conv.stats(1) == finished
+    assert [s["trial"] for s in conv.history()] == [1, 2]
+
+    restored = Convergence()
+    restored.load({"1": finished})
+    assert restored.stats(1) == finished
+    assert restored.stats(3)["submissions"] == 0
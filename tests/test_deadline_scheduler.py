@@ -0,0 +1,58 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from deadline_scheduler import DeadlineHeap, DeadlineScheduler
+
+
+def test_cancelled_and_extended_deadlines_are_skipped():
+    heap = DeadlineHeap()
+    heap.push("a", 10.0, ("A",))
+    heap.push("b", 20.0)
+    assert heap.push("c", 5.0)              # now the earliest
+    assert heap.cancel("c")
+    assert not heap.cancel("c")
+    assert heap.extend("a", 15.0)           # a: 10 -> 25, the 10 entry goes stale
+    assert not heap.extend("missing", 1.0)
+
+    assert len(heap) == 2 and "c" not in heap
+    assert heap.next_deadline() == 20.0
+    assert heap.pop_expired(19.0) == []
+    assert heap.pop_expired(30.0) == [("b", ()), ("a", ("A",))]
+    assert heap.next_deadline() is None and not heap._heap
+
+
+def test_push_replaces_the_earlier_deadline():
+    heap = DeadlineHeap()
+    heap.push("r1", 5.0)
+    assert not heap.push("r2", 8.0)
+    heap.push("r1", 9.0)
+    assert heap.deadline("r1") == 9.0
+    assert heap.pop_expired(8.5) == [("r2", ())]
+    assert heap.pop_expired(9.0) == [("r1", ())]
+
+
+def test_slow_callback_does_not_delay_the_next_deadline():
+    fired = {}
+    release = threading.Event()
+
+    def on_expire(key):
+        fired[key] = time.monotonic()
+        if key == "slow":
+            release.wait(5)         # e.g. the timeout that advances a trial
+
+    executor = ThreadPoolExecutor(2)
+    timers = DeadlineScheduler(on_expire, executor=executor)
+    try:
+        start = time.monotonic()
+        timers.schedule("slow", 0.05)
+        timers.schedule("next", 0.15)
+        deadline = start + 2
+        while "next" not in fired and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert fired["next"] - start < 1.0
+        assert "slow" in fired and timers.pending() == 0
+    finally:
+        release.set()
+        timers.stop()
+        executor.shutdown()
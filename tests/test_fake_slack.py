@@ -0,0 +1,66 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from slack_sdk import WebClient
+from slack_sdk.errors import SlackApiError
+
+from fake_slack import BOT_USER_ID, FakeSlackApi, FakeSlackClient, FakeSlackServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GAME_DIR = os.path.join(ROOT, "hashtag_game_multiplayer")
+
+
+def test_client_answers_like_slack():
+    client = FakeSlackClient(["U1", "U2", "U3"])
+    assert client.auth_test()["user_id"] == BOT_USER_ID
+
+    members, cursor = [], None
+    while True:
+        page = client.conversations_members(channel="C1", limit=2, cursor=cursor)
+        members += page["members"]
+        cursor = page["response_metadata"]["next_cursor"]
+        if not cursor:
+            break
+    assert members == [BOT_USER_ID, "U1", "U2", "U3"]
+
+    client.chat_postEphemeral(channel="C1", user="U1", text="hi")
+    assert client.api.counts["chat.postEphemeral"] == 1
+
+
+def test_rate_limited_calls_carry_retry_after():
+    client = FakeSlackClient(rate_limit=1.0, retry_after=2.5)
+    with pytest.raises(SlackApiError) as err:
+        client.chat_postMessage(channel="C1", text="hi")
+    assert err.value.response.status_code == 429
+    assert err.value.response.headers["Retry-After"] == "2.5"
+    assert client.api.rate_limited["chat.postMessage"] == 1 and not client.api.counts
+
+
+def test_server_answers_a_real_web_client():
+    calls = []
+    api = FakeSlackApi(["U1"], on_call=lambda method, payload, when: calls.append((method, payload.get("text"))))
+    server = FakeSlackServer(api).start()
+    try:
+        client = WebClient(token="xoxb-test", base_url=server.base_url)
+        assert client.chat_postMessage(channel="C1", text="hello")["ok"]
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert calls == [("chat.postMessage", "hello")]
+
+
+def test_benchmark_plays_a_game(tmp_path):
+    out = tmp_path / "benchmark.json"
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([ROOT, GAME_DIR]))
+    subprocess.run([sys.executable, os.path.join(GAME_DIR, "benchmark.py"), "--sizes", "10", "--engine", "fast",
+                    "--round-timeout", "0.3", "--out", str(out)],
+                   cwd=str(tmp_path), env=env, check=True, capture_output=True, timeout=120)
+
+    result = json.loads(out.read_text())["results"][0]
+    assert "error" not in result
+    assert result["events"] == result["submits"] + result["timeouts"] > 0
+    assert result["submit_to_announce_ms"]["count"] == result["submits"]
+    assert result["slack_calls"]["views.open"] == result["submits"]
@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+from game_logic import (PairSchedule, PayloadTemplate, build_pair_schedule_spatial, group_pairs_by_trial,
+                        submit_modal_template, trial_prompt_template)
+
+PLAYERS = [f"U{i:03d}" for i in range(12)]
+
+
+def test_payload_template_fills_slots_escaped():
+    template = PayloadTemplate({"text": "Hi {{name}}, round {{rid}}", "n": 3, "value": "{{rid}}"})
+    filled = json.loads(template.fill(name='Ann "A" \\ \n', rid="r-12"))
+    assert filled == {"text": 'Hi Ann "A" \\ \n, round r-12', "n": 3, "value": "r-12"}
+    assert json.loads(PayloadTemplate({"text": "no slots"}).fill()) == {"text": "no slots"}
+
+
+def test_trial_templates_carry_the_round_id():
+    blocks = json.loads(trial_prompt_template(2).fill(rid="r7"))
+    assert blocks[1]["elements"][0]["value"] == "r7"
+    assert "Trial 2" in blocks[0]["text"]["text"]
+    assert json.loads(submit_modal_template(2).fill(rid="r7"))["private_metadata"] == "r7"
+
+
+@pytest.mark.parametrize("engine", ["fast", "matlab"])
+def test_pair_schedule_streams_the_same_pairs(engine, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)                        # keep the schedule cache out of the repo
+    expected = group_pairs_by_trial(build_pair_schedule_spatial(PLAYERS, randseed=5, trialnum=4, neighborsize=4,
+                                                                engine=engine))
+    schedule = PairSchedule(PLAYERS, randseed=5, trialnum=4, neighborsize=4, engine=engine, keep=1)
+    assert schedule[1] == expected[1] and not schedule.ready(2)
+    schedule.prefetch(2).result(5)
+    assert schedule.ready(2)
+    assert [schedule[t] for t in (4, 3, 1)] == [expected[4], expected[3], expected[1]]   # dropped trials come back
+    with pytest.raises(KeyError):
+        schedule[5]
+
+    endless = PairSchedule(PLAYERS, randseed=5, trialnum=None, neighborsize=4, engine=engine)
+    assert endless[4] == expected[4] and endless[40]
+
+
+def test_dropped_players_sit_out_later_trials(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    schedule = PairSchedule(PLAYERS, randseed=5, trialnum=4, neighborsize=4, engine="fast")
+    planned = {t: schedule[t] for t in (1, 2, 3, 4)}
+    assert schedule.drop_player("U003") and not schedule.drop_player("U003")
+    for t in (1, 2, 3):
+        pairs = schedule[t]
+        assert all("U003" not in pair for pair in pairs)
+        assert len({u for pair in pairs for u in pair}) == 2 * len(pairs)
+    assert schedule.restore_player("U003")
+    assert schedule[4] == planned[4]
@@ -0,0 +1,77 @@
+import pytest
+
+from game_logic import PairSchedule
+from game_sessions import FinishedGame, GameSession, Leaderboard, SessionRegistry
+from state_store import MemoryStateStore, SqliteStateStore
+
+PLAYERS = [f"U{i:03d}" for i in range(12)]
+
+
+def new_session(**schedule_args):
+    schedule = PairSchedule(PLAYERS, trialnum=3, neighborsize=4, **schedule_args)
+    return GameSession("g1", "C1", PLAYERS, schedule, trialnum=3, neighborsize=4)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    store = MemoryStateStore() if request.param == "memory" else SqliteStateStore(str(tmp_path / "state.sqlite3"))
+    yield store
+    store.close()
+
+
+def test_record_keeps_engine_topology_and_dropouts(store):
+    session = new_session(engine="fast", topology="torus")
+    session.schedule_by_trial[1]
+    assert session.drop_player("U003")
+    store.save_game(session.to_record())
+
+    resumed = GameSession.from_record(store.load_active_games()[0])
+    schedule = resumed.schedule_by_trial
+    assert (schedule.engine, schedule.topology) == ("fast", "torus")
+    assert schedule.inactive == {"U003"}
+    assert schedule[1] == session.schedule_by_trial[1]
+    assert all("U003" not in pair for pair in schedule[2])
+
+def test_leaderboard_top_orders_by_points_then_user():
+    board = Leaderboard(["U5", "U1", "U3", "U2"])
+    board.add("U3", 2)
+    board.add("U5", 2)
+    board.add("U2")
+    board.add("U3", -1)
+    assert board.top(3) == [("U5", 2), ("U2", 1), ("U3", 1)]
+    assert board.top(10)[-1] == ("U1", 0)
+    board.update({"U1": 4})
+    assert board.top(1) == [("U1", 4)] and board["U1"] == 4
+
+
+def test_finished_games_leave_the_registry():
+    registry = SessionRegistry()
+    session = new_session()
+    registry.add(session)
+    registry.add_rounds(session, ["r1", "r2"])
+    session.points.add("U001", 3)
+    session.convergence.submitted(1, "cats")
+
+    session.finished = True
+    registry.finish(session)
+    assert len(registry) == 0 and registry.for_channel("C1") == []
+    assert registry.get("g1") is None and registry.for_rid("r1") is None
+
+    last = registry.latest_for_channel("C1")
+    assert isinstance(last, FinishedGame) and last.finished
+    assert last.points.top(1) == [("U001", 3)]
+    assert last.convergence.history()[0]["dominant"] == "cats"
+    assert registry.in_game("C1") == set(PLAYERS)       # nobody is admitted twice
+
+    running = new_session()
+    running.game_id = "g2"
+    registry.add(running)
+    assert registry.latest_for_channel("C1") is running
+
+
+def test_close_round_counts_down_to_one_winner():
+    session = new_session()
+    session.open_trial(1, 3)
+    assert [session.close_round(1) for _ in range(3)] == [False, False, True]
+    assert not session.close_round(1)
+    assert not session.close_round(2)
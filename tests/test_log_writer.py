@@ -0,0 +1,67 @@
+import csv
+import pytest
+
+import log_writer
+from log_writer import BufferedCsvLog
+
+
+def read_rows(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+
+def test_rows_are_batched_until_flush(tmp_path):
+    path = str(tmp_path / "log.csv")
+    log = BufferedCsvLog(path, ["a", "b"], max_rows=100, max_delay=60)
+    log.append([1, "x"])
+    log.append([2, "y, z"])
+    assert log.pending() == 2 and read_rows(path) == [["a", "b"]]
+
+    log.flush()
+    assert log.pending() == 0 and log.commits == 1
+    assert read_rows(path) == [["a", "b"], ["1", "x"], ["2", "y, z"]]
+    log.close()
+
+
+def test_full_buffer_and_wait_trigger_a_group_commit(tmp_path):
+    path = str(tmp_path / "log.csv")
+    log = BufferedCsvLog(path, max_rows=3, max_delay=60, fsync="never")
+    for i in range(2):
+        log.append([i])
+    log.append([2], wait=True)          # fills the buffer and waits for its commit
+    assert read_rows(path) == [["0"], ["1"], ["2"]] and log.rows_written == 3
+    log.close()
+
+
+def test_close_writes_everything_and_rejects_later_rows(tmp_path):
+    path = str(tmp_path / "log.csv")
+    log = BufferedCsvLog(path, ["n"], max_rows=1000, max_delay=60)
+    log.append([1])
+    log.close()
+    log.close()
+    with pytest.raises(ValueError):
+        log.append([2])
+
+    reopened = BufferedCsvLog(path, ["n"])      # header only goes into a new file
+    reopened.append([3])
+    reopened.close()
+    assert read_rows(path) == [["n"], ["1"], ["3"]]
+
+
+def test_append_racing_close_raises_instead_of_being_lost(tmp_path, monkeypatch):
+    path = str(tmp_path / "log.csv")
+    log = BufferedCsvLog(path, max_rows=1000, max_delay=60, fsync="close")
+    log.append([1])
+    late = []
+
+    def fsync(fd):              # runs inside close(), after the last rows were written
+        try:
+            log.append([2])
+            late.append("accepted")
+        except ValueError:
+            late.append("rejected")
+
+    monkeypatch.setattr(log_writer.os, "fsync", fsync)
+    log.close()
+    assert late == ["rejected"]
+    assert read_rows(path) == [["1"]]
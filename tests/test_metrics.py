@@ -0,0 +1,67 @@
+import json
+import urllib.request
+
+import metrics
+
+
+def test_registry_renders_prometheus_text():
+    registry = metrics.MetricsRegistry()
+    registry.counter("slack_calls_total", method="views_open", outcome="ok").inc(2)
+    registry.counter("slack_calls_total", outcome="ok", method="views_open").inc()    # same series
+    histogram = registry.histogram("handler_seconds", handler='say "hi"')
+    for value in (0.0005, 0.02, 100):
+        histogram.observe(value)
+    registry.gauge("games_running", lambda: 3)
+    registry.gauge("broken", lambda: 1 / 0)
+
+    text = registry.render()
+    assert '# TYPE slack_calls_total counter' in text
+    assert 'slack_calls_total{method="views_open",outcome="ok"} 3' in text
+    assert 'handler_seconds_bucket{handler="say \\"hi\\"",le="0.001"} 1' in text
+    assert 'handler_seconds_bucket{handler="say \\"hi\\"",le="+Inf"} 3' in text
+    assert 'handler_seconds_count{handler="say \\"hi\\""} 3' in text
+    assert "games_running 3.0" in text and "broken" not in text
+
+    snapshot = registry.snapshot()
+    assert snapshot["counters"] == [{"name": "slack_calls_total",
+                                     "labels": {"method": "views_open", "outcome": "ok"}, "value": 3}]
+    assert snapshot["histograms"][0]["buckets"]["+Inf"] == 1
+    assert snapshot["gauges"] == {"games_running": 3.0}
+
+
+def test_helpers_do_nothing_when_off(monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", False)
+    monkeypatch.setattr(metrics, "REGISTRY", metrics.MetricsRegistry())
+    metrics.inc("submissions_total")
+    with metrics.timer("trial_start_seconds"):
+        pass
+
+    def handler():
+        return 1
+    assert metrics.timed("handler_seconds")(handler) is handler
+    assert metrics.REGISTRY.snapshot()["counters"] == []
+
+
+def test_helpers_record_when_on(monkeypatch, tmp_path):
+    monkeypatch.setattr(metrics, "ENABLED", True)
+    monkeypatch.setattr(metrics, "REGISTRY", metrics.MetricsRegistry())
+    metrics.inc("submissions_total", 2)
+
+    @metrics.timed("handler_seconds", handler="submit")
+    def handler(ack):
+        return ack
+    assert handler(ack=5) == 5 and handler.__name__ == "handler"
+
+    server = metrics.start_http_server(0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        text = urllib.request.urlopen(f"{url}/metrics").read().decode()
+        data = json.loads(urllib.request.urlopen(f"{url}/metrics.json").read())
+    finally:
+        server.shutdown()
+    assert "submissions_total 2" in text
+    assert data["histograms"][0]["count"] == 1
+
+    path = tmp_path / "metrics.json"
+    metrics.write_json(str(path))
+    assert json.loads(path.read_text())["counters"][0]["value"] == 2
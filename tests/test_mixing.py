@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+import topology
+from mixing import iter_trial_connections, network_connection_spatial, repair_matching
+
+
+def schedule(engine="fast", topology_name="ring", seed=7, nodesnum=20, trialnum=5, neighborsize=4):
+    return network_connection_spatial(seed, nodesnum, trialnum, neighborsize, engine=engine,
+                                      savecsv=False, topology=topology_name)
+
+
+def trial_partners(conn, t, nodesnum):
+    """partner array (0-based, -1 = sits out) of trial t; fails on a node paired twice."""
+    partner = np.full(nodesnum, -1)
+    for a, b, _ in conn[conn[:, 2] == t]:
+        a, b = a - 1, b - 1
+        assert a != b and partner[a] < 0 and partner[b] < 0
+        partner[a], partner[b] = b, a
+    return partner
+
+
+def assert_pairs_are_edges(partner, graph):
+    for u, v in enumerate(partner):
+        if v >= 0:
+            assert v in graph[u]
+
+
+@pytest.mark.parametrize("engine", ["fast", "matlab"])
+@pytest.mark.parametrize("nodesnum,neighborsize", [(10, 2), (20, 4), (64, 6)])
+def test_engines_give_perfect_matchings_on_the_ring(engine, nodesnum, neighborsize):
+    conn = schedule(engine, nodesnum=nodesnum, neighborsize=neighborsize)
+    nbr = topology.ring_neighbor_index(nodesnum, neighborsize)
+    assert conn.shape == (5 * nodesnum // 2, 3)
+    for t in range(1, 6):
+        partner = trial_partners(conn, t, nodesnum)
+        assert (partner >= 0).all()
+        assert_pairs_are_edges(partner, nbr)
+
+
+@pytest.mark.parametrize("name", ["torus", "random_regular", "complete"])
+def test_topology_engine_gives_valid_matchings(name):
+    conn = schedule(topology_name=name, nodesnum=16)
+    graph = topology.make_topology(name, 16, 4, seed=7)
+    for t in range(1, 6):
+        partner = trial_partners(conn, t, 16)
+        assert_pairs_are_edges(partner, graph)
+        if name in ("torus", "complete"):
+            assert (partner >= 0).all()     # bipartite / complete: the matching is perfect
+
+
+@pytest.mark.parametrize("engine,name", [("fast", "ring"), ("matlab", "ring"), ("matlab", "torus"),
+                                         ("matlab", "small_world")])
+def test_schedules_are_reproducible_per_seed(engine, name):
+    first = schedule(engine, name, seed=3)
+    assert np.array_equal(first, schedule(engine, name, seed=3))
+    assert not np.array_equal(first, schedule(engine, name, seed=4))
+
+
+def test_odd_nodesnum_is_rejected_by_the_fast_engine():
+    with pytest.raises(ValueError):
+        schedule(nodesnum=11)
+
+
+def test_matlab_sampler_prints_only_when_verbose(capsys):
+    network_connection_spatial(1, 10, 3, 2, savecsv=False)
+    assert capsys.readouterr().out == ""
+    network_connection_spatial(1, 10, 3, 2, savecsv=False, verbose=True)
+    assert capsys.readouterr().out.split("\n")[:3] == ["Trial 1", "Trial 2", "Trial 3"]
+
+
+@pytest.mark.parametrize("engine,name", [("fast", "ring"), ("matlab", "ring"), ("fast", "torus")])
+def test_streamed_trials_match_the_whole_matrix(engine, name):
+    conn = schedule(engine, name, nodesnum=16)
+    trials = list(iter_trial_connections(7, 16, 4, engine=engine, trialnum=5, topology=name))
+    assert len(trials) == 5
+    assert np.array_equal(np.vstack(trials), conn)
+    endless = iter_trial_connections(7, 16, 4, engine=engine, topology=name)
+    assert all(np.array_equal(next(endless), trial) for trial in trials)
+
+
+def test_repair_matching_only_touches_dropped_pairs():
+    nodesnum = 20
+    nbr = topology.ring_neighbor_index(nodesnum, 4)
+    partner = trial_partners(schedule(nodesnum=nodesnum), 1, nodesnum)
+    before = partner.copy()
+    active = np.ones(nodesnum, dtype=bool)
+    active[[0, 11]] = False
+
+    changed = repair_matching(partner, active, nbr, np.random.default_rng(0))
+
+    assert partner[0] == partner[11] == -1
+    for u in np.flatnonzero(active):
+        v = partner[u]
+        if v >= 0:
+            assert partner[v] == u and active[v] and v in nbr[u]
+    assert (partner[active] >= 0).sum() >= nodesnum - 4
+    moved = set(np.flatnonzero(partner != before).tolist())
+    assert moved <= set(changed)
+    assert {0, 11, int(before[0]), int(before[11])} <= set(changed)
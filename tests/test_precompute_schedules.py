@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+import precompute_schedules
+from mixing import network_connection_spatial
+from precompute_schedules import INDEX_DTYPE, build_one, parse_args, precompute, save_archive
+from schedule_cache import ScheduleCache, load_schedule_archive, schedule_key
+
+
+def test_archive_preloads_what_an_uncached_run_gives(tmp_path):
+    grid = [(1, 12, 3, 4), (2, 16, 3, 4)]
+    arrays, index, failures = precompute(grid, engine="fast", topology="torus", workers=1, report=lambda line: None)
+    assert not failures and len(index) == 2
+    path = str(tmp_path / "schedules.npz")
+    save_archive(path, arrays, index)
+
+    cache = ScheduleCache(cache_dir=str(tmp_path / "cache"))
+    assert cache.preload_archive(path) == 2
+    for seed, nodes, trials, k in grid:
+        expected = network_connection_spatial(seed, nodes, trials, k, engine="fast", savecsv=False, topology="torus")
+        assert np.array_equal(cache.get(seed, nodes, trials, k, engine="fast", topology="torus"), expected)
+        assert cache.get(seed, nodes, trials, k, engine="fast") is None      # a ring run is not served a torus
+
+
+def test_retried_seed_is_stored_under_the_seed_that_built_it(tmp_path, monkeypatch):
+    real = precompute_schedules.network_connection_spatial
+
+    def cycle_on_seed_1(randseed, **kwargs):
+        if randseed == 1:
+            raise RuntimeError("Cycle detected")
+        return real(randseed=randseed, **kwargs)
+
+    monkeypatch.setattr(precompute_schedules, "network_connection_spatial", cycle_on_seed_1)
+    used_seed, attempts, _, conn = build_one(1, 10, 3, 2, "fast", max_retries=2)
+    assert (used_seed, attempts) == (1 + precompute_schedules.SEED_RETRY_STRIDE, 2)
+
+    name = precompute_schedules.archive_name(schedule_key(used_seed, 10, 3, 2, "fast"))
+    index = np.array([(name, 1, 10, 3, 2, "fast", used_seed, attempts, 0.0, "ring")], dtype=INDEX_DTYPE)
+    path = str(tmp_path / "schedules.npz")
+    save_archive(path, {name: conn}, index)
+    assert list(load_schedule_archive(path)) == [schedule_key(used_seed, 10, 3, 2, "fast")]
+
+
+def test_odd_cohorts_are_rejected_up_front():
+    with pytest.raises(ValueError):
+        build_one(1, 11, 3, 2, "matlab", max_retries=0)
+    with pytest.raises(SystemExit):
+        parse_args(["--nodes", "10", "11", "--neighborsize", "2"])
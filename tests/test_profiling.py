@@ -0,0 +1,65 @@
+import json
+import threading
+import time
+
+import profiling
+
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_trial_window_records_hooks_and_stacks(monkeypatch, tmp_path, capsys):
+    profiler = profiling.Profiler(str(tmp_path), interval=0.002)
+    monkeypatch.setattr(profiling, "ENABLED", True)
+    monkeypatch.setattr(profiling, "PROFILER", profiler)
+    sampler = threading.Thread(target=profiler._run, daemon=True)
+    sampler.start()
+
+    @profiling.hook("start_trial")
+    def start_trial():
+        busy(0.05)
+        time.sleep(0.05)
+
+    start_trial()                                   # before the window: session totals only
+    profiling.trial_started("game1234abcd", 1)
+    start_trial()
+    with profiling.section("close_round"):
+        pass
+    profiling.trial_finished("game1234abcd", 1)
+    profiler._stop.set()
+    sampler.join()
+
+    trial = json.loads((tmp_path / "game1234_t1.json").read_text())
+    assert (trial["game_id"], trial["trial"]) == ("game1234abcd", 1)
+    assert trial["hooks"]["start_trial"]["calls"] == 1
+    assert trial["hooks"]["close_round"]["calls"] == 1
+    assert trial["hooks"]["start_trial"]["wait_s"] > 0.03     # the sleep is waiting, not CPU
+    assert profiler.hooks["start_trial"][0] == 2
+    stacks = profiling._read_stacks(tmp_path / "game1234_t1.stacks")
+    assert any("busy (test_profiling.py" in stack for stack in stacks)
+
+    profiler.close()
+    profiling.report(str(tmp_path), top=5)
+    out = capsys.readouterr().out
+    assert "Hottest functions (on CPU)" in out and "game1234 trial 1" in out
+    assert "start_trial: 2" in out
+
+
+def test_hottest_ranks_by_self_samples():
+    samples = {"[cpu];main;run;a": 3, "[cpu];main;run;b": 5, "[wait];main;run;sleep": 9}
+    assert profiling.hottest(samples, top=2) == [("b", 5, 5), ("a", 3, 3)]
+    assert profiling.hottest(samples, "[wait]", top=1) == [("sleep", 9, 9)]
+
+
+def test_off_by_default(monkeypatch):
+    monkeypatch.setattr(profiling, "ENABLED", False)
+
+    def handler():
+        pass
+    assert profiling.hook("x")(handler) is handler
+    with profiling.section("x"):
+        pass
+    profiling.trial_started("g", 1)
@@ -0,0 +1,35 @@
+import pytest
+
+from game_logic import CSV_HEADER
+from result_sinks import convert_csv, open_result_sink, schema_for
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+def test_schema_follows_csv_header():
+    assert schema_for(CSV_HEADER).names == CSV_HEADER
+    schema = schema_for(CSV_HEADER + ["new_column"])
+    assert schema.field("new_column").type == pa.string()
+    assert schema.field("trial").type == pa.int32()
+
+
+def test_rounds_written_as_csv_and_parquet(tmp_path):
+    path = str(tmp_path / "submissions.csv")
+    rows = [
+        ["r1", 1, "U1", "U2", "cats", "cats", 1, "2025-01-01T12:00:00", "match"],
+        ["r2", 2, "U1", "U3", "cats", "", 0, "2025-01-01T12:01:00", "timeout"],
+    ]
+    log = open_result_sink(path, CSV_HEADER, ("csv", "parquet"))
+    for t, row in enumerate(rows, 1):
+        log.append(row)
+        log.flush()
+    log.close()
+
+    table = pq.read_table(str(tmp_path / "submissions.parquet"))
+    assert table.column_names == CSV_HEADER
+    assert table.column("trial").to_pylist() == [1, 2]
+    assert pq.ParquetFile(str(tmp_path / "submissions.parquet")).num_row_groups == 2
+
+    converted = pq.read_table(convert_csv(path, str(tmp_path / "converted.parquet")))
+    assert converted.equals(table)
@@ -0,0 +1,23 @@
+import pytest
+
+from round_records import PLAYERS, RoundRecord
+
+
+def test_submit_and_flags():
+    st = RoundRecord("URR1", "URR2", 1, "C1")
+    st.submit("URR2", "cats")
+    assert st.submitted("URR2") and not st.submitted("URR1")
+    assert st.sub("URR2") == "cats" and st.sub_b == "cats"
+    assert not st.both_submitted()
+    st.submit("URR1", "dogs")
+    assert st.both_submitted()
+
+
+def test_outsider_is_not_a_member_and_is_not_interned():
+    st = RoundRecord("URR3", "URR4", 1, "C1")
+    players = len(PLAYERS)
+    assert st.has("URR3") and not st.has("UOUTSIDER")
+    with pytest.raises(KeyError):
+        st.submit("UOUTSIDER", "x")
+    assert PLAYERS.lookup("UOUTSIDER") is None
+    assert len(PLAYERS) == players
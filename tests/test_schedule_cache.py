@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from mixing import network_connection_spatial
+from schedule_cache import ScheduleCache, compact_connectmat
+
+
+def test_put_get_round_trip_through_memory_and_disk(tmp_path):
+    conn = network_connection_spatial(5, 12, 4, 4, engine="fast", savecsv=False)
+    cache = ScheduleCache(cache_dir=str(tmp_path))
+    assert cache.get(5, 12, 4, 4, engine="fast") is None
+
+    stored = cache.put(5, 12, 4, 4, conn, engine="fast")
+    assert stored.dtype == np.int16 and not stored.flags.writeable
+    assert np.array_equal(cache.get(5, 12, 4, 4, engine="fast"), conn)
+    assert cache.get(5, 12, 4, 4) is None                   # other engine, other key
+
+    fresh = ScheduleCache(cache_dir=str(tmp_path))           # e.g. after a restart
+    from_disk = fresh.get(5, 12, 4, 4, engine="fast")
+    assert np.array_equal(from_disk, conn) and fresh.disk_hits == 1
+    with pytest.raises(ValueError):
+        from_disk[0, 0] = 0
+
+
+def test_get_or_build_stores_what_it_builds(tmp_path):
+    cache = ScheduleCache(cache_dir=str(tmp_path))
+    built = cache.get_or_build(2, 16, 3, 4, engine="fast", topology="torus")
+    assert np.array_equal(built, network_connection_spatial(2, 16, 3, 4, engine="fast",
+                                                            savecsv=False, topology="torus"))
+    assert cache.get_or_build(2, 16, 3, 4, engine="fast", topology="torus") is built
+    assert cache.misses == 1 and cache.hits == 1
+
+
+def test_memory_layer_evicts_least_recently_used():
+    conns = {seed: network_connection_spatial(seed, 40, 10, 4, engine="fast", savecsv=False) for seed in (1, 2, 3)}
+    size = compact_connectmat(conns[1], 40, 10).nbytes
+    cache = ScheduleCache(cache_dir=None, max_memory_bytes=2 * size)
+    for seed in (1, 2):
+        cache.put(seed, 40, 10, 4, conns[seed], engine="fast")
+    cache.get(1, 40, 10, 4, engine="fast")                  # 2 is now the least recently used
+    cache.put(3, 40, 10, 4, conns[3], engine="fast")
+    assert cache.get(2, 40, 10, 4, engine="fast") is None
+    assert cache.get(1, 40, 10, 4, engine="fast") is not None
+
+
+def test_disk_layer_stays_within_its_budget(tmp_path):
+    cache = ScheduleCache(cache_dir=str(tmp_path), max_disk_bytes=1)
+    for seed in (1, 2, 3):
+        cache.put(seed, 40, 10, 4, network_connection_spatial(seed, 40, 10, 4, engine="fast", savecsv=False),
+                  engine="fast")
+    assert len(list(tmp_path.iterdir())) == 1                # only the newest file is kept
+    cache.clear_memory()
+    assert cache.get(3, 40, 10, 4, engine="fast") is not None
@@ -0,0 +1,41 @@
+import json
+
+import numpy as np
+
+from mixing import network_connection_spatial
+from schedule_diagnostics import main, summarize
+
+# 6 nodes, 3 trials: (1,2) meets twice, nodes 4 and 6 sit out trial 3
+CONN = np.array([
+    [1, 2, 1], [3, 4, 1], [5, 6, 1],
+    [2, 3, 2], [4, 5, 2], [6, 1, 2],
+    [2, 1, 3], [3, 5, 3],
+])
+
+
+def test_summarize_small_schedule():
+    report = summarize(CONN, nodesnum=6)
+    assert (report["nodes"], report["trials"], report["pairings"]) == (6, 3, 8)
+    assert report["pairs"] == {"distinct": 7, "repeated": 1, "repeat_pairings": 1, "max_meetings": 2,
+                               "meetings_histogram": [0, 6, 1]}
+    assert report["trials_paired"] == {"min": 2, "mean": 16 / 6, "max": 3, "sitting_out": 2}
+    assert report["ring_distance"]["histogram"] == [0, 7, 1]      # (3,5) is two apart, (6,1) wraps around
+    assert report["distinct_partners"]["min"] == 2 and report["distinct_partners"]["max"] == 3
+
+
+def test_ring_schedule_stays_within_the_neighborhood():
+    conn = network_connection_spatial(1, 40, 10, 4, engine="fast", savecsv=False)
+    report = summarize(conn)
+    assert report["nodes"] == 40 and report["trials"] == 10
+    assert report["ring_distance"]["max"] <= 2
+    assert report["trials_paired"]["sitting_out"] == 0
+
+
+def test_command_line_reads_a_saved_schedule(tmp_path, capsys):
+    path = tmp_path / "connection.csv"
+    np.savetxt(path, CONN, delimiter=",", fmt="%d", header="Node1,Node2,Trial", comments="")
+    out = tmp_path / "report.json"
+    assert main([str(path), "--nodes", "6", "--json", str(out)]) == 0
+    assert "6 nodes, 3 trials, 8 pairings" in capsys.readouterr().out
+    assert json.loads(out.read_text())["pairs"]["repeated"] == 1
+    assert main([]) == 2
@@ -0,0 +1,87 @@
+import time
+
+import pytest
+from slack_sdk.errors import SlackApiError
+from slack_sdk.web import SlackResponse
+
+from slack_dispatch import METHOD_LIMITS, PRIORITY_PROMPT, SlackDispatcher, parse_limits
+
+
+def rate_limited(retry_after):
+    resp = SlackResponse(client=None, http_verb="POST", api_url="", req_args={},
+                         data={"ok": False, "error": "ratelimited"},
+                         headers={"Retry-After": str(retry_after)}, status_code=429)
+    return SlackApiError("ratelimited", resp)
+
+
+class FakeClient:
+    """Answers the first `limited` calls with 429, everything else with ok."""
+
+    def __init__(self, limited, retry_after):
+        self.limited = limited
+        self.retry_after = retry_after
+        self.delivered = {}          # user -> seconds after start
+        self.start = time.monotonic()
+
+    def _call(self, user):
+        if self.limited:
+            self.limited -= 1
+            raise rate_limited(self.retry_after)
+        self.delivered[user] = time.monotonic() - self.start
+        return {"ok": True}
+
+    def chat_postEphemeral(self, user, **kwargs):
+        return self._call(user)
+
+    def views_open(self, trigger_id, **kwargs):
+        return self._call(trigger_id)
+
+
+def test_parse_limits():
+    assert parse_limits("") == {}
+    assert parse_limits("chat_postEphemeral=5:50, views_open=2") == {
+        "chat_postEphemeral": (5.0, 50.0),
+        "views_open": (2.0, METHOD_LIMITS["views_open"][1]),
+    }
+    with pytest.raises(ValueError):
+        parse_limits("chat_postEphemeral=fast")
+
+
+def test_429_pauses_the_whole_method():
+    client = FakeClient(limited=1, retry_after=1)
+    outbox = SlackDispatcher(workers=2, limits={"chat_postEphemeral": (1000, 1000)})
+    outbox.submit(client, "chat_postEphemeral", PRIORITY_PROMPT, channel="C1", user="U0", text="hi")
+    while not outbox.rate_limited:
+        time.sleep(0.01)
+    for i in range(1, 5):
+        outbox.submit(client, "chat_postEphemeral", PRIORITY_PROMPT, channel="C1", user=f"U{i}", text="hi")
+    outbox.submit(client, "views_open", trigger_id="T1", view={})
+    assert outbox.join(10)
+
+    assert outbox.rate_limited == 1 and outbox.failed == 0
+    assert min(client.delivered[f"U{i}"] for i in range(5)) >= 1    # nothing sent inside Retry-After
+    assert client.delivered["T1"] < 0.5                             # other methods keep going
+
+
+def test_rate_limits_do_not_use_up_retries():
+    client = FakeClient(limited=3, retry_after=0.1)
+    outbox = SlackDispatcher(workers=1, max_retries=0, limits={"chat_postEphemeral": (1000, 1000)})
+    future = outbox.submit(client, "chat_postEphemeral", channel="C1", user="U1", text="hi")
+    assert future.result(5) == {"ok": True}
+    assert outbox.rate_limited == 3 and outbox.failed == 0
+
+
+def test_post_message_is_paced_per_channel():
+    outbox = SlackDispatcher(limits={"chat_postMessage": (1.0, 1)})
+    sent = []
+
+    class Client:
+        def chat_postMessage(self, channel, **kwargs):
+            sent.append((channel, time.monotonic()))
+            return {"ok": True}
+
+    start = time.monotonic()
+    for channel in ("C1", "C2", "C3"):
+        outbox.submit(Client(), "chat_postMessage", channel=channel, text="hi")
+    assert outbox.join(5)
+    assert len(sent) == 3 and all(t - start < 0.5 for _, t in sent)   # one burst token per channel
@@ -0,0 +1,80 @@
+import pytest
+
+from game_logic import PairSchedule, new_round
+from game_sessions import GameSession
+from state_store import MemoryStateStore, SqliteStateStore, open_state_store
+
+PLAYERS = [f"U{i:03d}" for i in range(8)]
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    store = MemoryStateStore() if request.param == "memory" else SqliteStateStore(str(tmp_path / "state.sqlite3"))
+    yield store
+    store.close()
+
+
+def game(game_id="g1", finished=False):
+    schedule = PairSchedule(PLAYERS, trialnum=3, neighborsize=2, engine="fast")
+    session = GameSession(game_id, "C1", PLAYERS, schedule, trialnum=3, neighborsize=2, csv_path=f"{game_id}.csv")
+    session.current_trial = 1
+    session.rids_by_trial = {1: ["r1"]}
+    session.finished = finished
+    return session.to_record()
+
+
+def test_rounds_are_found_before_and_after_a_commit(store):
+    st = new_round("U000", "U001", 1, "C1")
+    st.submit("U000", "#cats")
+    store.save_round("r1", st, "g1")
+    found, game_id = store.find_round("r1")            # still buffered
+    assert game_id == "g1" and found.sub("U000") == "#cats" and not found.submitted("U001")
+
+    st.submit("U001", "#cats")
+    st.completed = st.closed = True
+    st.game_outcome = "match"
+    store.save_round("r1", st, "g1")
+    store.save_round("r2", new_round("U002", "U000", 2, "C1"), "g1")
+    store.flush()
+
+    loaded = store.load_round("r1")
+    assert (loaded.pair, loaded.closed, loaded.game_outcome) == (("U000", "U001"), True, "match")
+    assert set(store.rounds_for_trial("g1", 1)) == {"r1"}
+    assert set(store.rounds_for_player("U000")) == {"r1", "r2"}
+    assert store.find_round("missing") is None
+
+
+def test_points_stats_and_awaiting(store):
+    store.save_points("g1", "U000", 1)
+    store.save_points("g1", "U000", 2)                 # latest write wins
+    store.save_trial_stats("g1", 1, {"trial": 1, "entropy_bits": 0.5})
+    store.set_awaiting("U005", True)
+    assert store.load_points("g1") == {"U000": 2}
+    assert store.load_trial_stats("g1") == {1: {"trial": 1, "entropy_bits": 0.5}}
+    assert store.get_awaiting("U005") and not store.get_awaiting("U006")
+
+
+def test_unfinished_games_survive_a_restart(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    store = open_state_store(path)
+    store.save_game(game("g1"))
+    store.save_game(game("g2", finished=True))
+    store.save_points("g1", "U003", 1)
+    store.save_round("r1", new_round("U000", "U001", 1, "C1"), "g1")
+    store.close()                                       # buffered writes are committed on close
+
+    reopened = open_state_store(path)
+    try:
+        games = reopened.load_active_games()
+        assert [g["game_id"] for g in games] == ["g1"]
+        resumed = GameSession.from_record(games[0])
+        assert (resumed.current_trial, resumed.rids_by_trial, resumed.players) == (1, {1: ["r1"]}, PLAYERS)
+        assert resumed.schedule_by_trial[1] == PairSchedule(PLAYERS, trialnum=3, neighborsize=2, engine="fast")[1]
+        assert reopened.load_points("g1") == {"U003": 1}
+        assert set(reopened.rounds_for_trial("g1", 1)) == {"r1"}
+    finally:
+        reopened.close()
+
+
+def test_empty_path_keeps_state_in_memory():
+    assert isinstance(open_state_store(""), MemoryStateStore)
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+import topology
+
+
+def test_ring_rows_are_ring_neighbor_index():
+    for nodesnum, neighborsize in [(10, 2), (10, 4), (5, 4), (7, 6)]:
+        graph = topology.ring(nodesnum, neighborsize)
+        nbr = topology.ring_neighbor_index(nodesnum, neighborsize)
+        assert all(np.array_equal(graph[i], nbr[i]) for i in range(nodesnum))
+
+
+def test_torus_neighbors():
+    graph = topology.torus(100, 4)
+    assert topology.torus_shape(100) == (10, 10)
+    assert set(graph.degrees()) == {4}
+    assert sorted(graph[0].tolist()) == [1, 9, 10, 90]
+    assert set(topology.torus(100, 8).degrees()) == {8}
+
+
+@pytest.mark.parametrize("nodesnum", [2, 13, 97])
+def test_prime_torus_is_an_error(nodesnum):
+    with pytest.raises(ValueError):
+        topology.torus(nodesnum, 4)
+
+
+@pytest.mark.parametrize("name", ["small_world", "random_regular"])
+def test_random_topologies_are_seeded_and_undirected(name):
+    graph = topology.make_topology(name, 30, 4, seed=1)
+    again = topology.make_topology(name, 30, 4, seed=1)
+    assert all(np.array_equal(graph[i], again[i]) for i in range(30))
+    assert all(i not in graph[i] for i in range(30))
+    assert all(i in graph[j] for i in range(30) for j in graph[i])      # undirected
+    if name == "random_regular":
+        assert set(graph.degrees()) == {4}
+
+
+def test_unknown_topology_is_an_error():
+    with pytest.raises(ValueError):
+        topology.make_topology("hypercube", 16, 4)
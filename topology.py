@@ -0,0 +1,213 @@
+"""
+Network topologies for the pairing generator (mixing.py).
+
+Each topology is the graph of who may be paired with whom. Neighbors are
+stored as compressed sparse rows (CSRGraph): one int32 array of all neighbor
+lists back to back plus an offsets array, so a graph costs
+O(nodesnum * degree) machine integers instead of Python lists. Every graph
+is indexed like the ring_neighbor_index array: graph[i] is the array of
+node i's neighbors (0-based).
+
+    ring            each node and the round(neighborsize / 2) nodes on either
+                    side (the neighborhood network_connection_spatial uses)
+    torus           2-D lattice wrapped at the edges; neighborsize 4 = von
+                    Neumann (up, down, left, right), 8, 24, ... = Moore
+                    neighborhood of radius 1, 2, ...; nodesnum
+                    must factor into at least 2 rows (a prime is an error)
+    small_world     Watts-Strogatz: the ring, with each edge rewired to a
+                    random node with probability SMALL_WORLD_REWIRE
+    random_regular  random graph where every node has neighborsize neighbors
+    complete        everyone with everyone (a homogeneous network); nothing
+                    is stored, a row is made when it is asked for
+
+Graphs built with a random element depend only on the seed.
+"""
+import math
+
+import numpy as np
+
+
+TOPOLOGIES = ("ring", "torus", "small_world", "random_regular", "complete")
+SMALL_WORLD_REWIRE = 0.1     # Watts-Strogatz rewiring probability
+
+
+class CSRGraph:
+    """Undirected graph; node i's neighbors are indices[indptr[i]:indptr[i + 1]]."""
+
+    def __init__(self, indptr, indices, kind="graph"):
+        self.indptr = indptr
+        self.indices = indices
+        self.kind = kind
+        self.nodesnum = len(indptr) - 1
+
+    @classmethod
+    def from_edges(cls, nodesnum, u, v, kind="graph"):
+        """Graph with edges (u[k], v[k]); both directions are added, self-loops and repeats dropped."""
+        src = np.concatenate((u, v)).astype(np.int64)
+        dst = np.concatenate((v, u)).astype(np.int64)
+        keep = src != dst
+        key = np.unique(src[keep] * nodesnum + dst[keep])     # sorted by source, then neighbor
+        src, dst = np.divmod(key, nodesnum)
+        indptr = np.zeros(nodesnum + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=nodesnum), out=indptr[1:])
+        return cls(indptr, dst.astype(np.int32), kind)
+
+    @classmethod
+    def from_dense(cls, nbr, kind="graph"):
+        """Graph from a (nodesnum, width) neighbor array such as ring_neighbor_index; rows keep their order."""
+        nodesnum, width = nbr.shape
+        return cls(np.arange(nodesnum + 1, dtype=np.int64) * width,
+                   np.ascontiguousarray(nbr, dtype=np.int32).ravel(), kind)
+
+    def __getitem__(self, i):
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def __len__(self):
+        return self.nodesnum
+
+    def degrees(self):
+        return np.diff(self.indptr)
+
+    @property
+    def nbytes(self):
+        return self.indptr.nbytes + self.indices.nbytes
+
+    def __repr__(self):
+        return f"CSRGraph({self.kind!r}, nodes={self.nodesnum}, edges={len(self.indices) // 2})"
+
+
+class CompleteGraph:
+    """Everyone is everyone's neighbor. Rows are built on demand; nothing is stored."""
+    kind = "complete"
+    nbytes = 0
+
+    def __init__(self, nodesnum):
+        self.nodesnum = nodesnum
+
+    def __getitem__(self, i):
+        i = int(i)
+        return np.concatenate((np.arange(i), np.arange(i + 1, self.nodesnum)))
+
+    def __len__(self):
+        return self.nodesnum
+
+    def degrees(self):
+        return np.full(self.nodesnum, self.nodesnum - 1)
+
+    def __repr__(self):
+        return f"CompleteGraph(nodes={self.nodesnum})"
+
+
+def ring_neighbor_index(nodesnum, neighborsize):
+    """
+    Precompute the ring neighborhood used by network_connection_spatial as a
+    (nodesnum, width) array of 0-based node indices.
+
+    Each node sees the round(neighborsize / 2) nodes on either side of it.
+    When the window wraps around a small ring (e.g. neighborsize = nodesnum - 1)
+    repeated neighbors and the node itself are dropped, so every row holds
+    distinct partners.
+    """
+    nodenb = round(neighborsize / 2)
+    offsets = np.concatenate((np.arange(-nodenb, 0), np.arange(1, nodenb + 1))) % nodesnum
+    offsets = np.unique(offsets)
+    offsets = offsets[offsets != 0]
+    return (np.arange(nodesnum)[:, None] + offsets[None, :]) % nodesnum
+
+
+def ring(nodesnum, neighborsize):
+    """The ring neighborhood of network_connection_spatial as a graph."""
+    return CSRGraph.from_dense(ring_neighbor_index(nodesnum, neighborsize), "ring")
+
+
+def torus_shape(nodesnum):
+    """(rows, cols) with rows * cols == nodesnum and rows the largest divisor <= sqrt(nodesnum)."""
+    rows = math.isqrt(nodesnum)
+    while nodesnum % rows:
+        rows -= 1
+    return rows, nodesnum // rows
+
+
+def torus(nodesnum, neighborsize=4, shape=None):
+    """2-D lattice wrapped at the edges. Node i sits at (i // cols, i % cols)."""
+    rows, cols = shape or torus_shape(nodesnum)
+    if rows * cols != nodesnum:
+        raise ValueError(f"A {rows}x{cols} torus does not hold {nodesnum} nodes.")
+    if rows == 1:
+        raise ValueError(f"{nodesnum} nodes only make a 1x{nodesnum} torus, which is just a ring; "
+                         "use a number of players with a divisor between 2 and its square root.")
+    if neighborsize == 4:
+        steps = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+    else:
+        radius = (math.isqrt(neighborsize + 1) - 1) // 2
+        if radius < 1 or (2 * radius + 1) ** 2 - 1 != neighborsize:
+            raise ValueError("A torus needs neighborsize 4 (von Neumann) or 8, 24, 48, ... (Moore).")
+        steps = [(dr, dc) for dr in range(-radius, radius + 1) for dc in range(-radius, radius + 1)
+                 if dr or dc]
+    r, c = np.divmod(np.arange(nodesnum), cols)
+    u = np.tile(np.arange(nodesnum), len(steps))
+    v = np.concatenate([((r + dr) % rows) * cols + (c + dc) % cols for dr, dc in steps])
+    return CSRGraph.from_edges(nodesnum, u, v, "torus")
+
+
+def small_world(nodesnum, neighborsize, rewire=SMALL_WORLD_REWIRE, seed=None):
+    """
+    Watts-Strogatz graph: the ring with round(neighborsize / 2) neighbors per
+    side, then each edge keeps its first node and moves its second one to a
+    random node with probability `rewire`. A rewiring that would give a
+    self-loop or an edge the node already has is left out.
+    """
+    rng = np.random.default_rng(seed)
+    nodenb = round(neighborsize / 2)
+    u = np.repeat(np.arange(nodesnum), nodenb)
+    v = (u + np.tile(np.arange(1, nodenb + 1), nodesnum)) % nodesnum
+    moved = rng.random(len(u)) < rewire
+    v[moved] = rng.integers(nodesnum, size=int(moved.sum()))
+    return CSRGraph.from_edges(nodesnum, u, v, "small_world")
+
+
+def random_regular(nodesnum, degree, seed=None, max_rounds=1000):
+    """
+    Random `degree`-regular graph from the configuration model: every node
+    gets `degree` stubs and the shuffled stubs are paired up. Self-loops and
+    repeated edges are fixed by re-pairing just those edges' stubs together
+    with as many random other edges, until none are left.
+    """
+    if nodesnum * degree % 2:
+        raise ValueError("nodesnum * neighborsize must be even for a regular graph.")
+    if degree >= nodesnum:
+        raise ValueError("A regular graph needs neighborsize < nodesnum (use the complete topology).")
+    rng = np.random.default_rng(seed)
+    stubs = rng.permutation(np.repeat(np.arange(nodesnum), degree)).reshape(-1, 2)
+    for _ in range(max_rounds):
+        lo, hi = stubs.min(axis=1), stubs.max(axis=1)
+        key = lo.astype(np.int64) * nodesnum + hi
+        _, first = np.unique(key, return_index=True)
+        bad = np.ones(len(stubs), dtype=bool)
+        bad[first] = False                 # repeats of an edge after its first copy
+        bad |= lo == hi                    # self-loops
+        if not bad.any():
+            return CSRGraph.from_edges(nodesnum, stubs[:, 0], stubs[:, 1], "random_regular")
+        redo = np.flatnonzero(bad)
+        redo = np.union1d(redo, rng.choice(len(stubs), size=min(len(stubs), len(redo)), replace=False))
+        stubs[redo] = rng.permutation(stubs[redo].ravel()).reshape(-1, 2)
+    raise RuntimeError("Could not build a simple random regular graph; change randseed and retry.")
+
+
+def complete(nodesnum):
+    return CompleteGraph(nodesnum)
+
+
+def make_topology(kind, nodesnum, neighborsize, seed=None):
+    """Build the `kind` graph (one of TOPOLOGIES) for nodesnum nodes."""
+    if kind == "ring":
+        return ring(nodesnum, neighborsize)
+    if kind == "torus":
+        return torus(nodesnum, neighborsize)
+    if kind == "small_world":
+        return small_world(nodesnum, neighborsize, seed=seed)
+    if kind == "random_regular":
+        return random_regular(nodesnum, neighborsize, seed=seed)
+    if kind == "complete":
+        return complete(nodesnum)
+    raise ValueError(f"Unknown topology {kind!r}; expected one of {TOPOLOGIES}.")